@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from synthetic_org import PRODUCTION, generate_org, scaled, write_keyword_workbook
+
+# Size of the benchmarked orgs, relative to PRODUCTION
+SCALES = [10, 100]
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--scales",
+        default=",".join(str(scale) for scale in SCALES),
+        help="Comma-separated sizes of the benchmarked orgs, relative to production",
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if "scale" in metafunc.fixturenames:
+        scales = [int(s) for s in metafunc.config.getoption("scales").split(",")]
+        metafunc.parametrize(
+            "scale", scales, ids=[f"{s}x" for s in scales], scope="session"
+        )
+
+
+@pytest.fixture(scope="session")
+def profile(scale):
+    return scaled(PRODUCTION, scale)
+
+
+@pytest.fixture(scope="session")
+def org(profile):
+    return generate_org(profile, seed=1)
+
+
+@pytest.fixture(scope="session")
+def org_file(org, tmp_path_factory):
+    path = tmp_path_factory.mktemp("org") / "flows.json"
+    with open(path, "w") as f:
+        json.dump(org, f)
+    return path
+
+
+@pytest.fixture(scope="session")
+def keyword_sources(profile, tmp_path_factory):
+    folder = tmp_path_factory.mktemp("keywords")
+    sources = []
+    for seed, language in enumerate(["hau", "zul"]):
+        path = folder / f"{language}.xlsx"
+        write_keyword_workbook(path, profile, language, seed=seed)
+        sources.append({"path": path, "key": language})
+    return sources
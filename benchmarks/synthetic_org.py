@@ -0,0 +1,233 @@
+"""
+Generator of synthetic RapidPro org exports for benchmarking.
+
+The generated orgs have the same structure as the ones produced by the
+pipeline (flows with nodes and actions, attachments, campaigns and triggers),
+but with made up content. Generation is seeded, so the same profile and seed
+always produce the same org.
+"""
+
+import dataclasses
+import random
+import uuid
+from dataclasses import dataclass
+
+import openpyxl
+
+
+@dataclass(kw_only=True)
+class Profile:
+    # Number of flows in the org
+    flows: int
+    # Number of nodes in each flow
+    nodes_per_flow: int
+    # Number of actions in each node
+    actions_per_node: int
+    # Fraction of send_msg actions with an attachment
+    attachment_rate: float
+    # Fraction of nodes that start another flow
+    enter_flow_rate: float
+    # Number of campaigns and events in each campaign
+    campaigns: int
+    events_per_campaign: int
+    # Number of keyword triggers
+    triggers: int
+    # Number of sheets in safeguarding keyword workbooks and word sets per sheet
+    keyword_sheets: int
+    wordsets_per_sheet: int
+
+
+# Approximate size of the largest org we currently deploy.
+PRODUCTION = Profile(
+    flows=650,
+    nodes_per_flow=10,
+    actions_per_node=2,
+    attachment_rate=0.2,
+    enter_flow_rate=0.05,
+    campaigns=20,
+    events_per_campaign=10,
+    triggers=100,
+    keyword_sheets=6,
+    wordsets_per_sheet=40,
+)
+
+ATTACHMENT_FIELDS = ["image_path", "comic_path", "voiceover_path", "logo_path"]
+KEYWORD_HEADER = (
+    "Please insert translation of each word under each corresponding cell. If the "
+    "particular word does not translate into the chosen language, please leave it "
+    "blank"
+)
+MISSPELLINGS_HEADER = (
+    "Range of possible misspellings and common slang used by the population"
+)
+
+
+def scaled(profile, factor):
+    """Profile for an org factor times larger than the given one.
+
+    The number of flows, campaigns, triggers and word sets grows, the size of
+    each individual flow and campaign stays the same.
+    """
+    return dataclasses.replace(
+        profile,
+        flows=profile.flows * factor,
+        campaigns=profile.campaigns * factor,
+        triggers=profile.triggers * factor,
+        wordsets_per_sheet=profile.wordsets_per_sheet * factor,
+    )
+
+
+def generate_org(profile, seed=0):
+    rng = random.Random(seed)
+    flows = [
+        {"uuid": make_uuid(rng), "name": f"flow_{i}"} for i in range(profile.flows)
+    ]
+    org = {
+        "version": "13",
+        "site": "https://rapidpro.example.org",
+        "flows": [
+            generate_flow(rng, profile, flow["uuid"], flow["name"], flows)
+            for flow in flows
+        ],
+        "campaigns": [
+            generate_campaign(rng, profile, i, flows) for i in range(profile.campaigns)
+        ],
+        "triggers": [
+            generate_trigger(rng, i, flows) for i in range(profile.triggers)
+        ],
+        "fields": [
+            {"key": key, "name": key, "type": "text"} for key in ATTACHMENT_FIELDS
+        ],
+        "groups": [],
+    }
+    return org
+
+
+def generate_flow(rng, profile, flow_uuid, name, flows):
+    node_uuids = [make_uuid(rng) for _ in range(profile.nodes_per_flow)]
+    nodes = []
+    for i, node_uuid in enumerate(node_uuids):
+        destination = node_uuids[i + 1] if i + 1 < len(node_uuids) else None
+        if rng.random() < profile.enter_flow_rate:
+            target = rng.choice(flows)
+            actions = [
+                {
+                    "uuid": make_uuid(rng),
+                    "type": "enter_flow",
+                    "flow": {"uuid": target["uuid"], "name": target["name"]},
+                }
+            ]
+        else:
+            actions = [
+                generate_send_msg(rng, profile, name, i, j)
+                for j in range(profile.actions_per_node)
+            ]
+        nodes.append(
+            {
+                "uuid": node_uuid,
+                "actions": actions,
+                "exits": [{"uuid": make_uuid(rng), "destination_uuid": destination}],
+            }
+        )
+
+    return {
+        "uuid": flow_uuid,
+        "name": name,
+        "spec_version": "13.1.0",
+        "language": "eng",
+        "type": "messaging",
+        "revision": 0,
+        "expire_after_minutes": 10080,
+        "localization": {},
+        "nodes": nodes,
+        "_ui": {"nodes": {}},
+    }
+
+
+def generate_send_msg(rng, profile, flow_name, node_index, action_index):
+    attachments = []
+    if rng.random() < profile.attachment_rate:
+        field = rng.choice(ATTACHMENT_FIELDS)
+        filename = f"{flow_name}_{node_index}_{action_index}.png"
+        attachments.append(f'image:@(fields.{field} & "{filename}")')
+    return {
+        "uuid": make_uuid(rng),
+        "type": "send_msg",
+        "text": f"Message {action_index} of node {node_index} in {flow_name}",
+        "attachments": attachments,
+        "quick_replies": [],
+        "all_urns": False,
+    }
+
+
+def generate_campaign(rng, profile, index, flows):
+    events = []
+    for i in range(profile.events_per_campaign):
+        flow = rng.choice(flows)
+        events.append(
+            {
+                "uuid": make_uuid(rng),
+                "offset": i,
+                "unit": "D",
+                "event_type": rng.choice(["F", "F", "F", "M"]),
+                "delivery_hour": -1,
+                "message": None,
+                "relative_to": {"label": "Registered On", "key": "registered_on"},
+                "flow": {"uuid": flow["uuid"], "name": flow["name"]},
+                "start_mode": "I",
+            }
+        )
+    return {
+        "uuid": make_uuid(rng),
+        "name": f"campaign_{index}",
+        "group": {"uuid": make_uuid(rng), "name": f"group_{index}"},
+        "events": events,
+    }
+
+
+def generate_trigger(rng, index, flows):
+    flow = rng.choice(flows)
+    return {
+        "trigger_type": "K",
+        "keywords": [f"keyword{index}"],
+        "flow": {"uuid": flow["uuid"], "name": flow["name"]},
+        "groups": [],
+        "exclude_groups": [],
+        "channel": None,
+        "match_type": "F",
+    }
+
+
+def write_keyword_workbook(path, profile, language, seed=0):
+    """Write a safeguarding keyword workbook as read by extract_keywords."""
+    rng = random.Random(seed)
+    book = openpyxl.Workbook()
+    book.remove(book.active)
+    for s in range(profile.keyword_sheets):
+        sheet = book.create_sheet(f"sheet_{s}")
+        sheet.append([f"Sheet {s}"])
+        sheet.append([None, "Section 1", None, None, None, "Section 2"])
+        sheet.append(
+            ["Language", "High-risk key words", None, None, None, MISSPELLINGS_HEADER]
+        )
+        sheet.append([KEYWORD_HEADER])
+        for w in range(profile.wordsets_per_sheet):
+            words = [f"word{s}x{w}x{k}" for k in range(rng.randint(1, 4))]
+            misspellings = [f"wrd{s}x{w}x{k}" for k in range(rng.randint(0, 4))]
+            sheet.append(["English", *pad(words, 4), *misspellings])
+            sheet.append(
+                [
+                    language,
+                    *pad([f"{language}_{word}" for word in words], 4),
+                    *[f"{language}_{word}" for word in misspellings],
+                ]
+            )
+    book.save(path)
+
+
+def pad(values, n):
+    return values + [None] * (n - len(values))
+
+
+def make_uuid(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
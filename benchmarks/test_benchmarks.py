@@ -0,0 +1,119 @@
+import pytest
+
+from parenttext.referenced_assets import get_referenced_assets
+from parenttext_pipeline.configs import Config
+from parenttext_pipeline.extract_keywords import process_keywords
+from parenttext_pipeline.org import OrgDocument
+from parenttext_pipeline.steps import (
+    edit_campaign,
+    split_rapidpro_json,
+    update_expiration_times,
+)
+
+# Large orgs take long to process, so their benchmarks are only run once.
+ROUNDS = {10: 5, 100: 1}
+
+
+def run(benchmark, scale, function, *args, setup=None):
+    return benchmark.pedantic(
+        function,
+        args=None if setup else args,
+        setup=setup,
+        rounds=ROUNDS.get(scale, 1),
+    )
+
+
+def make_config(tmp_path, **kwargs):
+    return Config(
+        meta={"version": "1.0.0", "pipeline_version": "1.0.0"},
+        sources={},
+        steps=[
+            {
+                "id": "expiration",
+                "type": "update_expiration_times",
+                "default_expiration_time": 1440,
+            },
+        ],
+        flows_outputbasename="flows",
+        outputpath=str(tmp_path / "output"),
+        temppath=str(tmp_path / "temp"),
+        **kwargs,
+    )
+
+
+@pytest.mark.parametrize("n", [1, 4])
+def test_split_rapidpro_json(benchmark, scale, org, tmp_path, n):
+    config = make_config(tmp_path, output_split_number=n)
+    (tmp_path / "output").mkdir()
+
+    def setup():
+        return (config, OrgDocument(tmp_path / "flows.json", org)), {}
+
+    run(benchmark, scale, split_rapidpro_json, setup=setup)
+
+
+def expire_file(config, flows):
+    # Time reading the org from its file and writing the output to a file too, so
+    # that the in-memory and streaming modes are compared on the same work.
+    return update_expiration_times(config, config.steps[0], 2, flows).to_file()
+
+
+def test_update_expiration_times(benchmark, scale, org_file, tmp_path):
+    config = make_config(tmp_path)
+    (tmp_path / "temp").mkdir()
+
+    def setup():
+        return (config, OrgDocument.from_file(org_file)), {}
+
+    run(benchmark, scale, expire_file, setup=setup)
+
+
+def test_split_rapidpro_json_streaming(benchmark, scale, org_file, tmp_path):
+    config = make_config(tmp_path, output_split_number=4, streaming=True)
+    (tmp_path / "output").mkdir()
+
+    def setup():
+        return (config, OrgDocument.from_file(org_file)), {}
+
+    run(benchmark, scale, split_rapidpro_json, setup=setup)
+
+
+def test_update_expiration_times_streaming(benchmark, scale, org_file, tmp_path):
+    config = make_config(tmp_path, streaming=True)
+    (tmp_path / "temp").mkdir()
+
+    def setup():
+        return (config, OrgDocument.from_file(org_file)), {}
+
+    run(benchmark, scale, expire_file, setup=setup)
+
+
+def test_get_referenced_assets(benchmark, scale, org_file):
+    path_dict = {
+        "image_path": ["images"],
+        "comic_path": ["comics"],
+        "voiceover_path": ["voiceover/eng", "voiceover/hau"],
+        "logo_path": ["logos"],
+    }
+
+    assets = run(benchmark, scale, get_referenced_assets, org_file, path_dict)
+
+    assert assets
+
+
+def test_edit_campaign(benchmark, scale, org):
+    # Edit all campaigns against a quarter of the flows, as when splitting the
+    # org into four files.
+    flows = org["flows"][: len(org["flows"]) // 4]
+
+    def edit_campaigns():
+        flow_names = {flow["name"] for flow in flows}
+        return [edit_campaign(campaign, flow_names) for campaign in org["campaigns"]]
+
+    run(benchmark, scale, edit_campaigns)
+
+
+def test_process_keywords(benchmark, scale, keyword_sources):
+    keywords = run(benchmark, scale, process_keywords, keyword_sources)
+
+    assert keywords
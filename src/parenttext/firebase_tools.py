@@ -3,7 +3,7 @@ import hashlib
 import base64
 import re
 import uuid
-import json
+from parenttext_pipeline import jsonio
 from google.cloud import storage
 from rpft.google import get_credentials
 
@@ -306,7 +306,7 @@ class Firebase:
         blob_name = "/".join([remote_directory.rstrip("/"), filename])
         blob = bucket.blob(blob_name)
         hash_manifest_content = blob.download_as_text()
-        hash_manifest = json.loads(hash_manifest_content)
+        hash_manifest = jsonio.loads(hash_manifest_content)
         return hash_manifest
 
 
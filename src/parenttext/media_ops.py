@@ -9,6 +9,7 @@ For help, run:
 """
 
 import argparse
+import contextlib
 import shutil
 import json
 import re
@@ -27,6 +28,10 @@ from parenttext.placeholder_gen import create_placeholder_files
 
 from parenttext.validate_assets import process_media_urls
 
+from parenttext_pipeline.configs import ConfigError, load_config
+from parenttext_pipeline.history import recorded_run
+from parenttext_pipeline.telemetry import Telemetry
+
 
 env = {}
 
@@ -392,6 +397,15 @@ def _verify_deployment_asset_location():
             exit()
 
 
+def record_run(telemetry):
+    """Record the run in the history of the deployment, if it has a config."""
+    try:
+        config = load_config()
+    except ConfigError:
+        return contextlib.nullcontext()
+    return recorded_run(config, "media_ops", telemetry)
+
+
 def verify_env(step_list):
     assert_env_exists(step_list)
     _verify_old_structure()
@@ -411,11 +425,14 @@ def main(
     print("🚀 Starting Automated Media Processing Pipeline")
     print("=" * 50)
 
-    for i, step_name in enumerate(step_list):
-        step = step_dict[step_name]
-        print(f"\n🚀 Step {i+1}: {step['start_msg']}")
-        step["fn"]()
-        print(f"✅ Step {i+1}: {step['end_msg']}")
+    telemetry = Telemetry()
+    with record_run(telemetry):
+        for i, step_name in enumerate(step_list):
+            step = step_dict[step_name]
+            print(f"\n🚀 Step {i+1}: {step['start_msg']}")
+            with telemetry.measure(step_name, "step"):
+                step["fn"]()
+            print(f"✅ Step {i+1}: {step['end_msg']}")
 
     print("\n" + "=" * 50)
     print("🎉 Pipeline execution finished successfully!")
@@ -1,8 +1,6 @@
 import pathlib
-import shutil
 
-import pathlib
-import shutil
+from parenttext_pipeline.materialize import materialize_file
 
 
 def create_placeholder_files(file_paths: list[str]):
@@ -53,7 +51,7 @@ def create_placeholder_files(file_paths: list[str]):
 
             # Copy the placeholder if it exists.
             if source_path.is_file():
-                shutil.copy(source_path, dest_path)
+                materialize_file(source_path, dest_path)
             else:
                 print(
                     f"⚠️  Placeholder not found: '{source_path} for {dest_path}'. Skipping."
@@ -1,10 +1,11 @@
-import json
 import re
 import itertools
 
+from parenttext_pipeline import jsonio
 
-def _get_attachments(rapidpro_json):
-    for flow in rapidpro_json["flows"]:
+
+def _get_attachments(flows):
+    for flow in flows:
         for node in flow["nodes"]:
             for action in node["actions"]:
                 if "attachments" in action.keys():
@@ -37,16 +38,17 @@ def get_referenced_assets(rapidpro_file, path_dict, process_attachment_method=No
 
     path_dict = clean_path_dict(path_dict)
 
+    # The flows are read one by one, so that large orgs need not fit into memory
     with open(rapidpro_file, "r", errors="ignore") as f:
-        rapidpro_json = json.load(f)
-
-    attachments = [
-        item
-        for sublist in _get_attachments(rapidpro_json)
-        for item in sublist
-        if sublist
-    ]
-    unique_attachments = list(set(attachments))
+        unique_attachments = list(
+            {
+                item
+                for key, flows in jsonio.iter_object(f, lazy=["flows"])
+                if key == "flows"
+                for sublist in _get_attachments(flows)
+                for item in sublist
+            }
+        )
 
     referenced_assets = []
     for a in unique_attachments:
@@ -3,7 +3,9 @@ import subprocess
 import shutil
 from pathlib import Path
 import hashlib
-import json
+import tempfile
+from parenttext_pipeline import jsonio
+from parenttext_pipeline.materialize import materialize_file
 from parenttext.firebase_tools import Firebase
 
 
@@ -132,8 +134,7 @@ def transcode_dir(src, dst, env, audio_from_video=True, old_structure=False):
         shutil.copytree(src / "voiceover" / "video", src / "voiceover" / "audio", dirs_exist_ok=True)
     hash_manifest.update(handle_dir(src=Path(src), dst=Path(dst), env=env, fb=fb, hash_manifest=hash_manifest, resource_type=resource_type))
     # write hash_manifest to a local file for future reference
-    with open(dst / "hash_manifest.json", "w") as f:
-        json.dump(hash_manifest, f, indent=4)
+    jsonio.dump(hash_manifest, dst / "hash_manifest.json", indent=4)
 
 
 def handle_dir(src: Path, dst: Path, env: dict, fb: Firebase, hash_manifest: dict, resource_type: str):
@@ -194,8 +195,12 @@ def handle_dir(src: Path, dst: Path, env: dict, fb: Firebase, hash_manifest: dic
 
 def to_video(src: Path, dst: Path):
     out = dst.with_suffix(".mp4")
-    first_pass(src)
-    second_pass(src, out)
+    # Keep the two-pass log out of the working directory, so that concurrent
+    # transcodes do not read each other's statistics.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        passlogfile = Path(temp_dir) / "ffmpeg2pass"
+        first_pass(src, passlogfile)
+        second_pass(src, out, passlogfile)
 
     return dst
 
@@ -220,11 +225,11 @@ def to_audio(src: Path, dst: Path):
 
 def copy(src: Path, dst: Path):
     out = dst
-    shutil.copyfile(src, dst)
+    materialize_file(src, dst)
     return out
 
 
-def first_pass(src):
+def first_pass(src, passlogfile):
     subprocess.run(
         ["ffmpeg"]
         + ["-y"]
@@ -236,13 +241,14 @@ def first_pass(src):
         + ["-b:v", "84k"]
         + ["-profile:v", "baseline"]
         + ["-pass", "1"]
+        + ["-passlogfile", str(passlogfile)]
         + ["-an"]
         + ["-f", "null"]
         + ["/dev/null"],
     )
 
 
-def second_pass(src, dst):
+def second_pass(src, dst, passlogfile):
     subprocess.run(
         ["ffmpeg"]
         + ["-y"]
@@ -254,6 +260,7 @@ def second_pass(src, dst):
         + ["-b:v", "84k"]
         + ["-profile:v", "baseline"]
         + ["-pass", "2"]
+        + ["-passlogfile", str(passlogfile)]
         + ["-c:a", "aac"]
         + ["-b:a", "42k"]
         + ["-ar", "24k"]
@@ -0,0 +1,185 @@
+import dataclasses
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+from parenttext_pipeline import pipeline_version
+from parenttext_pipeline.common import (
+    get_files_from_source,
+    get_input_subfolder,
+    node_modules_folder,
+)
+
+# Steps that do not produce a flow file (they only write reports or translator
+# files), so there is nothing to reuse on a cache hit.
+UNCACHED_STEPS = {
+    "extract_texts_for_translators",
+    "overall_integrity_check",
+}
+
+
+class StepCache:
+    """
+    Content-addressed store of step outputs.
+
+    Each step output is stored under a key derived from the step type and config,
+    the hash of the incoming flow file and the hashes of the input files the step
+    reads from its sources. If none of these change, the stored output is reused
+    instead of executing the step again.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path) / "steps"
+
+    @classmethod
+    def from_config(cls, config):
+        if not config.cachepath:
+            return None
+        return cls(config.cachepath)
+
+    def key(self, config, step_config, step_number, input_digest):
+        return step_key(config, step_config, step_number, input_digest)
+
+    def lookup(self, key):
+        """Return the path of the output stored under key, or None."""
+        entry = self.path / key
+        if not entry.is_dir():
+            return None
+        return next(entry.iterdir(), None)
+
+    def restore(self, key, destination_folder):
+        """Copy the output stored under key to destination_folder.
+
+        Returns the path of the restored file, or None if nothing is stored.
+        """
+        stored = self.lookup(key)
+        if stored is None:
+            return None
+        os.makedirs(destination_folder, exist_ok=True)
+        destination = Path(destination_folder) / stored.name
+        shutil.copyfile(stored, destination)
+        return str(destination)
+
+    def store(self, key, step_output):
+        """Store step_output, an OrgDocument or the path of a file, under key.
+
+        A document that is only held in memory is written to the cache, but not
+        to its own file.
+        """
+        in_memory = getattr(step_output, "dirty", False)
+        step_output_file = getattr(step_output, "path", step_output)
+        if not in_memory and not os.path.isfile(step_output_file):
+            return
+        entry = self.path / key
+        if entry.exists():
+            return
+        os.makedirs(self.path, exist_ok=True)
+        # Write into a scratch folder first so that an interrupted run never
+        # leaves a partial entry behind.
+        scratch = Path(tempfile.mkdtemp(dir=self.path))
+        destination = scratch / Path(step_output_file).name
+        if in_memory:
+            step_output.save_copy(destination)
+        else:
+            shutil.copyfile(step_output_file, destination)
+        try:
+            os.rename(scratch, entry)
+        except OSError:
+            # Another run stored the same entry in the meantime.
+            shutil.rmtree(scratch)
+
+
+def step_key(config, step_config, step_number, input_digest):
+    """Hash of everything the output of a step depends on.
+
+    That is the step's config and position, the hash of its input flow file,
+    the input files of its sources and the versions of the pipeline, of the
+    Python packages that create and edit flows and of the Node packages.
+    """
+    fields = {
+        "pipeline_version": pipeline_version(),
+        "python_packages": {
+            name: package_version(name) for name in ["rpft", "rapidpro_abtesting"]
+        },
+        "node_packages": node_packages_fingerprint(node_modules_folder(config)),
+        "step_number": step_number,
+        "step": dataclasses.asdict(step_config),
+        "input": input_digest,
+        "sources": get_step_source_hashes(config, step_config),
+    }
+    if getattr(step_config, "models_module", None):
+        fields["models_module"] = module_hash(step_config.models_module)
+    content = json.dumps(fields, sort_keys=True, default=str)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def folder_hashes(path):
+    hashes = {}
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for file in sorted(files):
+            filepath = Path(root) / file
+            hashes[filepath.relative_to(path).as_posix()] = file_hash(filepath)
+    return hashes
+
+
+def get_step_source_hashes(config, step_config):
+    """Hash the input files a step reads from each of its sources.
+
+    Sheets and JSON sources resolve to the files in their files_list and
+    files_dict; for other formats all files in the compiled source folder
+    are hashed.
+    """
+    hashes = {}
+    for source_name in step_config.sources:
+        source_config = config.sources.get(source_name)
+        if source_config is not None and source_config.format in ["sheets", "json"]:
+            hashes[source_name] = {
+                file_id: file_hash(path) if os.path.isfile(path) else None
+                for file_id, path in get_files_from_source(
+                    config, source_name, step_config.id
+                )
+            }
+        else:
+            source_folder = get_input_subfolder(config, source_name)
+            hashes[source_name] = folder_hashes(source_folder)
+    return hashes
+
+
+def package_version(name):
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
+
+
+def module_hash(module_name):
+    try:
+        spec = importlib.util.find_spec(module_name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or not spec.origin or not os.path.isfile(spec.origin):
+        return None
+    return file_hash(spec.origin)
+
+
+def node_packages_fingerprint(path):
+    versions = {}
+    if not os.path.isdir(path):
+        return versions
+    for package in sorted(os.listdir(path)):
+        package_json = Path(path) / package / "package.json"
+        if package_json.is_file():
+            with open(package_json) as f:
+                versions[package] = json.load(f).get("version")
+    return versions
@@ -0,0 +1,110 @@
+import os
+import threading
+from pathlib import Path
+
+from parenttext_pipeline import jsonio
+from parenttext_pipeline.cache import file_hash, step_key
+from parenttext_pipeline.org import OrgDocument
+
+
+class Checkpoints:
+    """
+    Record of the steps of a compile_flows run that have completed.
+
+    For each step, the checkpoint holds the key of everything the step's output
+    depends on (see cache.step_key) and the file and hash of the output. A run
+    can be resumed after the last step whose checkpoint is still valid, that is
+    whose key has not changed and whose output file is still in the temp folder,
+    as well as the checkpoints of all steps before it.
+
+    Steps may complete out of order (see compile_flows.apply_side_branch), in
+    which case the checkpoints of the steps that are still running are None.
+    Steps whose output is only held in memory get no checkpoint, as hashing it
+    would mean serializing the org, and it cannot be read back when resuming.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.steps = []
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(Path(config.temppath) / "checkpoints.json")
+
+    def load(self):
+        try:
+            self.steps = jsonio.load(self.path)["steps"]
+        except (FileNotFoundError, ValueError, KeyError):
+            self.steps = []
+        return self.steps
+
+    def record(self, config, step_config, step_number, step_input, step_output, key):
+        """Record that a step completed, with the OrgDocument it produced.
+
+        key is the step's key if the step cache has computed it already, or None.
+        """
+        if step_output.dirty:
+            return
+        if key is None:
+            if step_input is not None and step_input.dirty:
+                return
+            input_digest = step_input.digest if step_input else None
+            key = step_key(config, step_config, step_number, input_digest)
+        checkpoint = {
+            "step_number": step_number,
+            "id": step_config.id,
+            "key": key,
+            "output": step_output.path,
+            "output_hash": step_output.digest,
+        }
+        with self.lock:
+            self.steps.extend([None] * (step_number - len(self.steps)))
+            self.steps[step_number - 1] = checkpoint
+            jsonio.dump({"steps": self.steps}, self.path, indent=2)
+
+    def resume(self, config, from_step=None):
+        """Return the outputs of the steps that do not need to be executed again.
+
+        The checkpoints of the steps are checked in order. If from_step is given,
+        the steps before it must all be valid, otherwise a ValueError is raised;
+        without it, as many steps as are valid are skipped. A from_step after the
+        last step only requires all steps to be valid.
+        """
+        if from_step is not None and not 1 <= from_step <= len(config.steps) + 1:
+            print(f"Step {from_step} does not exist")
+            raise ValueError(f"Cannot resume from step {from_step}")
+        self.load()
+        last = len(config.steps) if from_step is None else from_step - 1
+        outputs = []
+        input_digest = None
+        for step_number, step_config in enumerate(config.steps[:last], start=1):
+            problem = self.check(config, step_config, step_number, input_digest)
+            if problem:
+                if from_step is None:
+                    break
+                print(f"Checkpoint of step {step_config.id} is not valid: {problem}")
+                raise ValueError(f"Cannot resume from step {from_step}")
+            checkpoint = self.steps[step_number - 1]
+            outputs.append(OrgDocument.from_file(checkpoint["output"]))
+            input_digest = checkpoint["output_hash"]
+        del self.steps[len(outputs) :]
+        return outputs
+
+    def check(self, config, step_config, step_number, input_digest):
+        """Return why the checkpoint of a step is not valid, or None."""
+        if step_number > len(self.steps) or self.steps[step_number - 1] is None:
+            return "step did not complete"
+        checkpoint = self.steps[step_number - 1]
+        if checkpoint["id"] != step_config.id:
+            return "steps changed"
+        if checkpoint["key"] != step_key(
+            config, step_config, step_number, input_digest
+        ):
+            return "step config or inputs changed"
+        output = checkpoint["output"]
+        if not os.path.isfile(output):
+            return "output file was not written"
+        if file_hash(output) != checkpoint["output_hash"]:
+            return "output file changed"
+        return None
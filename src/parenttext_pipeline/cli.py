@@ -1,33 +1,68 @@
 import argparse
+import importlib
 
 from packaging.version import Version
 
-import parenttext_pipeline.compile_flows
-import parenttext_pipeline.pot_output
-import parenttext_pipeline.pull_data
 from parenttext_pipeline import pipeline_version
 from parenttext_pipeline.configs import load_config
 
+# Operations are imported only when they run, so that the CLI starts quickly
+# and an operation does not need the dependencies of the others.
 OPERATIONS_MAP = {
-    "pull_data": parenttext_pipeline.pull_data.run,
-    "compile_flows": parenttext_pipeline.compile_flows.run,
-    "pot_output": parenttext_pipeline.pot_output.run,
+    "pull_data": "parenttext_pipeline.pull_data:run",
+    "compile_flows": "parenttext_pipeline.compile_flows:run",
+    "pot_output": "parenttext_pipeline.pot_output:run",
+    "plan": "parenttext_pipeline.plan:run",
 }
 
 
+# Command line options passed on to the operations that take them
+OPERATION_OPTIONS = {
+    "compile_flows": ["resume", "from_step"],
+}
+
+
+def get_operation(name):
+    module_name, function_name = OPERATIONS_MAP[name].split(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
 def init():
     parser = argparse.ArgumentParser(description="Run a pipeline of operations.")
     parser.add_argument(
         "operations",
         nargs="+",
+        choices=list(OPERATIONS_MAP),
+        help="Sequence of operations to perform.",
+    )
+    parser.add_argument(
+        "--workspace",
+        help=(
+            "Folder to write temporary and output files to, instead of the "
+            "current directory. Runs with different workspaces can execute at "
+            "the same time."
+        ),
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help=(
+            "compile_flows: Do not execute the steps that completed in the "
+            "previous run again, if their config and inputs are unchanged."
+        ),
+    )
+    parser.add_argument(
+        "--from-step",
+        type=int,
+        metavar="N",
         help=(
-            "Sequence of operations to perform. "
-            "Valid choices: pull_data, compile_flows."
+            "compile_flows: Resume from step N (counting from 1), reusing the "
+            "outputs of the steps before it from the previous run."
         ),
     )
     args = parser.parse_args()
 
-    config = load_config()
+    config = load_config(workspace=args.workspace)
 
     config_pipeline_version = Version(config.meta["pipeline_version"])
     real_pipeline_version = Version(pipeline_version())
@@ -43,7 +78,10 @@ def init():
         )
 
     for operation in args.operations:
-        OPERATIONS_MAP[operation](config)
+        options = {
+            name: getattr(args, name) for name in OPERATION_OPTIONS.get(operation, [])
+        }
+        get_operation(operation)(config, **options)
 
 
 if __name__ == "__main__":
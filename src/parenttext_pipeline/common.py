@@ -1,14 +1,23 @@
 import itertools
-import json
 import os
 import shutil
-import subprocess
 from pathlib import Path
 
-from parenttext_pipeline import pipeline_version
-
-
-def clear_or_create_folder(path):
+from parenttext_pipeline import jsonio, pipeline_version
+from parenttext_pipeline.node import run_node_script
+
+
+def clear_or_create_folder(path, keep=()):
+    """Create an empty folder at path, except for the entries named in keep."""
+    if os.path.exists(path) and keep:
+        for entry in os.scandir(path):
+            if entry.name in keep:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+        return
     if os.path.exists(path):
         shutil.rmtree(path)
     os.makedirs(path)
@@ -108,14 +117,16 @@ def write_meta(config, field_dict, path):
         "config_version": config.meta.get("version") or "legacy",
     } | field_dict
 
-    with open(Path(path) / "meta.json", "w") as outfile:
-        json.dump(meta, outfile, indent=2)
+    jsonio.dump(meta, Path(path) / "meta.json", indent=2)
 
 
 def read_meta(path):
-    with open(Path(path) / "meta.json") as infile:
-        return json.load(infile)
+    return jsonio.load(Path(path) / "meta.json")
+
+
+def node_modules_folder(config):
+    return Path(config.root) / "node_modules" / "@idems"
 
 
-def run_node(script, *args):
-    subprocess.run(["node", "node_modules/@idems/" + script, *args])
+def run_node(config, script, *args):
+    return run_node_script(node_modules_folder(config) / script, args)
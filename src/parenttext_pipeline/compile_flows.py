@@ -1,4 +1,12 @@
-from parenttext_pipeline import steps
+import copy
+import dataclasses
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from parenttext_pipeline import flow_cache, shards, steps
+from parenttext_pipeline.cache import UNCACHED_STEPS, StepCache
+from parenttext_pipeline.checkpoints import Checkpoints
 from parenttext_pipeline.common import (
     clear_or_create_folder,
     get_input_folder,
@@ -6,29 +14,288 @@ from parenttext_pipeline.common import (
     write_meta,
 )
 from parenttext_pipeline.compile_sources import compile_sources
+from parenttext_pipeline.configs import IncrementalStepConfig
+from parenttext_pipeline.history import recorded_run
+from parenttext_pipeline.materialize import materialize_tree
+from parenttext_pipeline.node import node_session
+from parenttext_pipeline.org import OrgDocument
+from parenttext_pipeline.telemetry import Telemetry, describe_flows
+
+
+def run(config, resume=False, from_step=None):
+    telemetry = Telemetry()
+    with node_session(config.node_worker):
+        with recorded_run(config, "compile_flows", telemetry):
+            compile_flows(config, telemetry, resume, from_step)
 
 
-def run(config):
-    clear_or_create_folder(config.outputpath)
-    clear_or_create_folder(config.temppath)
+def compile_flows(config, telemetry=None, resume=False, from_step=None):
+    """Execute the steps of the config and write the result to the output folder.
+
+    If resume is True or from_step is given, the steps that completed in the
+    previous run are not executed again, see Checkpoints.resume. If the config
+    has variants, each variant is written to a subfolder of the output folder,
+    see compile_variants.
+    """
+    resume = resume or from_step is not None
+    # The diffable sheets are kept, so that only those of changed flows are
+    # written again
+    clear_or_create_folder(config.outputpath, keep=["diffable", *config.variants])
+    if resume:
+        # The step outputs of the previous run are kept
+        os.makedirs(config.temppath, exist_ok=True)
+        clear_or_create_folder(get_input_folder(config))
+    else:
+        clear_or_create_folder(config.temppath)
 
     print("Compiling sources...")
-    config.sources = compile_sources(".", get_input_folder(config))
+    config.sources = compile_sources(config.root, get_input_folder(config))
 
     data = read_meta(config.inputpath)
     meta = {"pull_timestamp": data["pull_timestamp"]}
     write_meta(config, meta, config.outputpath)
 
-    input_file = None
-    for step_num, step_config in enumerate(config.steps):
-        output_file = apply_step(config, step_config, step_num + 1, input_file)
-        print(f"Applied step {step_config.type}, result stored at {output_file}")
-        input_file = output_file
+    if telemetry is None:
+        telemetry = Telemetry()
+    with ThreadPoolExecutor() as executor:
+        runner = StepRunner(telemetry, executor)
+        if config.variants:
+            compile_variants(config, runner, meta, resume, from_step)
+        else:
+            checkpoints = Checkpoints.from_config(config)
+            resumed = checkpoints.resume(config, from_step) if resume else []
+            if resume:
+                print(f"Resuming run, completed_steps={len(resumed)}")
+            flows = runner.apply_steps(config, checkpoints, resumed)
+            write_outputs(config, flows, telemetry)
+        runner.collect_side_branches()
+
+    write_meta(config, meta | {"steps": telemetry.records}, config.outputpath)
+    telemetry.write_trace(Path(config.outputpath) / "trace.json")
+
+
+def compile_variants(config, runner, meta, resume=False, from_step=None):
+    """Execute the steps shared by all variants once, then the rest of each variant.
+
+    The remaining steps of the variants are executed in parallel, each in a
+    subfolder of the temp folder named after the variant, and the output of
+    each variant is written to a subfolder of the output folder.
+    """
+    variants = variant_configs(config)
+    shared = shared_steps(config, variants.values())
+    prefix = copy.copy(config)
+    prefix.steps = config.steps[:shared]
+    checkpoints = Checkpoints.from_config(config)
+    resumed = []
+    if resume:
+        resumed = checkpoints.resume(
+            prefix, None if from_step is None else min(from_step, shared + 1)
+        )
+        print(f"Resuming run, completed_steps={len(resumed)}")
+    flows = runner.apply_steps(prefix, checkpoints, resumed)
+    if flows is not None:
+        flows.to_file()
+    print(f"Shared steps done, steps={shared}, variants={len(variants)}")
+
+    def build(name, variant_config):
+        clear_or_create_folder(variant_config.outputpath, keep=["diffable"])
+        os.makedirs(variant_config.temppath, exist_ok=True)
+        clear_or_create_folder(get_input_folder(variant_config))
+        materialize_tree(get_input_folder(config), get_input_folder(variant_config))
+
+        variant_checkpoints = Checkpoints.from_config(variant_config)
+        variant_resumed = []
+        if resume and (from_step is None or from_step > shared):
+            variant_resumed = variant_checkpoints.resume(variant_config, from_step)
+            if len(variant_resumed) < shared:
+                variant_resumed = []
+        # The checkpoints of a variant start with those of the shared steps
+        variant_checkpoints.steps = (
+            checkpoints.steps[:shared]
+            + variant_checkpoints.steps[shared : len(variant_resumed)]
+        )
+
+        variant_flows = runner.apply_steps(
+            variant_config,
+            variant_checkpoints,
+            variant_resumed,
+            start=shared + 1,
+            flows=OrgDocument.from_file(flows.path) if flows is not None else None,
+            variant=name,
+        )
+        write_outputs(variant_config, variant_flows, runner.telemetry)
+        write_meta(variant_config, meta | {"variant": name}, variant_config.outputpath)
+        print(f"Variant done, variant={name}, output={variant_config.outputpath}")
+
+    with ThreadPoolExecutor(len(variants)) as executor:
+        for future in [
+            executor.submit(build, name, variant_config)
+            for name, variant_config in variants.items()
+        ]:
+            future.result()
+
+
+def variant_configs(config):
+    """Return the config of each variant of config, by name."""
+    variants = {}
+    step_ids = {step_config.id for step_config in config.steps}
+    for name, variant in config.variants.items():
+        unknown = set(variant.steps) - step_ids
+        if unknown:
+            print(f"Variant {name} changes unknown steps: {', '.join(unknown)}")
+            raise ValueError(f"Invalid variant {name}")
+        variant_config = copy.copy(config)
+        variant_config.variants = {}
+        variant_config.outputpath = os.path.join(config.outputpath, name)
+        variant_config.temppath = os.path.join(config.temppath, "variants", name)
+        if variant.output_split_number is not None:
+            variant_config.output_split_number = variant.output_split_number
+        try:
+            variant_config.steps = [
+                dataclasses.replace(
+                    step_config, **variant.steps.get(step_config.id, {})
+                )
+                for step_config in config.steps
+            ]
+        except TypeError as e:
+            print(f"Variant {name} changes invalid step fields: {e}")
+            raise ValueError(f"Invalid variant {name}")
+        variants[name] = variant_config
+    return variants
+
+
+def shared_steps(config, variant_configs):
+    """Number of steps at the start of config that are the same in all variants."""
+    count = 0
+    for step_configs in zip(config.steps, *(c.steps for c in variant_configs)):
+        if any(step_config != step_configs[0] for step_config in step_configs):
+            break
+        count += 1
+    return count
+
+
+class StepRunner:
+    """
+    Applies the steps of a config one after the other.
 
-    steps.split_rapidpro_json(config, output_file)
-    print("Result written to output folder")
-    steps.write_diffable(config, output_file)
-    print("Diffable written to output folder")
+    Steps that do not produce flows are run as side branches in executor, see
+    apply_side_branch, and collect_side_branches waits for them.
+    """
+
+    def __init__(self, telemetry, executor):
+        self.telemetry = telemetry
+        self.executor = executor
+        self.side_branches = []
+
+    def apply_steps(self, config, checkpoints, resumed, start=1, flows=None, **fields):
+        """Apply the steps of config from step number start on to flows.
+
+        Steps whose outputs are in resumed (the outputs of the steps from step
+        number 1 on) are not executed again. The fields are added to the
+        telemetry record of each step.
+        """
+        input_description = describe_flows(flows, load=not config.streaming)
+        for step_num, step_config in enumerate(config.steps[start - 1 :], start):
+            if (
+                step_num > len(resumed)
+                and step_config.type in UNCACHED_STEPS
+                and flows is not None
+            ):
+                # These steps do not produce flows, so the following steps do
+                # not need to wait for them. They read the file of the flows,
+                # which the following steps do not modify.
+                future = self.executor.submit(
+                    self.apply_side_branch,
+                    config,
+                    step_config,
+                    step_num,
+                    OrgDocument.from_file(flows.to_file()),
+                    input_description,
+                    checkpoints,
+                    fields,
+                )
+                self.side_branches.append((step_config, future))
+                print(f"Started step {step_config.type} as a side branch")
+                continue
+            with self.telemetry.measure(
+                step_config.id, "step", type=step_config.type, **fields
+            ) as record:
+                if step_num <= len(resumed):
+                    flows = resumed[step_num - 1]
+                    record.update({"cached": True, "resumed": True})
+                    action = "Resumed"
+                else:
+                    flows = apply_step(
+                        config, step_config, step_num, flows, record, checkpoints
+                    )
+                    action = "Applied"
+            print(f"{action} step {step_config.type}, result stored at {flows.path}")
+            output_description = describe_flows(flows, load=not config.streaming)
+            record.update(flow_descriptions(input_description, output_description))
+            input_description = output_description
+        return flows
+
+    def apply_side_branch(
+        self,
+        config,
+        step_config,
+        step_number,
+        step_input,
+        description,
+        checkpoints,
+        fields,
+    ):
+        """Apply a step that does not produce flows alongside the following steps."""
+        with self.telemetry.measure(
+            step_config.id, "step", type=step_config.type, side_branch=True, **fields
+        ) as record:
+            apply_step(
+                config, step_config, step_number, step_input, record, checkpoints
+            )
+            record.update(flow_descriptions(description, description))
+        print(f"Applied step {step_config.type} as a side branch")
+
+    def collect_side_branches(self):
+        """Wait for the side branches to finish and raise the first failure."""
+        errors = []
+        for step_config, future in self.side_branches:
+            error = future.exception()
+            if error is not None:
+                print(f"Side branch step {step_config.id} failed: {error!r}")
+                errors.append(error)
+        if errors:
+            raise errors[0]
+
+
+def flow_descriptions(input_description, output_description):
+    return {
+        "input_hash": input_description["hash"],
+        "input_size": input_description["size"],
+        "input_flows": input_description["flows"],
+        "output_hash": output_description["hash"],
+        "output_size": output_description["size"],
+        "output_flows": output_description["flows"],
+    }
+
+
+def write_outputs(config, flows, telemetry):
+    """Write the result and the diffable sheets to the output folder."""
+
+    def write(name, function):
+        with telemetry.measure(name, "output"):
+            function(config, flows)
+
+    # Load the org once, rather than in each writer. When streaming, each
+    # writer reads the flows one by one instead.
+    if not config.streaming:
+        flows.org
+    with ThreadPoolExecutor() as executor:
+        for future in [
+            executor.submit(write, "split_rapidpro_json", steps.split_rapidpro_json),
+            executor.submit(write, "write_diffable", steps.write_diffable),
+        ]:
+            future.result()
+    print("Result and diffable written to output folder")
 
 
 STEP_MAPPING = {
@@ -45,11 +312,68 @@ STEP_MAPPING = {
     "update_expiration_times": steps.update_expiration_times,
 }
 
+# Steps implemented in Python that take an OrgDocument rather than a file path
+# as input, so consecutive such steps can share one org in memory.
+DOCUMENT_STEPS = {
+    "update_expiration_times",
+}
+
 
-def apply_step(config, step_config, step_number, step_input_file):
+def apply_step(
+    config, step_config, step_number, step_input, record=None, checkpoints=None
+):
+    """Apply a step to the OrgDocument step_input and return the resulting one.
+
+    If a telemetry record is given, whether a cached output was reused is noted
+    in it. If checkpoints are given, the completed step is recorded in them.
+    """
+    if record is not None:
+        record["cached"] = False
     step_type = step_config.type
     function = STEP_MAPPING[step_type]
-    step_output_file = function(config, step_config, step_number, step_input_file)
-    if step_output_file is not None:
-        return step_output_file
-    return step_input_file
+
+    cache = StepCache.from_config(config)
+    if step_type in UNCACHED_STEPS:
+        cache = None
+    key = None
+    if cache:
+        input_digest = step_input.digest if step_input else None
+        key = cache.key(config, step_config, step_number, input_digest)
+        cached_output_file = cache.restore(key, config.temppath)
+        if cached_output_file is not None:
+            print(f"Reusing cached output of step {step_config.id}")
+            if record is not None:
+                record["cached"] = True
+            step_output = OrgDocument.from_file(cached_output_file)
+            if checkpoints is not None:
+                checkpoints.record(
+                    config, step_config, step_number, step_input, step_output, key
+                )
+            return step_output
+
+    if step_type in DOCUMENT_STEPS or step_input is None:
+        step_output = function(config, step_config, step_number, step_input)
+    elif isinstance(step_config, IncrementalStepConfig) and (
+        step_config.incremental and config.cachepath
+    ):
+        step_output = flow_cache.apply_incremental(
+            function, config, step_config, step_number, step_input
+        )
+    elif getattr(step_config, "shards", 1) != 1:
+        step_output = shards.apply_sharded(
+            function, config, step_config, step_number, step_input
+        )
+    else:
+        step_output = function(config, step_config, step_number, step_input.to_file())
+
+    if step_output is None:
+        step_output = step_input
+    elif not isinstance(step_output, OrgDocument):
+        step_output = OrgDocument.from_file(step_output)
+    if cache:
+        cache.store(key, step_output)
+    if checkpoints is not None:
+        checkpoints.record(
+            config, step_config, step_number, step_input, step_output, key
+        )
+    return step_output
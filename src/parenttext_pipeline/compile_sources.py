@@ -1,13 +1,13 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import shutil
-import tempfile
 
-from parenttext_pipeline.pull_data import unpack_archive
 from parenttext_pipeline.configs import load_config
+from parenttext_pipeline.materialize import materialize_tree
+from parenttext_pipeline.parent_cache import ParentCache
 
 
-def compile_sources(repo_folder, destination_folder):
+def compile_sources(repo_folder, destination_folder, parents=None):
     """
     Compile flattened sources such that parent content is included directly.
 
@@ -18,31 +18,38 @@ def compile_sources(repo_folder, destination_folder):
     Args:
         repo_folder: local path to folder containing config
         destination_folder: local path where compiled input files should be written
+        parents: ParentCache to fetch parent repositories from; by default, one
+            using the cachepath of the config in repo_folder
     Returns:
         A list of sources based on the sources in config.json in the repo_folder,
         each source flattened so that parent content is included directly.
     """
 
-    destination_folder = Path(destination_folder)
-    repo_folder = Path(repo_folder)
+    destination_folder = Path(destination_folder).absolute()
+    repo_folder = Path(repo_folder).absolute()
     os.makedirs(destination_folder, exist_ok=True)
     config = load_config(repo_folder)
-    parent_source_configs = {}
-    for parent_id, parent in config.parents.items():
-        parent_destination_folder = destination_folder / parent_id
-        with tempfile.TemporaryDirectory() as temp_dir:
-            if parent.location.endswith(".zip"):
-                unpack_archive(temp_dir, parent.location)
-            else:
-                shutil.copytree(parent.location, Path(temp_dir) / "archive")
-            # after extracting, all the stuff is inside a subfolder
-            # which we need to identify.
-            folder_contents = os.listdir(temp_dir)
-            assert len(folder_contents) == 1
-            archive_content_folder = Path(temp_dir) / folder_contents[0]
-            parent_source_configs[parent_id] = compile_sources(
-                archive_content_folder, parent_destination_folder
-            )
+    if parents is None:
+        with ParentCache.from_config(config) as parents:
+            return compile_sources(repo_folder, destination_folder, parents)
+
+    def compile_parent(parent_id, parent):
+        archive_content_folder = parents.fetch(parent.location)
+        return compile_sources(
+            archive_content_folder, destination_folder / parent_id, parents
+        )
+
+    # Parents are compiled into separate folders at the same time. Their files
+    # are merged afterwards, in the order of the config, so that files of later
+    # parents and of the child override those of earlier parents.
+    with ThreadPoolExecutor() as executor:
+        futures = {
+            parent_id: executor.submit(compile_parent, parent_id, parent)
+            for parent_id, parent in config.parents.items()
+        }
+        parent_source_configs = {
+            parent_id: future.result() for parent_id, future in futures.items()
+        }
     for source_id, source in config.sources.items():
         files_list = []
         files_dict = {}
@@ -52,10 +59,9 @@ def compile_sources(repo_folder, destination_folder):
             parent_id, psource_id = split
             psource = parent_source_configs[parent_id][psource_id]
             # Merge in parent file lists/dicts and copy referenced input files
-            shutil.copytree(
+            materialize_tree(
                 destination_folder / parent_id / psource_id,
                 destination_folder / source_id,
-                dirs_exist_ok=True,
             )
             for file in psource.files_list:
                 files_list.append(file)
@@ -64,9 +70,7 @@ def compile_sources(repo_folder, destination_folder):
         source.files_list = files_list + source.files_list
         source.files_dict = files_dict | source.files_dict
         source.parents = []
-    shutil.copytree(
-        Path(repo_folder) / config.inputpath, destination_folder, dirs_exist_ok=True
-    )
+    materialize_tree(Path(repo_folder) / config.inputpath, destination_folder)
     return config.sources
 
 
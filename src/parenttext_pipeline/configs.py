@@ -4,6 +4,7 @@ from pathlib import Path
 import contextlib
 import os
 import runpy
+import threading
 
 from parenttext_pipeline.config_converter import convert_config
 
@@ -19,12 +20,32 @@ class StepConfig:
     sources: list = field(default_factory=list)
 
 
+@dataclass(kw_only=True)
+class ShardedStepConfig(StepConfig):
+    # Number of shards to split the flows into, which the step processes in
+    # parallel, 0 for one per CPU core
+    shards: int = 1
+
+
+@dataclass(kw_only=True)
+class IncrementalStepConfig(StepConfig):
+    # Only send flows that changed since a previous run to the Node scripts, and
+    # reuse the stored outputs of the others. Requires cachepath to be set.
+    incremental: bool = False
+
+
 @dataclass(kw_only=True)
 class CreateFlowsStepConfig(StepConfig):
     # Name of the Python module containing data models describing the data sheets
     models_module: str = None
     # Tags for RPFT create_flows operation
     tags: list
+    # Only render flows whose templates or data rows have changed since the
+    # previous run, and carry over the others from the previous org. Requires
+    # cachepath to be set. Relies on internals of RPFT, see incremental.py.
+    incremental: bool = False
+    # Number of processes to render flows in, 0 for one per CPU core
+    processes: int = 1
 
 
 @dataclass(kw_only=True)
@@ -50,7 +71,7 @@ class UpdateExpirationStepConfig(StepConfig):
 
 
 @dataclass(kw_only=True)
-class QRTreatmentStepConfig(StepConfig):
+class QRTreatmentStepConfig(ShardedStepConfig, IncrementalStepConfig):
 
     # str: how to process quick replies
     # move: Remove quick replies and add equivalents to them to the message text,
@@ -102,13 +123,16 @@ class QRTreatmentStepConfig(StepConfig):
 
 
 @dataclass(kw_only=True)
-class TranslationStepConfig(StepConfig):
+class TranslationStepConfig(IncrementalStepConfig):
     # Languages that will be looked for to localize back into the flows
     # Should be a subset of the languages specified in the source.
     # Each entry is a dict with two keys:
     # "language" is the 3-letter code used in RapidPro
     # "code" is the 2 letter code used in CrowdIn
     languages: list[dict]
+    # Localize all languages into the input flows in parallel and merge the
+    # results, instead of adding one language after the other
+    parallel_languages: bool = False
 
 
 STEP_CONFIGS = {
@@ -120,10 +144,13 @@ STEP_CONFIGS = {
     "qr_treatment": QRTreatmentStepConfig,
     "load_flows": StepConfig,
     "extract_texts_for_translators": StepConfig,
-    "fix_arg_qr_translation": StepConfig,
+    "fix_arg_qr_translation": ShardedStepConfig,
     "has_any_word_check": StepConfig,
     "overall_integrity_check": StepConfig,
 }
+# Steps that look at several flows at once, e.g. at the flows that another flow
+# refers to, and therefore cannot process shards of the flows separately
+UNSHARDABLE_STEPS = {"has_any_word_check", "overall_integrity_check", "safeguarding"}
 
 
 @dataclass(kw_only=True)
@@ -132,6 +159,16 @@ class ParentReference:
     location: str
 
 
+@dataclass(kw_only=True)
+class VariantConfig:
+    # Fields of steps to change for this variant, by step id, e.g.
+    # {"qr_treatment": {"qr_treatment": "wechat"}}
+    steps: dict[str, dict] = field(default_factory=dict)
+    # Number of files to split the output of this variant into, if different
+    # from output_split_number
+    output_split_number: int = None
+
+
 @dataclass(kw_only=True)
 class SourceConfig:
     # Format of the source data
@@ -255,9 +292,30 @@ class Config:
     temppath: str = "temp"
     outputpath: str = "output"
     inputpath: str = "input"
+    # Folder to store step outputs, parent repositories and the history of runs
+    # in, so they can be reused by later runs. Caching is disabled if None.
+    cachepath: str = None
+    # Folder in which relative temppath and outputpath are created, by default
+    # the folder of the config. Runs with different workspaces do not share any
+    # files they write, so they can execute at the same time.
+    workspace: str = None
+    # Folder the config was loaded from, from which node_modules and the other
+    # relative paths are resolved. Set by load_config.
+    root: str = field(default=".", init=False)
+    # Run Node scripts in long-lived worker processes instead of starting a new
+    # Node process for every operation
+    node_worker: bool = True
     flows_outputbasename: str
     # Number of files to split the output into
     output_split_number: int = 1
+    # Read and write the org one flow at a time in the steps and output writers
+    # implemented in Python, instead of loading it into memory, so that memory
+    # use depends on the size of the largest flow rather than of the whole org
+    streaming: bool = False
+    # Variants of the output that differ only in later steps, by name. The steps
+    # that are the same for all variants are executed once, and the remaining
+    # steps of each variant are executed in parallel.
+    variants: dict[str, VariantConfig] = field(default_factory=dict)
 
     def __post_init__(self):
         steps = []
@@ -266,6 +324,12 @@ class Config:
             step_config_class = STEP_CONFIGS.get(step_type)
             if step_config_class is None:
                 raise ValueError(f"Unknown step type: {step_type}")
+            if step_type in UNSHARDABLE_STEPS:
+                if step_config.get("shards", 1) != 1:
+                    raise ValueError(f"Steps of type {step_type} cannot be sharded")
+                step_config = {
+                    key: value for key, value in step_config.items() if key != "shards"
+                }
             steps.append(step_config_class(**step_config))
         self.steps = steps
 
@@ -283,23 +347,55 @@ class Config:
             parents[parent_name] = ParentReference(**parent_config)
         self.parents = parents
 
+        self.variants = {
+            name: VariantConfig(**variant) for name, variant in self.variants.items()
+        }
+
+    def resolve_paths(self, root):
+        """Make the paths of the config absolute, relative to the folder root."""
+        self.root = os.path.abspath(root)
+        workspace = os.path.join(self.root, self.workspace or "")
+        self.inputpath = os.path.join(self.root, self.inputpath)
+        if self.cachepath:
+            self.cachepath = os.path.join(self.root, self.cachepath)
+        self.temppath = os.path.join(workspace, self.temppath)
+        self.outputpath = os.path.join(workspace, self.outputpath)
+
 
 class ConfigError(Exception):
     pass
 
 
+# The working directory is shared by all threads. Hold this lock to change it,
+# or to resolve relative paths while other threads may be loading configs.
+CWD_LOCK = threading.RLock()
+
+
 @contextlib.contextmanager
 def change_cwd(new_cwd):
-    cwd = os.getcwd()
-    os.chdir(new_cwd)
+    with CWD_LOCK:
+        cwd = os.getcwd()
+        os.chdir(new_cwd)
 
-    try:
-        yield
-    finally:
-        os.chdir(cwd)
+        try:
+            yield
+        finally:
+            os.chdir(cwd)
+
+
+def load_config(path=".", workspace=None):
+    """Load the config in the folder path, with all paths made absolute.
+
+    If workspace is given, it replaces the workspace of the config.
+    """
+    config = read_config(path)
+    if workspace is not None:
+        config.workspace = workspace
+    config.resolve_paths(path)
+    return config
 
 
-def load_config(path="."):
+def read_config(path):
     try:
         with open(Path(path) / "config.json") as f:
             config = json.load(f)
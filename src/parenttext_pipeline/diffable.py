@@ -0,0 +1,107 @@
+import hashlib
+import os
+import shutil
+from importlib.metadata import version
+
+from rpft.rapidpro.models.containers import FlowContainer
+
+from parenttext_pipeline import jsonio
+from parenttext_pipeline.incremental import UUID_PATTERN
+
+# Hashes of the flows whose sheets are in the folder, to compare against on the
+# next run
+HASHES_FILE = ".flow_hashes.json"
+
+
+def write_diffable_sheets(org, folder):
+    """Write each flow of the org as a sheet without UUIDs into folder.
+
+    Only the sheets of flows that have changed since the sheets were last
+    written are written again, and the sheets of flows that are not in the org
+    anymore are removed. Flows that only differ in their UUIDs have the same
+    sheet, so they are not written again either.
+    """
+    write_flow_sheets(org.get("flows", []), folder)
+
+
+def write_flow_sheets(flows, folder):
+    """Write the sheets of an iterable of flows, see write_diffable_sheets.
+
+    The flows are only iterated over once, so they can be read one by one.
+    """
+    key = {"rpft": version("rpft"), "format": "csv"}
+    previous = load_hashes(folder, key)
+    if previous is None:
+        # Unknown content, start from scratch
+        if os.path.exists(folder):
+            shutil.rmtree(folder)
+        previous = {}
+    os.makedirs(folder, exist_ok=True)
+
+    hashes = {}
+    changed = 0
+    for flow in flows:
+        name = flow["name"]
+        hashes[name] = flow_hash(flow)
+        if previous.get(name) != hashes[name] or not os.path.isfile(
+            sheet_path(folder, name)
+        ):
+            sheet = FlowContainer.from_dict(flow).to_row_data_sheet(True, False)
+            sheet.export(sheet_path(folder, name), "csv")
+            changed += 1
+
+    removed = [name for name in previous if name not in hashes]
+    for name in removed:
+        if os.path.isfile(sheet_path(folder, name)):
+            os.remove(sheet_path(folder, name))
+
+    jsonio.dump(key | {"flows": hashes}, os.path.join(folder, HASHES_FILE), indent=2)
+    print(
+        f"Diffable written, changed={changed}, removed={len(removed)}, "
+        f"unchanged={len(hashes) - changed}"
+    )
+
+
+def sheet_path(folder, flow_name):
+    return os.path.join(folder, f"{flow_name}.csv")
+
+
+def flow_hash(flow):
+    """Hash of a flow that does not depend on the values of its UUIDs."""
+    content = jsonio.dumpb(canonical_uuids(flow, {}))
+    return hashlib.sha256(content).hexdigest()
+
+
+def canonical_uuids(value, uuids):
+    """Replace UUIDs by numbers, in the order in which they first occur.
+
+    Only UUIDs in fields named like UUIDs and in keys are replaced, so that
+    UUIDs in texts still count as content.
+    """
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            if UUID_PATTERN.fullmatch(key):
+                key = canonical_uuid(key, uuids)
+            if key.endswith("uuid") and isinstance(item, str):
+                result[key] = canonical_uuid(item, uuids)
+            else:
+                result[key] = canonical_uuids(item, uuids)
+        return result
+    if isinstance(value, list):
+        return [canonical_uuids(item, uuids) for item in value]
+    return value
+
+
+def canonical_uuid(uuid, uuids):
+    return f"uuid-{uuids.setdefault(uuid, len(uuids))}"
+
+
+def load_hashes(folder, key):
+    try:
+        hashes = jsonio.load(os.path.join(folder, HASHES_FILE))
+    except (FileNotFoundError, ValueError):
+        return None
+    if {name: hashes.get(name) for name in key} != key:
+        return None
+    return hashes.get("flows", {})
@@ -1,12 +1,12 @@
-import json
 from itertools import islice
 
 import openpyxl
 
+from parenttext_pipeline import jsonio
+
 
 def process_keywords_to_file(sources, output):
-    with open(output, "w") as outfile:
-        json.dump(process_keywords(sources), outfile, indent=4)
+    jsonio.dump(process_keywords(sources), output, indent=4)
 
 
 def process_keywords(sources):
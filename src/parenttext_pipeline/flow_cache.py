@@ -0,0 +1,152 @@
+"""
+Reuse the outputs of steps for single flows.
+
+Steps whose Node scripts process each flow on its own (translation, QR treatment)
+only need to be applied to the flows that changed since a previous run. The
+output of each flow is stored under a key derived from the content of the flow,
+the rest of the org (fields, groups, campaigns, ...) and the key of the step,
+which covers the step config and the input files of its sources (see
+cache.step_key). Only flows for which nothing is stored are sent to the Node
+scripts. Steps that look at other flows than the one they process, such as
+safeguarding, cannot be applied this way.
+
+Besides the flows, a step may change the rest of the org, e.g. add a group that
+the flows it modified refer to. The rest of the org produced together with a
+flow is therefore stored as well, and merged into the output.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from parenttext_pipeline import jsonio, shards
+from parenttext_pipeline.cache import step_key
+from parenttext_pipeline.common import make_output_filepath
+from parenttext_pipeline.org import OrgDocument
+
+
+class FlowCache:
+    """
+    Store of the outputs of steps for single flows.
+
+    Each entry holds the output flow and the hash of the rest of the org that was
+    produced with it, which is stored separately, as it is shared by all flows
+    processed together.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path) / "flows"
+
+    @classmethod
+    def from_config(cls, config):
+        if not config.cachepath:
+            return None
+        return cls(config.cachepath)
+
+    def lookup(self, key):
+        """Return the output flow stored under key and the hash of its org."""
+        try:
+            entry = jsonio.load(self.path / key[:2] / f"{key}.json")
+        except (FileNotFoundError, ValueError):
+            return None
+        if not (self.path / "orgs" / f"{entry['org']}.json").is_file():
+            return None
+        return entry
+
+    def load_org(self, digest):
+        return jsonio.load(self.path / "orgs" / f"{digest}.json")
+
+    def store(self, keys, org):
+        """Store the flows of org, with the rest of the org.
+
+        keys maps the UUIDs of the flows to store to their keys.
+        """
+        rest = {key: value for key, value in org.items() if key != "flows"}
+        digest = json_hash(rest)
+        self._write(self.path / "orgs" / f"{digest}.json", rest)
+        for flow in org.get("flows", []):
+            key = keys.get(flow.get("uuid"))
+            if key is not None:
+                entry = {"flow": flow, "org": digest}
+                self._write(self.path / key[:2] / f"{key}.json", entry)
+
+    def _write(self, path, content):
+        if path.exists():
+            return
+        os.makedirs(path.parent, exist_ok=True)
+        # Write to a scratch file first so that an interrupted run never leaves
+        # a partial entry behind.
+        fd, scratch = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        os.close(fd)
+        jsonio.dump(content, scratch)
+        os.replace(scratch, path)
+
+
+def apply_incremental(function, config, step_config, step_number, step_input):
+    """Apply a step function to the flows of step_input that are not cached.
+
+    Returns the OrgDocument with the outputs of all flows, in the order of the
+    input flows.
+    """
+    cache = FlowCache.from_config(config)
+    org = step_input.org
+    flows = org.get("flows", [])
+    rest = {key: value for key, value in org.items() if key != "flows"}
+    key = step_key(config, step_config, step_number, json_hash(rest))
+    flow_keys = [json_hash({"step": key, "flow": flow}) for flow in flows]
+    entries = [cache.lookup(flow_key) for flow_key in flow_keys]
+    changed = [flow for flow, entry in zip(flows, entries) if entry is None]
+    print(
+        f"Flow cache lookup done, step={step_config.id}, "
+        f"reused={len(flows) - len(changed)}, changed={len(changed)}"
+    )
+
+    orgs = []
+    if changed or not flows:
+        changed_input = OrgDocument(
+            make_output_filepath(
+                config, f"_{step_number}_{step_config.id}_changed_flows.json"
+            ),
+            rest | {"flows": changed},
+        )
+        if getattr(step_config, "shards", 1) != 1:
+            changed_output = shards.apply_sharded(
+                function, config, step_config, step_number, changed_input
+            )
+        else:
+            changed_output = function(
+                config, step_config, step_number, changed_input.to_file()
+            )
+        if not isinstance(changed_output, OrgDocument):
+            changed_output = OrgDocument.from_file(changed_output)
+        orgs.append(changed_output.org)
+        cache.store(
+            {
+                flow["uuid"]: flow_key
+                for flow, flow_key, entry in zip(flows, flow_keys, entries)
+                if entry is None and "uuid" in flow
+            },
+            changed_output.org,
+        )
+
+    reused = {}
+    for entry in entries:
+        if entry is not None:
+            reused.setdefault(entry["org"], []).append(entry["flow"])
+    for digest, reused_flows in reused.items():
+        orgs.append(cache.load_org(digest) | {"flows": reused_flows})
+
+    merged = shards.merge_orgs(orgs)
+    position = {flow.get("uuid"): i for i, flow in enumerate(flows)}
+    merged["flows"].sort(key=lambda flow: position.get(flow.get("uuid"), len(flows)))
+    return OrgDocument(
+        make_output_filepath(config, f"_{step_number}_{step_config.id}.json"),
+        merged,
+    )
+
+
+def json_hash(value):
+    content = json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
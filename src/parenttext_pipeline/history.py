@@ -0,0 +1,398 @@
+"""
+Database of the runs of pipeline operations.
+
+Every run of pull_data, compile_flows, pot_output and media_ops adds a record
+with the config hash and pipeline version, and the measurements of each of its
+parts (sources, steps and outputs, see telemetry). The database is a SQLite
+file in the cache folder, shared by all workspaces.
+
+The runs can be listed and compared with:
+
+    python -m parenttext_pipeline.history list
+    python -m parenttext_pipeline.history compare [RUN_A RUN_B]
+    python -m parenttext_pipeline.history regressions
+"""
+
+import argparse
+import contextlib
+import hashlib
+import os
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from parenttext_pipeline import pipeline_version
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    operation TEXT NOT NULL,
+    started TEXT NOT NULL,
+    wall_time REAL,
+    status TEXT NOT NULL,
+    pipeline_version TEXT,
+    config_version TEXT,
+    config_hash TEXT,
+    workspace TEXT
+);
+CREATE TABLE IF NOT EXISTS parts (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    name TEXT NOT NULL,
+    category TEXT NOT NULL,
+    type TEXT,
+    cached INTEGER,
+    wall_time REAL,
+    cpu_time REAL,
+    children_cpu_time REAL,
+    max_rss INTEGER,
+    children_max_rss INTEGER,
+    input_hash TEXT,
+    output_hash TEXT,
+    input_size INTEGER,
+    output_size INTEGER,
+    input_flows INTEGER,
+    output_flows INTEGER
+);
+CREATE INDEX IF NOT EXISTS parts_by_name ON parts (name, category);
+"""
+PART_FIELDS = [
+    "name",
+    "category",
+    "type",
+    "cached",
+    "wall_time",
+    "cpu_time",
+    "children_cpu_time",
+    "max_rss",
+    "children_max_rss",
+    "input_hash",
+    "output_hash",
+    "input_size",
+    "output_size",
+    "input_flows",
+    "output_flows",
+]
+# Runs waiting for another run to finish writing give up after this many seconds
+LOCK_TIMEOUT = 60
+
+
+class RunHistory:
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    @classmethod
+    def from_config(cls, config):
+        if not config.cachepath:
+            return None
+        return cls(Path(config.cachepath) / "history.sqlite")
+
+    @contextlib.contextmanager
+    def connect(self):
+        os.makedirs(self.path.parent, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT)
+        connection.row_factory = sqlite3.Row
+        try:
+            connection.executescript(SCHEMA)
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def record(self, run, parts):
+        """Add a run and the records of its parts; return the id of the run."""
+        with self.connect() as connection:
+            run_id = connection.execute(
+                "INSERT INTO runs (operation, started, wall_time, status, "
+                "pipeline_version, config_version, config_hash, workspace) "
+                "VALUES (:operation, :started, :wall_time, :status, "
+                ":pipeline_version, :config_version, :config_hash, :workspace)",
+                run,
+            ).lastrowid
+            connection.executemany(
+                f"INSERT INTO parts (run_id, {', '.join(PART_FIELDS)}) "
+                f"VALUES (?, {', '.join('?' * len(PART_FIELDS))})",
+                [
+                    [run_id] + [part.get(field) for field in PART_FIELDS]
+                    for part in parts
+                ],
+            )
+        return run_id
+
+    def runs(self, operation=None, limit=20):
+        """The latest runs, most recent first."""
+        query = "SELECT * FROM runs"
+        args = []
+        if operation:
+            query += " WHERE operation = ?"
+            args.append(operation)
+        query += " ORDER BY id DESC LIMIT ?"
+        args.append(limit)
+        with self.connect() as connection:
+            return [dict(row) for row in connection.execute(query, args)]
+
+    def run(self, run_id):
+        with self.connect() as connection:
+            row = connection.execute(
+                "SELECT * FROM runs WHERE id = ?", [run_id]
+            ).fetchone()
+        if row is None:
+            raise ValueError(f"No run with id {run_id} in {self.path}")
+        return dict(row)
+
+    def parts(self, run_id):
+        with self.connect() as connection:
+            return [
+                dict(row)
+                for row in connection.execute(
+                    "SELECT * FROM parts WHERE run_id = ? ORDER BY rowid", [run_id]
+                )
+            ]
+
+    def durations(self, name, category, limit=5, before=None):
+        """Wall times of the latest successful runs that executed a part.
+
+        Parts that were reused from the cache are left out, as they do not tell
+        how long executing the part takes. If before is given, only runs with a
+        lower id are considered.
+        """
+        query = (
+            "SELECT parts.wall_time FROM parts JOIN runs ON runs.id = parts.run_id "
+            "WHERE parts.name = ? AND parts.category = ? AND runs.status = 'ok' "
+            "AND NOT coalesce(parts.cached, 0)"
+        )
+        args = [name, category]
+        if before is not None:
+            query += " AND runs.id < ?"
+            args.append(before)
+        query += " ORDER BY runs.id DESC LIMIT ?"
+        args.append(limit)
+        with self.connect() as connection:
+            return [row[0] for row in connection.execute(query, args)]
+
+    def estimate(self, name, category, limit=5):
+        """Median wall time of the part in the latest runs, or None."""
+        durations = self.durations(name, category, limit)
+        return statistics.median(durations) if durations else None
+
+
+@contextlib.contextmanager
+def recorded_run(config, operation, telemetry):
+    """Record the run of the enclosed block in the history of config.
+
+    Yields the record of the run; its status is "ok" unless the block raises
+    or the status is changed.
+    """
+    run = {
+        "operation": operation,
+        "started": datetime.now(timezone.utc).isoformat(),
+        "status": "ok",
+        "pipeline_version": pipeline_version(),
+        "config_version": config.meta.get("version") or "legacy",
+        "config_hash": config_hash(config.root),
+        "workspace": config.workspace,
+    }
+    start = time.perf_counter()
+    try:
+        yield run
+    except BaseException:
+        run["status"] = "failed"
+        raise
+    finally:
+        run["wall_time"] = round(time.perf_counter() - start, 6)
+        history = RunHistory.from_config(config)
+        if history is not None:
+            try:
+                run_id = history.record(run, telemetry.records)
+                print(f"Run recorded, id={run_id}, history={history.path}")
+            except sqlite3.Error as e:
+                print(f"Run not recorded, history={history.path}, {e}")
+
+
+def config_hash(root):
+    for name in ["config.json", "config.py"]:
+        path = Path(root) / name
+        if path.is_file():
+            with open(path, "rb") as f:
+                return hashlib.file_digest(f, "sha256").hexdigest()
+    return None
+
+
+def compare(history, run_a, run_b):
+    """Print the differences between two runs, part by part."""
+    a, b = history.run(run_a), history.run(run_b)
+    print(f"Runs {a['id']} ({a['started']}) and {b['id']} ({b['started']})")
+    for field in ["operation", "status", "pipeline_version", "config_hash"]:
+        marker = "" if a[field] == b[field] else "  changed"
+        print(f"{field:>25}: {a[field]} -> {b[field]}{marker}")
+    print(f"{'wall_time':>25}: {format_change(a['wall_time'], b['wall_time'])}")
+
+    parts_a = {(p["category"], p["name"]): p for p in history.parts(run_a)}
+    for part in history.parts(run_b):
+        before = parts_a.get((part["category"], part["name"]))
+        if before is None:
+            print(f"{part['name']:>25}: new, {part['wall_time']:.1f}s")
+            continue
+        notes = []
+        if before["cached"] != part["cached"]:
+            notes.append("cached" if part["cached"] else "executed")
+        if before["input_hash"] != part["input_hash"]:
+            notes.append("input changed")
+        for field in ["input_size", "output_size", "output_flows"]:
+            if before[field] != part[field]:
+                notes.append(f"{field} {format_change(before[field], part[field])}")
+        print(
+            f"{part['name']:>25}: "
+            f"{format_change(before['wall_time'], part['wall_time'])}"
+            + (f"  ({', '.join(notes)})" if notes else "")
+        )
+
+
+def regressions(history, run_id, threshold=1.5, minimum=1.0, window=5):
+    """Parts of a run that took much longer than in the runs before.
+
+    A part is a regression if it took more than threshold times its median wall
+    time in the previous window runs that executed it, and at least minimum
+    seconds more. Each regression comes with a likely cause: a different
+    pipeline version (code), larger inputs or outputs (content), or a changed
+    config.
+    """
+    run = history.run(run_id)
+    found = []
+    for part in history.parts(run_id):
+        if part["cached"] or part["wall_time"] is None:
+            continue
+        durations = history.durations(
+            part["name"], part["category"], window, before=run_id
+        )
+        if not durations:
+            continue
+        median = statistics.median(durations)
+        if part["wall_time"] < threshold * median or (
+            part["wall_time"] - median < minimum
+        ):
+            continue
+        baseline = latest_part(history, part, run_id)
+        baseline_run = history.run(baseline["run_id"])
+        found.append(
+            {
+                "name": part["name"],
+                "category": part["category"],
+                "wall_time": part["wall_time"],
+                "median": median,
+                "cause": likely_cause(run, baseline_run, part, baseline),
+            }
+        )
+    return found
+
+
+def latest_part(history, part, run_id):
+    with history.connect() as connection:
+        row = connection.execute(
+            "SELECT parts.* FROM parts JOIN runs ON runs.id = parts.run_id "
+            "WHERE parts.name = ? AND parts.category = ? AND runs.id < ? "
+            "AND runs.status = 'ok' AND NOT coalesce(parts.cached, 0) "
+            "ORDER BY runs.id DESC LIMIT 1",
+            [part["name"], part["category"], run_id],
+        ).fetchone()
+    return dict(row)
+
+
+def likely_cause(run, baseline_run, part, baseline):
+    """Why part took longer than in baseline, the part in the last run before."""
+    causes = []
+    if run["pipeline_version"] != baseline_run["pipeline_version"]:
+        causes.append("code")
+    for field in ["input_size", "output_size", "input_flows", "output_flows"]:
+        if part[field] and baseline[field] and part[field] > 1.1 * baseline[field]:
+            causes.append("content")
+            break
+    if run["config_hash"] != baseline_run["config_hash"]:
+        causes.append("config")
+    return ", ".join(causes) or "unknown"
+
+
+def format_change(before, after):
+    if before is None or after is None:
+        return f"{before} -> {after}"
+    change = f"{(after - before) / before:+.0%}" if before else ""
+    if isinstance(before, float):
+        return f"{before:.1f}s -> {after:.1f}s {change}"
+    return f"{before} -> {after} {change}"
+
+
+def init():
+    """Run the command given on the command line and return the exit status."""
+    from parenttext_pipeline.configs import load_config
+
+    parser = argparse.ArgumentParser(description="Query the history of runs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    list_parser = subparsers.add_parser("list", help="List the latest runs.")
+    list_parser.add_argument("--operation")
+    list_parser.add_argument("--limit", type=int, default=20)
+    compare_parser = subparsers.add_parser(
+        "compare",
+        help="Compare two runs, by default the latest two of the operation.",
+    )
+    compare_parser.add_argument("runs", nargs="*", type=int)
+    compare_parser.add_argument("--operation", default="compile_flows")
+    regressions_parser = subparsers.add_parser(
+        "regressions",
+        help=(
+            "List the parts of a run, by default the latest of the operation, "
+            "that took much longer than before. Exits with status 1 if any."
+        ),
+    )
+    regressions_parser.add_argument("run", nargs="?", type=int)
+    regressions_parser.add_argument("--operation", default="compile_flows")
+    regressions_parser.add_argument("--threshold", type=float, default=1.5)
+    regressions_parser.add_argument("--minimum", type=float, default=1.0)
+    args = parser.parse_args()
+
+    history = RunHistory.from_config(load_config())
+    if history is None:
+        raise ValueError("No history is recorded, as cachepath is not set")
+
+    if args.command == "list":
+        for run in history.runs(args.operation, args.limit):
+            print(
+                f"{run['id']:>5} {run['started']} {run['operation']:<14} "
+                f"{run['status']:<7} {run['wall_time']:>8.1f}s "
+                f"{run['pipeline_version']} {(run['config_hash'] or '')[:12]}"
+            )
+    elif args.command == "compare":
+        if len(args.runs) == 2:
+            run_a, run_b = args.runs
+        elif not args.runs:
+            latest = history.runs(args.operation, limit=2)
+            if len(latest) < 2:
+                raise ValueError(f"Fewer than two runs of {args.operation}")
+            run_b, run_a = latest[0]["id"], latest[1]["id"]
+        else:
+            raise ValueError("Give either two runs or none")
+        compare(history, run_a, run_b)
+    elif args.command == "regressions":
+        run_id = args.run
+        if run_id is None:
+            latest = history.runs(args.operation, limit=1)
+            if not latest:
+                raise ValueError(f"No runs of {args.operation}")
+            run_id = latest[0]["id"]
+        found = regressions(history, run_id, args.threshold, args.minimum)
+        for regression in found:
+            print(
+                f"{regression['name']:>25}: {regression['wall_time']:.1f}s, "
+                f"median {regression['median']:.1f}s, "
+                f"cause: {regression['cause']}"
+            )
+        print(f"Regressions found, run={run_id}, count={len(found)}")
+        if found:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(init())
@@ -0,0 +1,572 @@
+"""
+Incremental creation of flows from sheets.
+
+Creating flows from sheets with RPFT renders every flow, even if only a single
+content sheet has changed since the last compilation. Here, we record which
+templates, data sheets and data rows each flow was rendered from. On the next
+compilation, flows whose sources are unchanged are carried over from the
+previous org as they are, and only the other flows are rendered again.
+
+Flows keep their UUIDs from the previous org, so references between carried
+over and rendered flows stay valid. Campaigns, triggers and surveys are always
+created anew, as they are cheap to create.
+
+Flows that need to be rendered can be spread over several processes. Each
+process renders a contiguous share of the flow definitions of the content
+index, and the results are added to the org in the order of the content index,
+so the org is the same however many processes are used.
+
+Unlike rpft.converters.create_flows, this does not only use the public interface
+of RPFT: flows are rendered one at a time with FlowParser._parse_flow, and the
+UUIDs of flows and groups are assigned by subclasses of RapidProContainer and
+UUIDDict. The tests compare the output with that of rpft.converters.create_flows,
+and need to pass before the version of RPFT is changed. With other versions than
+the ones in RPFT_VERSIONS, which the tests passed with, rpft_supported is False
+and callers should use rpft.converters.create_flows instead.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from collections import Counter, namedtuple
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from importlib.metadata import version
+
+from packaging.specifiers import SpecifierSet
+from rpft.converters import get_content_index_parser
+from rpft.logger.logger import logging_context
+from rpft.parsers.creation.flowparser import FlowParser
+from rpft.parsers.creation.surveyparser import SurveyParser
+from rpft.rapidpro.models.containers import RapidProContainer, UUIDDict
+
+from parenttext_pipeline import jsonio, pipeline_version
+from parenttext_pipeline.cache import module_hash
+
+LOGGER = logging.getLogger(__name__)
+UUID_PATTERN = re.compile(
+    r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+)
+# Versions of RPFT whose internals this module has been tested with
+RPFT_VERSIONS = SpecifierSet("==1.18.0")
+# Number of shards per process, so that processes finishing early pick up more
+SHARDS_PER_PROCESS = 4
+
+SourcesUsed = namedtuple("SourcesUsed", ["templates", "data_sheets", "rows"])
+
+# Chatbot definition used by worker processes to render flows
+_worker_definition = None
+
+
+def rpft_supported():
+    """Whether the installed version of RPFT is one this module was tested with."""
+    return version("rpft") in RPFT_VERSIONS
+
+
+def create_flows(sheets, models_module, tags, state_file, processes=1):
+    """Create flows from sheets, reusing the flows stored in state_file.
+
+    Returns the org as a dict, like rpft.converters.create_flows, and stores
+    the flows together with their sources in state_file for the next run. If
+    state_file is None, all flows are rendered. Flows are rendered in the
+    given number of processes, or one per CPU core if processes is 0.
+    """
+    key = state_key(models_module, tags)
+    previous = load_state(state_file, key)
+
+    try:
+        parser = get_content_index_parser(sheets, None, models_module, tags)
+        builder = IncrementalBuilder(parser.definition, previous)
+        builder.parse_flows(processes, (sheets, models_module, tags))
+        parser.parse_all_campaigns(builder.container)
+        parser.parse_all_triggers(builder.container)
+        builder.parse_surveys()
+        org = builder.render()
+    except Exception as e:
+        LOGGER.critical(e.args[0] if e.args else e.__class__.__name__)
+        raise
+
+    print(
+        f"Flows created, rendered={len(builder.rendered)}, "
+        f"reused={len(builder.reused)}"
+    )
+    save_state(state_file, key, builder.state(org))
+    return org
+
+
+class IncrementalBuilder:
+
+    def __init__(self, definition, previous):
+        self.definition = definition
+        self.previous = previous["flows"]
+        self.previous_groups = previous["groups"]
+        self.hashes = SourceHashes(definition)
+        self.container = IncrementalContainer(previous["uuids"], self.previous_groups)
+        # Flow names in the order a full compilation produces them, mapped to
+        # the flow dict carried over or the FlowContainer rendered.
+        self.flows = {}
+        self.rendered = set()
+        self.reused = set()
+        self.sources = {}
+        self.survey_flows = []
+
+    def parse_flows(self, processes=1, sources=None):
+        """Parse all flows of the content index.
+
+        sources are the arguments to get_content_index_parser, which worker
+        processes use to read the sheets if they cannot inherit the definition.
+        """
+        entries = [
+            (index, data_row_id)
+            for index, (_, row) in enumerate(self.definition.flow_definitions)
+            for data_row_id in data_row_ids(self.definition, row)
+        ]
+        names = [
+            flow_name(self.definition.flow_definitions[index][1], data_row_id)
+            for index, data_row_id in entries
+        ]
+        duplicates = {name for name, count in Counter(names).items() if count > 1}
+
+        pending = []
+        for (index, data_row_id), name in zip(entries, names):
+            logging_prefix, row = self.definition.flow_definitions[index]
+            with logging_context(f"{logging_prefix} | {row.sheet_name[0]}"):
+                entry = self.previous.get(name)
+                definition = definition_hash(row, data_row_id)
+                if (
+                    name not in duplicates
+                    and entry is not None
+                    and entry["definition"] == definition
+                    and self.hashes.unchanged(entry["sources"])
+                ):
+                    self.flows[name] = entry["flow"]
+                    self.sources[name] = entry
+                    self.reused.add(name)
+                    self.container.record_flow_uuid(name, entry["flow"]["uuid"])
+                    continue
+
+                if name in self.flows:
+                    LOGGER.warning(
+                        f"Multiple definitions of flow '{name}'. Overwriting."
+                    )
+                # Keep the position of the flow until it is rendered
+                self.flows[name] = None
+                pending.append((index, data_row_id, name, definition))
+
+        if processes == 1 or len(pending) < 2:
+            rendered = (
+                self.render_entry(index, data_row_id, self.container)
+                for index, data_row_id, _, _ in pending
+            )
+        else:
+            rendered = self.render_in_processes(pending, processes, sources)
+
+        for (_, _, name, definition), (flow, used) in zip(pending, rendered):
+            self.flows[name] = flow
+            self.sources[name] = {
+                "definition": definition,
+                "sources": self.hashes.recorded(used),
+            }
+            self.rendered.add(name)
+
+        for name, flow in self.flows.items():
+            if name in self.rendered:
+                self.container.add_flow(flow)
+
+    def render_entry(self, index, data_row_id, container):
+        logging_prefix, row = self.definition.flow_definitions[index]
+        with logging_context(f"{logging_prefix} | {row.sheet_name[0]}"):
+            tracer = TracingDefinition(self.definition)
+            flow = self.parse_flow(row, data_row_id, tracer, container)
+        return flow, tracer.used()
+
+    def render_in_processes(self, pending, processes, sources):
+        """Render the pending flows in worker processes, in order."""
+        global _worker_definition
+
+        processes = min(processes or os.cpu_count() or 1, len(pending))
+        shards = split_evenly(
+            [(index, data_row_id) for index, data_row_id, _, _ in pending],
+            processes * SHARDS_PER_PROCESS,
+        )
+        # Where processes are forked, they inherit the definition instead of
+        # reading the sheets again.
+        _worker_definition = self.definition
+        try:
+            with ProcessPoolExecutor(
+                processes, initializer=init_worker, initargs=sources
+            ) as executor:
+                for results in executor.map(render_shard, shards):
+                    for flow, used, recorded_uuids in results:
+                        for kind, name, uuid in recorded_uuids:
+                            if kind == "flow":
+                                self.container.record_flow_uuid(name, uuid)
+                            else:
+                                self.container.record_group_uuid(name, uuid)
+                        yield flow, used
+        finally:
+            _worker_definition = None
+
+    def parse_flow(self, row, data_row_id, tracer, container):
+        with logging_context(f'with data_row_id "{data_row_id}"'):
+            return FlowParser._parse_flow(
+                row.sheet_name[0],
+                row.data_sheet,
+                data_row_id,
+                row.template_arguments,
+                container,
+                row.new_name,
+                context=self.definition.global_context,
+                definition=tracer,
+                flow_type=row.options.get("flow_type") or "messaging",
+            )
+
+    def parse_surveys(self):
+        count = len(self.container.flows)
+        SurveyParser.parse_all(self.definition, self.container)
+        self.survey_flows = [flow.name for flow in self.container.flows[count:]]
+
+    def render(self):
+        org = self.container.render()
+        rendered = {flow["name"]: flow for flow in org["flows"]}
+        flows = [
+            rendered[name] if name in self.rendered else flow
+            for name, flow in self.flows.items()
+        ]
+        flows += [rendered[name] for name in self.survey_flows]
+
+        groups = {group["name"]: group for group in org["groups"]}
+        for name in self.flows:
+            if name not in self.reused:
+                continue
+            for group_name in self.sources[name].get("groups", []):
+                if group_name not in groups and group_name in self.previous_groups:
+                    groups[group_name] = {
+                        "name": group_name,
+                        "uuid": self.previous_groups[group_name],
+                    }
+
+        return org | {"flows": flows, "groups": list(groups.values())}
+
+    def state(self, org):
+        group_names = {group["uuid"]: group["name"] for group in org["groups"]}
+        flows = {}
+        for flow in org["flows"]:
+            entry = self.sources.get(flow["name"])
+            if entry is None:
+                # Survey flows are always rendered again
+                continue
+            if flow["name"] in self.rendered:
+                entry["groups"] = referenced_groups(flow, group_names)
+            flows[flow["name"]] = entry | {"flow": flow}
+        return {
+            "flows": flows,
+            # UUIDs of flows and groups that have been removed are kept, so
+            # that they get their UUID back if they are added again.
+            "uuids": self.container.previous_flow_uuids
+            | {flow["name"]: flow["uuid"] for flow in org["flows"]},
+            "groups": self.previous_groups
+            | {group["name"]: group["uuid"] for group in org["groups"]},
+        }
+
+
+class IncrementalContainer(RapidProContainer):
+    """Container assigning flows and groups the UUIDs they had previously."""
+
+    def __init__(self, flow_uuids, group_uuids):
+        super().__init__()
+        self.previous_flow_uuids = flow_uuids
+        self.uuid_dict = PreviousUUIDDict(flow_uuids, group_uuids)
+
+    def add_flow(self, flow):
+        flow.uuid = self.previous_flow_uuids.get(flow.name, flow.uuid)
+        super().add_flow(flow)
+
+
+class RecordingContainer(RapidProContainer):
+    """Container keeping the UUIDs recorded while rendering flows in a worker.
+
+    The main process records them in the container of the org afterwards.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.recorded_uuids = []
+
+    def record_flow_uuid(self, name, uuid):
+        self.recorded_uuids.append(("flow", name, uuid))
+
+    def record_group_uuid(self, name, uuid):
+        self.recorded_uuids.append(("group", name, uuid))
+
+
+def init_worker(sheets, models_module, tags):
+    global _worker_definition
+
+    if _worker_definition is None:
+        parser = get_content_index_parser(sheets, None, models_module, tags)
+        _worker_definition = parser.definition
+
+
+def render_shard(entries):
+    builder = IncrementalBuilder(
+        _worker_definition, {"flows": {}, "uuids": {}, "groups": {}}
+    )
+    results = []
+    for index, data_row_id in entries:
+        container = RecordingContainer()
+        flow, used = builder.render_entry(index, data_row_id, container)
+        results.append((flow, used, container.recorded_uuids))
+    return results
+
+
+def split_evenly(items, n):
+    """Split items into at most n contiguous lists of similar length."""
+    n = max(1, min(n, len(items)))
+    size, extra = divmod(len(items), n)
+    shards = []
+    start = 0
+    for i in range(n):
+        end = start + size + (1 if i < extra else 0)
+        shards.append(items[start:end])
+        start = end
+    return shards
+
+
+class PreviousUUIDDict(UUIDDict):
+
+    def __init__(self, flow_uuids, group_uuids):
+        super().__init__()
+        self.previous_flow_uuids = flow_uuids
+        self.previous_group_uuids = group_uuids
+
+    def generate_missing_uuids(self):
+        for name, uuid in self.flow_dict.items():
+            if not uuid:
+                self.flow_dict[name] = self.previous_flow_uuids.get(name)
+        for name, uuid in self.group_dict.items():
+            if not uuid:
+                self.group_dict[name] = self.previous_group_uuids.get(name)
+        super().generate_missing_uuids()
+
+
+class TracingDefinition:
+    """Records the templates, data sheets and rows a flow is rendered from."""
+
+    def __init__(self, definition):
+        self._definition = definition
+        self.templates = set()
+        self.data_sheets_used = set()
+        self.rows = set()
+        self.data_sheets = TracingMapping(definition.data_sheets, self.data_sheets_used)
+
+    def __getattr__(self, name):
+        return getattr(self._definition, name)
+
+    def get_template(self, name):
+        self.templates.add(name)
+        return self._definition.get_template(name)
+
+    def get_data_sheet_rows(self, sheet_name):
+        self.data_sheets_used.add(sheet_name)
+        return self._definition.get_data_sheet_rows(sheet_name)
+
+    def get_data_sheet_row(self, sheet_name, row_id):
+        self.rows.add((sheet_name, row_id))
+        return self._definition.get_data_sheet_row(sheet_name, row_id)
+
+    def used(self):
+        return SourcesUsed(self.templates, self.data_sheets_used, self.rows)
+
+
+class TracingMapping(Mapping):
+
+    def __init__(self, mapping, accessed):
+        self.mapping = mapping
+        self.accessed = accessed
+
+    def __getitem__(self, key):
+        self.accessed.add(key)
+        return self.mapping[key]
+
+    def __iter__(self):
+        # Iterating may access any entry
+        self.accessed.update(self.mapping.keys())
+        return iter(self.mapping)
+
+    def __len__(self):
+        return len(self.mapping)
+
+
+class SourceHashes:
+    """Hashes of the parts of a chatbot definition that flows are rendered from."""
+
+    def __init__(self, definition):
+        self.definition = definition
+        self.cache = {}
+
+    def recorded(self, used):
+        sources = {"globals": self.globals()}
+        sources["templates"] = {name: self.template(name) for name in used.templates}
+        sources["data_sheets"] = {
+            name: self.data_sheet(name) for name in used.data_sheets
+        }
+        sources["rows"] = [
+            [sheet, row_id, self.row(sheet, row_id)]
+            for sheet, row_id in sorted(used.rows)
+        ]
+        return sources
+
+    def unchanged(self, sources):
+        try:
+            return (
+                sources["globals"] == self.globals()
+                and all(
+                    self.template(name) == value
+                    for name, value in sources["templates"].items()
+                )
+                and all(
+                    self.data_sheet(name) == value
+                    for name, value in sources["data_sheets"].items()
+                )
+                and all(
+                    self.row(sheet, row_id) == value
+                    for sheet, row_id, value in sources["rows"]
+                )
+            )
+        except KeyError:
+            # A template, sheet or row does not exist anymore
+            return False
+
+    def globals(self):
+        return self.cached(
+            ("globals",), lambda: digest(self.definition.global_context)
+        )
+
+    def template(self, name):
+        def compute():
+            template = self.definition.get_template(name)
+            return digest(
+                [
+                    template.table.headers,
+                    [list(row) for row in template.table],
+                    [repr(arg) for arg in template.argument_definitions],
+                ]
+            )
+
+        return self.cached(("template", name), compute)
+
+    def data_sheet(self, name):
+        def compute():
+            rows = self.definition.get_data_sheet_rows(name)
+            return digest([[row_id, dump(row)] for row_id, row in rows.items()])
+
+        return self.cached(("data_sheet", name), compute)
+
+    def row(self, sheet, row_id):
+        return self.cached(
+            ("row", sheet, row_id),
+            lambda: digest(dump(self.definition.get_data_sheet_row(sheet, row_id))),
+        )
+
+    def cached(self, key, compute):
+        if key not in self.cache:
+            self.cache[key] = compute()
+        return self.cache[key]
+
+
+def data_row_ids(definition, row):
+    if row.data_sheet and not row.data_row_id:
+        return list(definition.get_data_sheet_rows(row.data_sheet).keys())
+    if not row.data_sheet and row.data_row_id:
+        raise Exception(
+            "For create_flow, if data_row_id is provided, data_sheet must"
+            " also be provided."
+        )
+    return [row.data_row_id]
+
+
+def defined_flow_names(definition):
+    """Names of all flows created from a chatbot definition, including surveys."""
+    names = {
+        flow_name(row, data_row_id)
+        for _, row in definition.flow_definitions
+        for data_row_id in data_row_ids(definition, row)
+    }
+    questions = list(definition.survey_questions)
+    for survey in definition.surveys.values():
+        names.add(f"survey - {survey.name}")
+        questions += survey.questions
+    names.update(
+        f"survey - {question.survey_name} - question - {question.ID}"
+        for question in questions
+    )
+    return names
+
+
+def flow_name(row, data_row_id):
+    base_name = row.new_name or row.sheet_name[0]
+    if row.data_sheet and data_row_id:
+        return " - ".join([base_name, data_row_id])
+    return base_name
+
+
+def definition_hash(row, data_row_id):
+    return digest([dump(row), data_row_id])
+
+
+def referenced_groups(flow, group_names):
+    """Names of the groups whose UUIDs appear in the flow."""
+    uuids = set(UUID_PATTERN.findall(jsonio.dumps(flow)))
+    return sorted(group_names[uuid] for uuid in uuids if uuid in group_names)
+
+
+def dump(model):
+    return model.model_dump() if hasattr(model, "model_dump") else model
+
+
+def digest(value):
+    content = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def state_key(models_module, tags):
+    return digest(
+        {
+            "pipeline_version": pipeline_version(),
+            "rpft": version("rpft"),
+            "models_module": models_module,
+            "models_module_hash": module_hash(models_module) if models_module else None,
+            "tags": tags,
+        }
+    )
+
+
+def load_state(state_file, key):
+    empty = {"flows": {}, "uuids": {}, "groups": {}}
+    if not state_file or not os.path.isfile(state_file):
+        return empty
+    try:
+        state = jsonio.load(state_file)
+    except ValueError:
+        return empty
+    if state.get("key") != key:
+        return empty
+    return state
+
+
+def save_state(state_file, key, state):
+    if not state_file:
+        return
+    folder = os.path.dirname(state_file) or "."
+    os.makedirs(folder, exist_ok=True)
+    # Write next to the target first so that an interrupted run never leaves
+    # a partial state behind. Runs saving at the same time each use their own
+    # scratch file, and the last one wins.
+    fd, scratch = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    os.close(fd)
+    jsonio.dump({"key": key} | state, scratch)
+    os.replace(scratch, state_file)
@@ -0,0 +1,255 @@
+"""
+Reading and writing JSON files.
+
+orjson or msgspec are used if installed, as they are much faster than the json
+module from the standard library for documents of the size of our orgs. If
+neither is installed, the standard library is used.
+
+Files are written compactly by default, which is what intermediate files should
+use. Files that people read, like the pipeline output, are written with an
+indent. Pretty-printed files are written without escaping non-ASCII characters,
+so that they are the same whichever backend is used.
+
+Large objects, like orgs, can also be read and written one entry, or one item
+of an array entry, at a time (see iter_object and ObjectWriter), so that only
+one item needs to be held in memory at once.
+"""
+
+import json
+import re
+from collections.abc import Iterator
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if orjson is not None:
+    BACKEND = "orjson"
+elif msgspec is not None:
+    BACKEND = "msgspec"
+else:
+    BACKEND = "json"
+
+
+def load(path):
+    with open(path, "rb") as infile:
+        return loads(infile.read())
+
+
+def loads(data):
+    if BACKEND == "orjson":
+        return orjson.loads(data)
+    if BACKEND == "msgspec":
+        return msgspec.json.decode(data if isinstance(data, bytes) else data.encode())
+    return json.loads(data)
+
+
+def dump(obj, path, indent=None):
+    """Write obj to path, with the given indent or compactly."""
+    with open(path, "wb") as outfile:
+        outfile.write(dumpb(obj, indent))
+
+
+def dumps(obj, indent=None):
+    return dumpb(obj, indent).decode("utf-8")
+
+
+def dumpb(obj, indent=None):
+    """Serialise obj to UTF-8 encoded bytes."""
+    if BACKEND == "orjson" and indent in (None, 2):
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, option=option)
+        except TypeError:
+            # e.g. integers that do not fit into 64 bits
+            pass
+    elif BACKEND == "msgspec" and indent is None:
+        try:
+            return msgspec.json.encode(obj)
+        except (TypeError, msgspec.EncodeError):
+            pass
+
+    if indent is None:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode(
+            "utf-8"
+        )
+    return json.dumps(obj, indent=indent, ensure_ascii=False).encode("utf-8")
+
+
+# Size of the chunks in which files are read when iterating over them
+CHUNK_SIZE = 1 << 20
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def iter_object(file, lazy=()):
+    """Iterate over the entries of the JSON object in the text file.
+
+    Yields (key, value) pairs. The values of the keys in lazy that are arrays
+    are iterators over their items, which are only read as they are consumed;
+    all other values are read completely.
+    """
+    reader = _Reader(file)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key in lazy and reader.peek() == "[":
+            items = reader.items()
+            yield key, items
+            # Skip the items that have not been consumed
+            for _ in items:
+                pass
+        else:
+            yield key, reader.value()
+        if reader.peek() == "}":
+            return
+        reader.expect(",")
+
+
+class _Reader:
+
+    def __init__(self, file):
+        self.file = file
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        """Read more of the file, dropping what has been consumed already."""
+        if self.eof:
+            return False
+        # Read at least as much as is buffered, so that values spanning many
+        # chunks are only decoded a few times.
+        chunk = self.file.read(max(CHUNK_SIZE, len(self.buffer) - self.pos))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next character that is not whitespace, without consuming it."""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or not self.fill():
+                return self.buffer[self.pos : self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self.buffer, self.pos)
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def items(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == "]":
+                self.pos += 1
+                return
+            self.expect(",")
+
+
+class ObjectWriter:
+    """
+    Writes a JSON object to a binary file one entry, or one array item, at a
+    time. The result is the same as that of dump with the same indent.
+    """
+
+    def __init__(self, file, indent=None):
+        self.file = file
+        self.indent = indent
+        self.entries = 0
+        self.array_items = None
+        file.write(b"{")
+
+    def entry(self, key, value):
+        self.key(key)
+        self.file.write(self.encode(value, 1))
+
+    def begin_array(self, key):
+        self.key(key)
+        self.file.write(b"[")
+        self.array_items = 0
+
+    def item(self, value):
+        if self.array_items:
+            self.file.write(b",")
+        self.file.write(self.newline(2))
+        self.file.write(self.encode(value, 2))
+        self.array_items += 1
+
+    def end_array(self):
+        if self.array_items:
+            self.file.write(self.newline(1))
+        self.file.write(b"]")
+        self.array_items = None
+
+    def close(self):
+        if self.entries:
+            self.file.write(self.newline(0))
+        self.file.write(b"}")
+
+    def key(self, key):
+        if self.entries:
+            self.file.write(b",")
+        self.file.write(self.newline(1))
+        self.file.write(dumpb(key))
+        self.file.write(b": " if self.indent else b":")
+        self.entries += 1
+
+    def newline(self, depth):
+        if not self.indent:
+            return b""
+        return b"\n" + b" " * (self.indent * depth)
+
+    def encode(self, value, depth):
+        # Newlines only occur between tokens, as they are escaped in strings
+        return dumpb(value, self.indent).replace(b"\n", self.newline(depth))
+
+
+def write_object(path, entries, indent=None):
+    """Write the (key, value) pairs of entries to path as a JSON object.
+
+    Values that are iterators are written as arrays, one item at a time.
+    """
+    with open(path, "wb") as outfile:
+        writer = ObjectWriter(outfile, indent)
+        for key, value in entries:
+            if isinstance(value, Iterator):
+                writer.begin_array(key)
+                for item in value:
+                    writer.item(item)
+                writer.end_array()
+            else:
+                writer.entry(key, value)
+        writer.close()
@@ -0,0 +1,79 @@
+"""
+Creating copies of files without copying their content, where possible.
+
+A copy is made in the cheapest way the file system supports:
+
+- a reflink (Linux Btrfs, XFS and similar), which shares the content with the
+  source until either file is written to, like a copy would;
+- a regular copy otherwise.
+
+Either way, writing to the copy never changes the source. Like shutil.copy2,
+the permission bits and modification time of the source are copied too.
+
+Existing files at the destination are removed first, so that writing a copy
+never writes through a link into another file.
+"""
+
+import errno
+import os
+import shutil
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+# ioctl request to clone a file on Linux
+FICLONE = 0x40049409
+
+# Pairs of devices for which reflinks have failed, so that they are not tried
+# again for every file.
+_unsupported = set()
+_lock = threading.Lock()
+
+
+def materialize_file(src, dst):
+    """Make dst a copy of the file src and return how it was made."""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    devices = (os.stat(src).st_dev, os.stat(os.path.dirname(dst) or ".").st_dev)
+
+    if fcntl is not None and supported(devices):
+        try:
+            reflink(src, dst)
+            shutil.copystat(src, dst)
+            return "reflink"
+        except OSError as e:
+            unsupported(devices, e)
+
+    shutil.copy2(src, dst)
+    return "copy"
+
+
+def materialize_tree(src, dst):
+    """Copy the folder src into dst, like shutil.copytree with dirs_exist_ok."""
+    shutil.copytree(src, dst, copy_function=materialize_file, dirs_exist_ok=True)
+
+
+def reflink(src, dst):
+    try:
+        with open(src, "rb") as infile, open(dst, "wb") as outfile:
+            fcntl.ioctl(outfile.fileno(), FICLONE, infile.fileno())
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        raise
+
+
+def supported(devices):
+    return devices not in _unsupported
+
+
+def unsupported(devices, error):
+    # Errors that depend on the file, rather than the file system, do not tell
+    # anything about other files.
+    if error.errno in (errno.EACCES, errno.ENOENT):
+        raise error
+    with _lock:
+        _unsupported.add(devices)
@@ -0,0 +1,197 @@
+import contextlib
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+WORKER_SCRIPT = Path(__file__).parent / "node_worker.js"
+
+_active_pool = None
+
+
+class NodeWorkerError(Exception):
+    pass
+
+
+class NodeScriptError(Exception):
+    pass
+
+
+class NodeWorker:
+    """
+    A long-lived Node process running Node scripts on request.
+
+    Scripts are executed inside the worker as if they were run from the command
+    line, so the modules they depend on are only loaded once.
+    """
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            ["node", str(WORKER_SCRIPT)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+        )
+        self.request_id = 0
+
+    def run(self, script, args):
+        self.request_id += 1
+        request = {
+            "id": self.request_id,
+            "script": str(Path(script).resolve()),
+            "args": [str(arg) for arg in args],
+        }
+        try:
+            self.process.stdin.write(json.dumps(request) + "\n")
+            self.process.stdin.flush()
+            line = self.process.stdout.readline()
+        except (BrokenPipeError, OSError) as e:
+            raise NodeWorkerError(f"Node worker is not running: {e}")
+        if not line:
+            raise NodeWorkerError(
+                f"Node worker exited, returncode={self.process.poll()}"
+            )
+        try:
+            return json.loads(line)
+        except ValueError:
+            # Something other than the worker wrote to its stdout, so it is not
+            # known which response belongs to which request any more.
+            raise NodeWorkerError(f"Invalid response from Node worker: {line[:80]!r}")
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process.stdout.close()
+
+    def kill(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.process.stdin.close()
+        self.process.stdout.close()
+
+
+class NodeWorkerPool:
+    """
+    Pool of Node workers, started on demand.
+
+    Each call is handed to an idle worker; a new worker is only started if all
+    existing ones are busy and the pool is not full yet.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.idle = queue.LifoQueue()
+        self.workers = []
+        self.lock = threading.Lock()
+        # Resource usage reported by the workers
+        self.cpu_time = 0.0
+        self.max_rss = 0
+
+    def run(self, script, args):
+        worker = self._acquire()
+        try:
+            response = worker.run(script, args)
+        except NodeWorkerError as e:
+            # The worker is gone or in an unknown state, e.g. because a script
+            # crashed Node itself. Replace it and run this operation in its own
+            # process instead.
+            print(f"{e}, running {script} in a new process", file=sys.stderr)
+            self._replace(worker)
+            return run_node_process(script, args)
+        self.idle.put(worker)
+        if response.get("usage"):
+            self._record_usage(response["usage"])
+        if not response["ok"]:
+            error = next(iter((response["error"] or "").splitlines()), "")
+            print(
+                f"Node operation failed, script={script}, error={error}",
+                file=sys.stderr,
+            )
+            raise NodeScriptError(f"Node script {script} failed: {error}")
+        return response
+
+    def close(self):
+        with self.lock:
+            for worker in self.workers:
+                worker.close()
+            self.workers = []
+
+    def _record_usage(self, usage):
+        with self.lock:
+            self.cpu_time += usage["user_cpu_time"] + usage["system_cpu_time"]
+            self.max_rss = max(self.max_rss, usage["max_rss"])
+
+    def _acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if len(self.workers) < self.max_workers:
+                worker = NodeWorker()
+                self.workers.append(worker)
+                return worker
+        return self.idle.get()
+
+    def _replace(self, worker):
+        worker.kill()
+        with self.lock:
+            self.workers.remove(worker)
+            self.workers.append(NodeWorker())
+            self.idle.put(self.workers[-1])
+
+
+@contextlib.contextmanager
+def node_session(enabled=True, max_workers=None):
+    """
+    Run Node scripts started with run_node through persistent workers.
+
+    Nested sessions reuse the pool of the outermost session.
+    """
+    global _active_pool
+
+    if not enabled or _active_pool is not None:
+        yield _active_pool
+        return
+
+    _active_pool = NodeWorkerPool(max_workers)
+    try:
+        yield _active_pool
+    finally:
+        pool, _active_pool = _active_pool, None
+        pool.close()
+
+
+def worker_usage():
+    """CPU time and peak memory reported by the Node workers of this session."""
+    if _active_pool is None:
+        return {"cpu_time": 0.0, "max_rss": 0}
+    with _active_pool.lock:
+        return {"cpu_time": _active_pool.cpu_time, "max_rss": _active_pool.max_rss}
+
+
+def run_node_script(script, args):
+    if _active_pool is not None:
+        return _active_pool.run(script, args)
+    return run_node_process(script, args)
+
+
+def run_node_process(script, args):
+    try:
+        subprocess.run(["node", str(script), *[str(arg) for arg in args]], check=True)
+    except subprocess.CalledProcessError as e:
+        print(
+            f"Node operation failed, script={script}, returncode={e.returncode}",
+            file=sys.stderr,
+        )
+        raise NodeScriptError(f"Node script {script} failed") from e
+    return None
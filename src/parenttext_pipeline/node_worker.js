@@ -0,0 +1,223 @@
+// Long-lived Node process that runs the @idems command line scripts on request,
+// so that Node startup and module loading are paid once per pipeline run
+// instead of once per operation. Only the script itself is evaluated again for
+// every operation. The state an operation may leave behind is reset before the
+// next one: the exports of the @idems modules, global variables, environment
+// variables, the working directory and the exit code. State held in variables
+// inside of modules is not reset; scripts relying on it have to be run without
+// the worker (see node_worker in the config).
+//
+// Requests are read from stdin and responses written to stdout, one JSON
+// object per line:
+//     {"id": 1, "script": "/abs/path/index.js", "args": ["localize", ...]}
+//     {"id": 1, "ok": true, "error": null, "usage": {...}}
+// Anything the scripts print goes to stderr, so stdout only carries responses.
+"use strict";
+
+const Module = require("module");
+const path = require("path");
+const readline = require("readline");
+
+const respond = process.stdout.write.bind(process.stdout);
+process.stdout.write = process.stderr.write.bind(process.stderr);
+
+// Resources that belong to the worker itself rather than to a running script.
+const IDLE_RESOURCES = new Set(["PipeWrap", "TTYWrap", "SignalWrap"]);
+
+class ExitRequest extends Error {
+  constructor(code) {
+    super(`process.exit(${code}) called`);
+    this.code = code;
+  }
+}
+
+process.exit = (code) => {
+  throw new ExitRequest(code || 0);
+};
+
+let currentError = null;
+
+function recordError(error) {
+  if (error instanceof ExitRequest) {
+    if (error.code !== 0) {
+      currentError = currentError || error.message;
+    }
+    return;
+  }
+  console.error(error);
+  currentError = currentError || String((error && error.stack) || error);
+}
+
+process.on("uncaughtException", recordError);
+process.on("unhandledRejection", recordError);
+
+// Exports of the @idems modules as they were when the modules were loaded,
+// by filename. The exports object itself is kept, as other modules refer to it.
+const moduleStates = new Map();
+// Folder of the @idems modules of the running script
+let currentRoot = null;
+
+const originalLoad = Module.prototype.load;
+Module.prototype.load = function (filename) {
+  originalLoad.call(this, filename);
+  if (currentRoot !== null && filename.startsWith(currentRoot)) {
+    moduleStates.set(filename, snapshot(this.exports));
+  }
+};
+
+function snapshot(exports) {
+  const isObject =
+    exports !== null && (typeof exports === "object" || typeof exports === "function");
+  return {
+    exports,
+    properties: isObject ? Object.getOwnPropertyDescriptors(exports) : null,
+  };
+}
+
+function restoreModules() {
+  for (const [filename, state] of moduleStates) {
+    const mod = require.cache[filename];
+    if (mod === undefined) {
+      moduleStates.delete(filename);
+      continue;
+    }
+    mod.exports = state.exports;
+    if (state.properties === null) {
+      continue;
+    }
+    for (const key of Reflect.ownKeys(state.exports)) {
+      if (!(key in state.properties)) {
+        delete state.exports[key];
+      }
+    }
+    for (const key of Reflect.ownKeys(state.properties)) {
+      try {
+        Object.defineProperty(state.exports, key, state.properties[key]);
+      } catch (error) {
+        // Non-configurable properties cannot have changed
+      }
+    }
+  }
+}
+
+const initialGlobals = new Set(Reflect.ownKeys(globalThis));
+const initialEnv = { ...process.env };
+
+function restoreProcess(cwd) {
+  for (const key of Reflect.ownKeys(globalThis)) {
+    if (!initialGlobals.has(key)) {
+      delete globalThis[key];
+    }
+  }
+  for (const key of Object.keys(process.env)) {
+    if (!(key in initialEnv)) {
+      delete process.env[key];
+    }
+  }
+  Object.assign(process.env, initialEnv);
+  process.exitCode = undefined;
+  process.chdir(cwd);
+}
+
+function busyResources(own) {
+  const resources = process.getActiveResourcesInfo();
+  // The timer or immediate running the check is still listed as active.
+  const index = resources.indexOf(own);
+  if (index !== -1) {
+    resources.splice(index, 1);
+  }
+  return resources.filter((resource) => !IDLE_RESOURCES.has(resource));
+}
+
+// The scripts do their work asynchronously without telling us when they are
+// done, so an operation is complete once no callbacks, timers or I/O requests
+// are pending any more.
+function whenIdle() {
+  return new Promise((resolve) => {
+    const check = (own) => {
+      if (busyResources(own).length === 0) {
+        resolve();
+      } else {
+        setTimeout(check, 5, "Timeout");
+      }
+    };
+    setImmediate(check, "Immediate");
+  });
+}
+
+// Folder of the modules whose exports are reset after every operation: the
+// node_modules/@idems folder containing the script, or else the folder of the
+// script.
+function scriptRoot(filename) {
+  const marker = path.sep + path.join("node_modules", "@idems") + path.sep;
+  const index = filename.lastIndexOf(marker);
+  if (index === -1) {
+    return path.dirname(filename) + path.sep;
+  }
+  return filename.slice(0, index + marker.length);
+}
+
+function runScript(script, args) {
+  const filename = path.resolve(script);
+  currentRoot = scriptRoot(filename);
+  const mod = new Module(filename, null);
+  mod.filename = filename;
+  mod.paths = Module._nodeModulePaths(path.dirname(filename));
+  process.argv = [process.argv[0], filename, ...args];
+  // Make `require.main === module` checks in the script succeed.
+  process.mainModule = mod;
+  require.cache[filename] = mod;
+  try {
+    mod.load(filename);
+  } finally {
+    delete require.cache[filename];
+  }
+}
+
+function usage(before) {
+  const after = process.resourceUsage();
+  return {
+    user_cpu_time: (after.userCPUTime - before.userCPUTime) / 1e6,
+    system_cpu_time: (after.systemCPUTime - before.systemCPUTime) / 1e6,
+    max_rss: after.maxRSS * 1024,
+  };
+}
+
+async function handle(request) {
+  const before = process.resourceUsage();
+  const cwd = process.cwd();
+  currentError = null;
+  try {
+    runScript(request.script, request.args || []);
+  } catch (error) {
+    recordError(error);
+  }
+  await whenIdle();
+  currentRoot = null;
+  restoreModules();
+  restoreProcess(cwd);
+  return {
+    id: request.id,
+    ok: currentError === null,
+    error: currentError,
+    usage: usage(before),
+  };
+}
+
+const lines = readline.createInterface({ input: process.stdin, terminal: false });
+let queue = Promise.resolve();
+
+lines.on("line", (line) => {
+  if (!line.trim()) {
+    return;
+  }
+  queue = queue.then(async () => {
+    let response;
+    try {
+      response = await handle(JSON.parse(line));
+    } catch (error) {
+      response = { id: null, ok: false, error: String(error), usage: null };
+    }
+    respond(JSON.stringify(response) + "\n");
+  });
+});
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import shutil
+
+from parenttext_pipeline import jsonio
+from parenttext_pipeline.cache import file_hash
+
+
+class OrgDocument:
+    """
+    A RapidPro org passed from one step to the next.
+
+    The org is held in memory as long as only Python steps work on it, and is
+    only written to its file when a step (or final writer) needs the file. If
+    the org has not been loaded yet, it is read from the file on first access.
+    """
+
+    def __init__(self, path, org=None):
+        # Location of the document on disk, or where it is written to when
+        # a file is needed.
+        self.path = str(path)
+        self._org = org
+        # Whether the org in memory has not been written to path yet.
+        self.dirty = org is not None
+        self._digest = None
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(path)
+
+    @property
+    def org(self):
+        if self._org is None:
+            self._org = jsonio.load(self.path)
+        return self._org
+
+    @property
+    def loaded(self):
+        """Whether the org is held in memory."""
+        return self._org is not None
+
+    def entries(self):
+        """Iterate over the top-level entries of the org, with flows one by one.
+
+        Yields (key, value) pairs, where the value of "flows" is an iterator
+        over the flows. If the org is not held in memory, it is read from its
+        file one flow at a time instead of being loaded.
+        """
+        if self._org is not None:
+            for key, value in self._org.items():
+                yield key, iter(value) if key == "flows" else value
+            return
+        with open(self.path, encoding="utf-8") as infile:
+            yield from jsonio.iter_object(infile, lazy=["flows"])
+
+    def flows(self):
+        """Iterate over the flows of the org, see entries."""
+        for key, value in self.entries():
+            if key == "flows":
+                yield from value
+
+    @property
+    def digest(self):
+        """Hash of the document's file.
+
+        If the document is only held in memory, its content is hashed as it would
+        be written to the file, without writing it.
+        """
+        if self._digest is None:
+            if self.dirty:
+                content = jsonio.dumpb(self._org)
+                self._digest = hashlib.sha256(content).hexdigest()
+            else:
+                self._digest = file_hash(self.path)
+        return self._digest
+
+    def detach(self):
+        """Take ownership of the org, e.g. to modify it in place.
+
+        The document cannot be used any more afterwards, unless it has already
+        been written to its file.
+        """
+        org = self.org
+        self._org = None
+        if self.dirty:
+            self.path = None
+        return org
+
+    def to_file(self):
+        """Write the document to its file, if needed, and return the path."""
+        if self.path is None:
+            raise ValueError("Document has been detached before it was written")
+        if self.dirty:
+            jsonio.dump(self._org, self.path)
+            self.dirty = False
+        return self.path
+
+    def save_copy(self, path):
+        """Write the org to path, without writing or moving the document itself."""
+        jsonio.dump(self.org, path)
+
+    def save_as(self, path):
+        """Write the document to path, without writing it to its own file first.
+
+        If the document was only held in memory, it lives at path afterwards.
+        """
+        if self.dirty:
+            jsonio.dump(self._org, path)
+            self.path = str(path)
+            self.dirty = False
+        elif os.path.abspath(self.path) != os.path.abspath(path):
+            shutil.copyfile(self.path, path)
@@ -0,0 +1,230 @@
+"""
+Local store of the parent repositories referenced in configs.
+
+Parent repositories are zip archives, usually on GitHub. Each archive is
+downloaded and unpacked only once per run, however often it is referenced in
+the hierarchy, and kept for later runs. Archives of tags and commits never
+change, so they are reused without asking the server again. For other URLs, a
+conditional request with the ETag and Last-Modified date of the stored archive
+is made, and the archive is only downloaded again if it has changed.
+
+An offline cache never makes requests: stored archives are used as they are, and
+fetching a URL that is not stored raises a ParentNotCachedError.
+
+Several runs can share the cache. Each archive is unpacked into a folder named
+after its hash inside the entry of its location, and the entry's meta.json,
+which is replaced atomically, points to the current one. Folders are never
+changed after they have been unpacked, and are only deleted some time after they
+stopped being current, so that runs that are still reading them are not
+affected.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from parenttext_pipeline import jsonio
+from parenttext_pipeline.cache import file_hash
+from parenttext_pipeline.configs import CWD_LOCK
+
+# GitHub archives of tags and commits
+IMMUTABLE_PATTERN = re.compile(r"/archive/(refs/tags/[^/]+|[0-9a-f]{40})\.zip$")
+DOWNLOAD_TIMEOUT = 60
+# Time in seconds after which folders of an entry that are not current any more
+# are deleted; no run should read from a parent for longer than that.
+STALE_AFTER = 24 * 60 * 60
+
+
+class ParentNotCachedError(Exception):
+
+    def __init__(self, location):
+        super().__init__(f"Parent archive not in cache: {location}")
+        self.location = location
+
+
+class ParentCache:
+
+    def __init__(self, path=None, offline=False):
+        # Without a path, archives are only reused within the run
+        self._temp_dir = tempfile.TemporaryDirectory() if path is None else None
+        self.path = Path(path or self._temp_dir.name)
+        self.offline = offline
+        self.fetched = {}
+        # URLs that an offline cache was asked for but does not have
+        self.missing = set()
+        # Parents are fetched from several threads; each location is fetched
+        # by one of them while the others wait for it.
+        self.lock = threading.Lock()
+        self.location_locks = {}
+
+    @classmethod
+    def from_config(cls, config, offline=False):
+        if not config.cachepath:
+            return cls(offline=offline)
+        return cls(Path(config.cachepath) / "parents", offline)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._temp_dir is not None:
+            self._temp_dir.cleanup()
+
+    def fetch(self, location):
+        """Return the folder with the content of the parent repository."""
+        with self.lock:
+            location_lock = self.location_locks.setdefault(location, threading.Lock())
+        with location_lock:
+            if location not in self.fetched:
+                self.fetched[location] = self._fetch(location)
+            return self.fetched[location]
+
+    def _fetch(self, location):
+        if location.startswith("http"):
+            return self._fetch_url(location)
+        if location.endswith(".zip"):
+            return self._fetch_file(location)
+        # A local folder can be read from directly
+        with CWD_LOCK:
+            return Path(location).absolute()
+
+    def _fetch_url(self, location):
+        entry = self.entry(location)
+        meta = read_entry_meta(entry)
+        if meta and IMMUTABLE_PATTERN.search(location):
+            print(f"Parent archive reused, url={location}")
+            return entry / meta["folder"]
+        if self.offline:
+            if meta is None:
+                with self.lock:
+                    self.missing.add(location)
+                raise ParentNotCachedError(location)
+            return entry / meta["folder"]
+
+        headers = {}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        try:
+            response = requests.get(
+                location, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT
+            )
+        except requests.RequestException as e:
+            if meta is None:
+                raise
+            print(f"Parent archive not checked, using stored one, url={location}, {e}")
+            return entry / meta["folder"]
+
+        with response:
+            if response.status_code == 304 and meta:
+                print(f"Parent archive unchanged, url={location}")
+                return entry / meta["folder"]
+            if not response.ok:
+                print(
+                    f"Archive download failed, "
+                    f"status={response.status_code}, url={location}"
+                )
+                raise ValueError(f"Could not download parent archive {location}")
+
+            os.makedirs(self.path, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=self.path, suffix=".zip") as archive:
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    archive.write(chunk)
+                archive.flush()
+                print(f"Archive downloaded, url={location}")
+                return self.unpack(
+                    entry,
+                    archive.name,
+                    {
+                        "location": location,
+                        "etag": response.headers.get("ETag"),
+                        "last_modified": response.headers.get("Last-Modified"),
+                    },
+                )
+
+    def _fetch_file(self, location):
+        with CWD_LOCK:
+            location = os.path.abspath(location)
+        entry = self.entry(location)
+        meta = read_entry_meta(entry)
+        stat = os.stat(location)
+        validators = {
+            "location": location,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+        if meta and all(meta.get(key) == value for key, value in validators.items()):
+            return entry / meta["folder"]
+        return self.unpack(entry, location, validators)
+
+    def entry(self, location):
+        return self.path / hashlib.sha256(location.encode("utf-8")).hexdigest()
+
+    def unpack(self, entry, archive, meta):
+        """Unpack archive into entry and make it the current content of entry."""
+        digest = file_hash(archive)
+        version = entry / digest
+        os.makedirs(entry, exist_ok=True)
+        if not version.is_dir():
+            # Unpack into a scratch folder first so that an interrupted run never
+            # leaves a partial folder behind.
+            scratch = Path(tempfile.mkdtemp(dir=entry))
+            shutil.unpack_archive(archive, scratch, format="zip")
+            try:
+                os.rename(scratch, version)
+            except OSError:
+                # Another run unpacked the same archive in the meantime
+                shutil.rmtree(scratch)
+        # After extracting, all the stuff is inside a subfolder
+        folder_contents = os.listdir(version)
+        assert len(folder_contents) == 1
+        meta = meta | {"folder": f"{digest}/{folder_contents[0]}"}
+
+        previous = read_entry_meta(entry)
+        with tempfile.NamedTemporaryFile(dir=entry, suffix=".json", delete=False) as f:
+            pointer = f.name
+        jsonio.dump(meta, pointer)
+        os.replace(pointer, entry / "meta.json")
+        if previous and previous["folder"] != meta["folder"]:
+            # Record when the folder stopped being current
+            os.utime(entry / Path(previous["folder"]).parts[0])
+        remove_stale_folders(entry, digest)
+        return entry / meta["folder"]
+
+
+def remove_stale_folders(entry, current):
+    """Delete the folders of entry that have not been current for a while.
+
+    This includes scratch folders left behind by interrupted runs.
+    """
+    now = time.time()
+    for child in entry.iterdir():
+        if child.name == current or not child.is_dir():
+            continue
+        try:
+            stale = now - child.stat().st_mtime > STALE_AFTER
+        except FileNotFoundError:
+            continue
+        if stale:
+            shutil.rmtree(child, ignore_errors=True)
+
+
+def read_entry_meta(entry):
+    try:
+        meta = jsonio.load(entry / "meta.json")
+    except (FileNotFoundError, ValueError):
+        return None
+    if not (entry / meta["folder"]).is_dir():
+        return None
+    return meta
@@ -0,0 +1,315 @@
+"""
+Report what pull_data and compile_flows would do, without doing it.
+
+The plan is worked out from the meta.json of the input folder, the pulled input
+files and the step cache. Each source that would be pulled and each step that
+would be executed comes with an estimate of its duration, taken from the
+measurements of previous runs (see history).
+
+Nothing is downloaded, so whether Google Sheets have been modified since the
+last pull cannot be known; such sources are reported as checked. Parent
+repositories are only taken from the parent cache (see parent_cache). Those
+that are not stored there are reported as downloaded, and as their content is
+not known, all steps are reported as executed.
+"""
+
+import copy
+import os
+import tempfile
+from pathlib import Path
+
+from parenttext_pipeline import jsonio
+from parenttext_pipeline.cache import UNCACHED_STEPS, StepCache, file_hash
+from parenttext_pipeline.common import (
+    get_input_folder,
+    get_input_subfolder,
+    get_sheet_id,
+    read_meta,
+)
+from parenttext_pipeline.compile_sources import compile_sources
+from parenttext_pipeline.history import RunHistory, config_hash
+from parenttext_pipeline.parent_cache import (
+    IMMUTABLE_PATTERN,
+    ParentCache,
+    ParentNotCachedError,
+)
+
+# What happens to a source or a step
+RUN = "run"
+REUSE = "reuse"
+DOWNLOAD = "download"
+CHECK = "check"
+COPY = "copy"
+SKIP = "skip"
+
+# Actions that take time, and are estimated
+WORK_ACTIONS = {RUN, DOWNLOAD, CHECK, COPY}
+
+
+def run(config):
+    plan = make_plan(config)
+    print_plan(plan)
+    os.makedirs(config.temppath, exist_ok=True)
+    jsonio.dump(plan, Path(config.temppath) / "plan.json", indent=2)
+
+
+def make_plan(config):
+    source_durations, step_durations = recorded_durations(config)
+    sources = plan_pull_data(config, source_durations)
+    with ParentCache.from_config(config, offline=True) as parent_cache:
+        steps = plan_compile_flows(config, step_durations, parent_cache)
+        parents = plan_parents(parent_cache)
+    items = sources + parents + steps
+    return {
+        "sources": sources,
+        "parents": parents,
+        "steps": steps,
+        "estimated_time": sum(
+            item["estimate"] or 0
+            for item in items
+            if item["action"] in WORK_ACTIONS
+        ),
+        "unestimated": sum(
+            1
+            for item in items
+            if item["action"] in WORK_ACTIONS and item["estimate"] is None
+        ),
+        # Whether pull_data would leave the inputs as they are and
+        # compile_flows would reuse the cached outputs of all steps that
+        # produce flows, so that the result would not change. Sources and
+        # parents that are checked for changes at run time do not count, as
+        # whether they have changed is not known; see checks.
+        "noop": all(item["action"] in (SKIP, CHECK) for item in sources + parents)
+        and all(
+            step["action"] != RUN or step["type"] in UNCACHED_STEPS
+            for step in steps
+        ),
+        # Number of sources and parents that are checked for changes at run time
+        "checks": sum(1 for item in sources + parents if item["action"] == CHECK),
+    }
+
+
+def plan_pull_data(config, durations):
+    """Work out what pull_data would do with each source."""
+    try:
+        meta = read_meta(get_input_folder(config, in_temp=False))
+    except FileNotFoundError:
+        meta = None
+    if meta is None or "pull_timestamp" not in meta:
+        everything = "not pulled before"
+    elif meta.get("hash") != config_hash(config.root):
+        everything = "config changed"
+    else:
+        everything = None
+
+    plan = []
+    for name, source in config.sources.items():
+        if source.format == "media_assets":
+            continue
+        action, reason = plan_source(config, name, source, everything)
+        plan.append(
+            {
+                "name": name,
+                "format": source.format,
+                "action": action,
+                "reason": reason,
+                "estimate": durations.get(name),
+            }
+        )
+    return plan
+
+
+def plan_source(config, name, source, everything):
+    if source.format == "sheets":
+        folder = get_input_subfolder(config, name, in_temp=False)
+        names = list(getattr(source, "files_list", [])) + list(
+            getattr(source, "files_dict", {})
+        )
+        if everything:
+            return DOWNLOAD, everything
+        missing = [
+            sheet for sheet in names if not (folder / f"{sheet}.json").is_file()
+        ]
+        if missing:
+            return DOWNLOAD, "missing sheets: " + ", ".join(
+                get_sheet_id(config, sheet) for sheet in missing
+            )
+        return CHECK, "sheets modified since the last pull are downloaded"
+    if source.format == "json":
+        folder = get_input_subfolder(config, name, in_temp=False)
+        changed = [
+            new_name
+            for new_name, filepath in source.files_dict.items()
+            if not same_content(filepath, folder / f"{new_name}.json")
+        ]
+        if changed:
+            return COPY, "changed files: " + ", ".join(changed)
+        return SKIP, "files unchanged"
+    if source.format in ["translation_repo", "safeguarding"]:
+        return DOWNLOAD, "always pulled"
+    raise ValueError(f"Invalid source format {source.format}")
+
+
+def plan_parents(parent_cache):
+    """Work out which parent archives compile_flows would download.
+
+    Only the parents that were looked up while planning the steps are known;
+    the parents of a parent that is not in the cache are not.
+    """
+    plan = []
+    for location in sorted(parent_cache.missing):
+        plan.append(plan_parent(location, DOWNLOAD, "not in cache"))
+    for location in sorted(parent_cache.fetched):
+        if not location.startswith("http"):
+            continue
+        if IMMUTABLE_PATTERN.search(location):
+            plan.append(plan_parent(location, SKIP, "in cache"))
+        else:
+            plan.append(
+                plan_parent(
+                    location,
+                    CHECK,
+                    "downloaded if modified; steps are planned with the cached one",
+                )
+            )
+    return plan
+
+
+def plan_parent(location, action, reason):
+    return {
+        "name": location,
+        "action": action,
+        "reason": reason,
+        "estimate": None,
+    }
+
+
+def plan_compile_flows(config, durations, parent_cache):
+    """Work out which steps compile_flows would execute.
+
+    The cache key of a step depends on the output of the step before it. That
+    output is only known if the step before is reused from the cache, so once
+    a step has to be executed, all steps after it are assumed to be executed
+    too.
+    """
+    if not os.path.isdir(config.inputpath):
+        return [
+            plan_step(step_config, RUN, "inputs not pulled", durations)
+            for step_config in config.steps
+        ]
+
+    cache = StepCache.from_config(config)
+    with tempfile.TemporaryDirectory() as temppath:
+        # Sources are compiled as compile_flows would, but into a scratch
+        # folder, so that the temp folder of the last run is left alone.
+        config = copy.copy(config)
+        config.temppath = temppath
+        try:
+            config.sources = compile_sources(
+                config.root, get_input_folder(config), parent_cache
+            )
+        except ParentNotCachedError:
+            return [
+                plan_step(step_config, RUN, "parents not in cache", durations)
+                for step_config in config.steps
+            ]
+
+        plan = []
+        input_digest = None
+        input_known = True
+        for step_number, step_config in enumerate(config.steps, start=1):
+            if step_config.type in UNCACHED_STEPS:
+                # These steps pass their input on unchanged
+                action, reason = RUN, "not cached"
+            elif cache is None:
+                action, reason = RUN, "no cachepath"
+            elif not input_known:
+                action, reason = RUN, "input is produced by an executed step"
+            else:
+                key = cache.key(config, step_config, step_number, input_digest)
+                stored = cache.lookup(key)
+                if stored is None:
+                    action, reason = RUN, "not in cache"
+                    input_known = False
+                else:
+                    action, reason = REUSE, "in cache"
+                    input_digest = file_hash(stored)
+            plan.append(plan_step(step_config, action, reason, durations))
+    return plan
+
+
+def plan_step(step_config, action, reason, durations):
+    return {
+        "name": step_config.id,
+        "type": step_config.type,
+        "action": action,
+        "reason": reason,
+        "estimate": durations.get(step_config.id),
+    }
+
+
+def recorded_durations(config):
+    """Wall times of sources and steps in previous runs that executed them.
+
+    The estimate is the median of the latest runs in the run history. Without
+    a history, the measurements in meta.json of the last run are used. Steps
+    whose output was reused from the cache are left out, as the time it took
+    does not tell how long executing them takes.
+    """
+    history = RunHistory.from_config(config)
+    if history is not None and not history.path.is_file():
+        history = None
+    durations = {}
+    for path, key, category, names in [
+        (config.inputpath, "sources", "source", list(config.sources)),
+        (config.outputpath, "steps", "step", [step.id for step in config.steps]),
+    ]:
+        try:
+            meta = read_meta(path)
+        except (FileNotFoundError, ValueError):
+            meta = {}
+        durations[key] = {
+            record["name"]: record["wall_time"]
+            for record in meta.get(key, [])
+            if not record.get("cached")
+        }
+        for name in names if history else []:
+            estimate = history.estimate(name, category)
+            if estimate is not None:
+                durations[key][name] = estimate
+    return durations["sources"], durations["steps"]
+
+
+def same_content(a, b):
+    if not (os.path.isfile(a) and os.path.isfile(b)):
+        return False
+    return os.path.getsize(a) == os.path.getsize(b) and file_hash(a) == file_hash(b)
+
+
+def print_plan(plan):
+    for operation, key in [
+        ("pull_data", "sources"),
+        ("compile_flows", "parents"),
+        ("compile_flows", "steps"),
+    ]:
+        if not plan[key]:
+            continue
+        print(f"{operation} {key}:")
+        for item in plan[key]:
+            print(
+                f"{item['name']:>25}: {item['action']:<8} "
+                f"{format_estimate(item['estimate']):>8}  {item['reason']}"
+            )
+    print(
+        f"Plan done, noop={plan['noop']}, checks={plan['checks']}, "
+        f"estimated_time={format_estimate(plan['estimated_time'])}, "
+        f"unestimated={plan['unestimated']}"
+    )
+
+
+def format_estimate(seconds):
+    if seconds is None:
+        return "?"
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    return f"{int(seconds // 60)}m{int(seconds % 60):02d}s"
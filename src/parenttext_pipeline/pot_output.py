@@ -1,97 +1,158 @@
 """Adds a CLI option `pot_output`.
-This duplicates the base functionality of `compile_flows`, but runs a
-new version for each 'group' (e.g. "navigation") by overwriting the
-first step, then moves the output `.pot` file to the PLH preferred
-naming convention. Each tag group is processed in a `try...except`
-statement, so failures in one do not halt the flow.
-If the `.pot` file is produced, exception messages later in the pipeline
-are suppressed to simplify printout, if the renaming fails (due to the
-`.pot` file not being produced) the full traceback is printed for
-debugging of the sheets.
+This compiles the flows like `compile_flows`, overwriting the first step
+so that it creates the flows of all tags, and produces a `.pot` file for
+each 'group' (e.g. "navigation") following the PLH preferred naming
+convention, instead of a single `.pot` file.
+The flows of a group are those that the first step would create with the
+tags of the group. The texts of each group are extracted from these
+flows in a `try...except` statement, so failures in one group do not
+halt the others; the full traceback is printed for debugging of the
+sheets.
 """
 
 import os
 import traceback
-from parenttext_pipeline import steps
+from concurrent.futures import ThreadPoolExecutor
+
+from parenttext_pipeline import jsonio, steps
 from parenttext_pipeline.common import (
     clear_or_create_folder,
+    get_full_step_files_list,
     get_input_folder,
     read_meta,
     write_meta,
 )
 from parenttext_pipeline.compile_sources import compile_sources
-from parenttext_pipeline.compile_flows import apply_step
+from parenttext_pipeline.compile_flows import apply_step, write_outputs
 from parenttext_pipeline.configs import CreateFlowsStepConfig
+from parenttext_pipeline.history import recorded_run
+from parenttext_pipeline.node import node_session
+from parenttext_pipeline.telemetry import Telemetry
 
 
 def run(config):
-    clear_or_create_folder(config.outputpath)
+    telemetry = Telemetry()
+    with node_session(config.node_worker):
+        with recorded_run(config, "pot_output", telemetry) as run_record:
+            failed_groups = pot_output(config, telemetry)
+            if failed_groups:
+                run_record["status"] = "failed"
+
+
+def pot_output(config, telemetry=None):
+    """Write a .pot file for each group of flows.
+
+    Returns the names of the groups for which this failed.
+    """
+    if telemetry is None:
+        telemetry = Telemetry()
+    clear_or_create_folder(config.outputpath, keep=["diffable"])
     clear_or_create_folder(config.temppath)
 
     print("Compiling .pot files...")
-    config.sources = compile_sources(".", get_input_folder(config))
+    config.sources = compile_sources(config.root, get_input_folder(config))
 
     data = read_meta(config.inputpath)
     meta = {"pull_timestamp": data["pull_timestamp"]}
     write_meta(config, meta, config.outputpath)
 
+    # Generate Override Steps Input Dict, creating the flows of all groups
+    step = {
+        "id": "create_flows",
+        "type": "create_flows",
+        "models_module": "models.parenttext_models",
+        "sources": ["flow_definitions"],
+        "tags": [],
+    }
+
+    # Apply new step
+    config.steps[0] = CreateFlowsStepConfig(**step)
+
     failed_groups = []
 
-    # --- Iterate through the groups, running the pipeline for each ---
+    # Run steps using code from compile_flows.py
+    try:
+        flows = None
+        for step_num, step_config in enumerate(config.steps):
+            with telemetry.measure(
+                step_config.id, "step", type=step_config.type
+            ) as record:
+                if step_config.type == "extract_texts_for_translators":
+                    failed_groups += extract_group_texts(
+                        config, step_config, step_num + 1, flows
+                    )
+                    continue
+                flows = apply_step(config, step_config, step_num + 1, flows, record)
+            print(f"Applied step {step_config.type}, result stored at {flows.path}")
+
+        write_outputs(config, flows, telemetry)
+    except Exception as e:
+        print(e)
+        traceback.print_exc()
+
+    failed_groups += [
+        group_name
+        for group_name in po_output_groups
+        if group_name not in failed_groups
+        and not os.path.isfile(group_pot_file(config, group_name))
+    ]
+    print(f"Failed Groups: {failed_groups}")
+    return failed_groups
+
 
-    for group_name, group_tags in po_output_groups.items():
+def extract_group_texts(config, step_config, step_number, flows):
+    """Write a .pot file with the texts of the flows of each group.
 
-        # Generate Override Steps Input Dict
-        step = {
-            "id": "create_flows",
-            "type": "create_flows",
-            "models_module": "models.parenttext_models",
-            "sources": ["flow_definitions"],
-            "tags": [],
-        }
-        step["tags"] = group_tags
+    Returns the names of the groups for which this failed.
+    """
+    from rpft.converters import get_content_index_parser
 
-        # Apply new step
-        config.steps[0] = CreateFlowsStepConfig(**step)
+    from parenttext_pipeline.incremental import defined_flow_names
 
-        # Run steps using code from compile_flows.py
-        try:
-            input_file = None
-            for step_num, step_config in enumerate(config.steps):
-                output_file = apply_step(config, step_config, step_num + 1, input_file)
-                print(
-                    f"Applied step {step_config.type}, result stored at {output_file}"
-                )
-                input_file = output_file
-
-            steps.split_rapidpro_json(config, output_file)
-            print("Result written to output folder")
-            steps.write_diffable(config, output_file)
-            print("Diffable written to output folder")
-        except Exception as e:
-            print(e)
-            # store traceback string
-            traceback_string = traceback.format_exc()
+    sheets = get_full_step_files_list(config, config.steps[0])
+    models_module = config.steps[0].models_module
+    org = flows.org
 
+    def extract(group_name, group_tags):
         try:
-            # Move to the correct file
-            translator_output_folder = os.path.join(
-                config.outputpath, "send_to_translators"
+            parser = get_content_index_parser(sheets, None, models_module, group_tags)
+            names = defined_flow_names(parser.definition)
+            group_file = os.path.join(
+                config.temppath,
+                f"{config.flows_outputbasename}_{step_number}_{group_name}.json",
             )
-            current_file = os.path.join(
-                translator_output_folder, f"{config.flows_outputbasename}_crowdin.pot"
+            group_flows = [flow for flow in org["flows"] if flow["name"] in names]
+            jsonio.dump(org | {"flows": group_flows}, group_file)
+            steps.apply_extract_texts_for_translators(
+                config,
+                step_config,
+                step_number,
+                group_file,
+                output_name=group_pot_name(config, group_name),
             )
-            new_file = os.path.join(
-                translator_output_folder,
-                f"{config.sources['translation'].languages[0]['language']}_{group_name}.pot",
-            )
-            os.rename(current_file, new_file)
-        except FileNotFoundError:
-            failed_groups.append(group_name)
-            # If the translate files were not produced, print out the error for why
-            print(traceback_string)
+            print(f"Texts extracted, group={group_name}, flows={len(group_flows)}")
+        except Exception as e:
+            print(e)
+            traceback.print_exc()
+            return group_name
 
-    print(f"Failed Groups: {failed_groups}")
+    with ThreadPoolExecutor() as executor:
+        results = executor.map(
+            extract, po_output_groups.keys(), po_output_groups.values()
+        )
+        return [group_name for group_name in results if group_name]
+
+
+def group_pot_name(config, group_name):
+    return f"{config.sources['translation'].languages[0]['language']}_{group_name}"
+
+
+def group_pot_file(config, group_name):
+    return os.path.join(
+        config.outputpath,
+        "send_to_translators",
+        f"{group_pot_name(config, group_name)}.pot",
+    )
 
 
 po_output_groups = {
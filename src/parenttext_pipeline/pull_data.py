@@ -3,7 +3,6 @@ import stat
 import re
 import shutil
 import tempfile
-import hashlib
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
 import concurrent.futures
@@ -11,10 +10,6 @@ import concurrent.futures
 import requests
 import subprocess
 
-from googleapiclient.discovery import build
-from rpft.converters import convert_to_json
-from rpft.google import Drive
-
 from parenttext_pipeline.common import (
     clear_or_create_folder,
     get_input_folder,
@@ -25,14 +20,24 @@ from parenttext_pipeline.common import (
     read_meta,
 )
 from parenttext_pipeline.extract_keywords import process_keywords_to_file
+from parenttext_pipeline import history
+from parenttext_pipeline.history import recorded_run
+from parenttext_pipeline.node import node_session
+from parenttext_pipeline.telemetry import Telemetry, describe_folder
 
 
 def run(config):
+    telemetry = Telemetry()
+    with node_session(config.node_worker):
+        with recorded_run(config, "pull_data", telemetry):
+            pull_data(config, telemetry)
+
+
+def pull_data(config, telemetry=None):
     update_start = datetime.now(timezone.utc).isoformat()
     
     # Get config hash
-    with open("config.json", "rb") as f:
-        config_hash = hashlib.file_digest(f, "SHA256").hexdigest()
+    config_hash = history.config_hash(config.root)
     # Get last update timestamp
     try:
         meta = read_meta(get_input_folder(config, in_temp=False))
@@ -40,7 +45,7 @@ def run(config):
         last_update = datetime.fromisoformat(last_update_str)
 
         if not meta.get("hash", False) == config_hash:
-            print("config.json hash has changed, updating everything")
+            print("config hash has changed, updating everything")
             last_update = None
     except (FileNotFoundError, KeyError):
         print("meta.json not found, updating everything")
@@ -49,28 +54,36 @@ def run(config):
     # Only clear the temp path; the input path is now managed incrementally
     clear_or_create_folder(config.temppath)
 
+    if telemetry is None:
+        telemetry = Telemetry()
     for name, source in config.sources.items():
-        if source.format == "sheets":
-            pull_sheets(config, source, name, last_update)
-        elif source.format == "json":
-            pull_json(config, source, name)
-        elif source.format == "translation_repo":
-            pull_translations(config, source, name, last_update)
-        elif source.format == "safeguarding":
-            pull_safeguarding(config, source, name)
-        elif source.format == "media_assets":
+        if source.format == "media_assets":
             continue
-        else:
-            raise ValueError(f"Invalid source format {source.format}")
+
+        with telemetry.measure(name, "source", format=source.format) as record:
+            if source.format == "sheets":
+                pull_sheets(config, source, name, last_update)
+            elif source.format == "json":
+                pull_json(config, source, name)
+            elif source.format == "translation_repo":
+                pull_translations(config, source, name, last_update)
+            elif source.format == "safeguarding":
+                pull_safeguarding(config, source, name)
+            else:
+                raise ValueError(f"Invalid source format {source.format}")
+        pulled = describe_folder(get_input_subfolder(config, name, in_temp=False))
+        record.update({"output_hash": pulled["hash"], "output_size": pulled["size"]})
 
         print(f"Pulled all {name} data")
 
 
     meta = {
         "pull_timestamp": update_start,
-        "hash": config_hash
+        "hash": config_hash,
+        "sources": telemetry.records,
     }
     write_meta(config, meta, config.inputpath)
+    telemetry.write_trace(Path(config.temppath) / "trace.json")
 
     print("DONE.")
 
@@ -112,6 +125,7 @@ def pull_translations(config, source, source_name, last_update):
                     file_name + ".json",
                 )
                 run_node(
+                    config,
                     "idems_translation_common/index.js",
                     "convert",
                     source_file_path,
@@ -120,6 +134,8 @@ def pull_translations(config, source, source_name, last_update):
 
 
 def get_json_from_sheet_id(source, temp_dir, sheet_id):
+    from rpft.converters import convert_to_json
+
     if source.subformat == "google_sheets":
         return convert_to_json(sheet_id, source.subformat)
     else:
@@ -128,6 +144,8 @@ def get_json_from_sheet_id(source, temp_dir, sheet_id):
 
 
 def pull_sheets(config, source, source_name, last_update):
+    from rpft.google import Drive
+
     source_input_path = get_input_subfolder(
         config, source_name, makedirs=True, in_temp=False
     )
@@ -224,6 +242,8 @@ def is_google_sheets_id(location):
 
 
 def pull_safeguarding(config, source, source_name):
+    from rpft.google import Drive
+
     keywords_file_path = (
         get_input_subfolder(config, source_name, makedirs=True, in_temp=False)
         / "safeguarding_words.json"
@@ -254,12 +274,6 @@ def pull_safeguarding(config, source, source_name):
         shutil.copyfile(source.filepath, keywords_file_path)
 
 
-def unpack_archive(destination, location):
-    with tempfile.TemporaryDirectory() as temp_dir:
-        location = download_archive(temp_dir, location)
-        shutil.unpack_archive(location, destination)
-
-
 def download_archive(destination, location):
     if location and location.startswith("http"):
         response = requests.get(location)
@@ -0,0 +1,205 @@
+"""
+Run a step on shards of the flows of an org in parallel.
+
+The flows of the org are split into consecutive shards, each of which is written
+to an org of its own, together with everything else of the org (fields, groups,
+campaigns, ...). The step is applied to each shard in a separate temp folder, so
+that the Node operations run in separate Node processes at the same time. The
+shard outputs are merged back into one org, in which the flows are in their
+original order, and the log files the step wrote in the temp folders of the
+shards are merged into the temp folder of the run.
+"""
+
+import concurrent.futures
+import copy
+import os
+import shutil
+from pathlib import Path
+
+from parenttext_pipeline import jsonio
+from parenttext_pipeline.common import get_input_subfolder, make_output_filepath
+from parenttext_pipeline.materialize import materialize_tree
+from parenttext_pipeline.org import OrgDocument
+
+
+def apply_sharded(function, config, step_config, step_number, step_input):
+    """Apply a step function to shards of the OrgDocument step_input.
+
+    Returns the merged OrgDocument, or None if the step does not produce flows.
+    """
+    org = step_input.org
+    count = step_config.shards or os.cpu_count() or 1
+    shards = split_flows(org.get("flows", []), count)
+    folder = Path(config.temppath) / "shards" / f"{step_number}_{step_config.id}"
+    if folder.exists():
+        shutil.rmtree(folder)
+
+    def apply(i, flows):
+        shard_config = copy.copy(config)
+        shard_config.temppath = str(folder / str(i))
+        os.makedirs(shard_config.temppath)
+        for source_name in step_config.sources:
+            materialize_tree(
+                get_input_subfolder(config, source_name),
+                get_input_subfolder(shard_config, source_name),
+            )
+        shard_input = make_output_filepath(shard_config, f"_{step_number - 1}.json")
+        jsonio.dump(org | {"flows": flows}, shard_input)
+        return function(shard_config, step_config, step_number, shard_input)
+
+    with concurrent.futures.ThreadPoolExecutor(len(shards)) as executor:
+        outputs = list(executor.map(apply, range(len(shards)), shards))
+
+    merge_logs(
+        [folder / str(i) for i in range(len(shards))],
+        config.temppath,
+        exclude=config.flows_outputbasename + "_",
+    )
+    print(f"Sharded step done, step={step_config.id}, shards={len(shards)}")
+
+    if all(output is None for output in outputs):
+        return None
+    step_output_file = make_output_filepath(
+        config, f"_{step_number}_{step_config.id}.json"
+    )
+    return OrgDocument(
+        step_output_file, merge_orgs([jsonio.load(output) for output in outputs])
+    )
+
+
+def split_flows(flows, n):
+    """Split flows into at most n consecutive shards of about the same size."""
+    sizes = [len(flow.get("nodes", [])) + 1 for flow in flows]
+    total = sum(sizes)
+    n = max(1, min(n, len(flows)))
+    shards = []
+    start = done = 0
+    for i, size in enumerate(sizes):
+        done += size
+        if done * n >= total * (len(shards) + 1) and len(shards) < n - 1:
+            shards.append(flows[start : i + 1])
+            start = i + 1
+    shards.append(flows[start:])
+    return shards
+
+
+def merge_orgs(orgs):
+    """Merge orgs produced from shards of the same org into one.
+
+    The flows are concatenated in the order of the orgs. Of the other entries,
+    those of the first org are kept, and entries that the others add are
+    appended. If another org added an entry (e.g. a group) under a name that
+    already exists, with a different UUID, the references to it in the flows of
+    that org are replaced by the UUID of the existing entry.
+    """
+    merged = orgs[0]
+    merged.setdefault("flows", [])
+    for org in orgs[1:]:
+        replaced = {}
+        for key, value in org.items():
+            if key == "flows":
+                continue
+            if key not in merged:
+                merged[key] = value
+            elif isinstance(value, list) and isinstance(merged[key], list):
+                merge_entries(merged[key], value, replaced)
+        flows = org.get("flows", [])
+        if replaced:
+            flows = replace_uuids(flows, replaced)
+        merged["flows"].extend(flows)
+    return merged
+
+
+def merge_entries(entries, new_entries, replaced):
+    uuids = {entry.get("uuid") for entry in entries if isinstance(entry, dict)}
+    names = {
+        entry["name"]: entry
+        for entry in entries
+        if isinstance(entry, dict) and "name" in entry
+    }
+    for entry in new_entries:
+        if not isinstance(entry, dict):
+            if entry not in entries:
+                entries.append(entry)
+            continue
+        uuid = entry.get("uuid")
+        if uuid is not None and uuid in uuids:
+            continue
+        existing = names.get(entry.get("name"))
+        if existing is not None:
+            if uuid is not None and existing.get("uuid") is not None:
+                replaced[uuid] = existing["uuid"]
+            continue
+        if entry not in entries:
+            entries.append(entry)
+
+
+def replace_uuids(value, replaced):
+    if isinstance(value, dict):
+        return {key: replace_uuids(item, replaced) for key, item in value.items()}
+    if isinstance(value, list):
+        return [replace_uuids(item, replaced) for item in value]
+    if isinstance(value, str):
+        return replaced.get(value, value)
+    return value
+
+
+def merge_logs(folders, destination, exclude):
+    """Merge the files written to each of folders into a file in destination.
+
+    JSON lists are concatenated and JSON objects merged, the rows of Excel
+    sheets are appended below those of the first file, and other files are
+    concatenated. Files whose names start with exclude (the flow files) are
+    left out.
+    """
+    names = {}
+    for folder in folders:
+        for entry in os.scandir(folder):
+            if entry.is_file() and not entry.name.startswith(exclude):
+                names.setdefault(entry.name, []).append(entry.path)
+    for name, paths in names.items():
+        target = Path(destination) / name
+        extension = Path(name).suffix
+        if extension == ".json":
+            jsonio.dump(merge_json([jsonio.load(path) for path in paths]), target)
+        elif extension == ".xlsx":
+            merge_sheets(paths, target)
+        else:
+            with open(target, "wb") as outfile:
+                for path in paths:
+                    with open(path, "rb") as infile:
+                        shutil.copyfileobj(infile, outfile)
+
+
+def merge_json(values):
+    if all(isinstance(value, list) for value in values):
+        return [item for value in values for item in value]
+    if all(isinstance(value, dict) for value in values):
+        merged = {}
+        for value in values:
+            for key, item in value.items():
+                if isinstance(item, list) and isinstance(merged.get(key), list):
+                    merged[key] = merged[key] + item
+                else:
+                    merged[key] = item
+        return merged
+    return values[-1]
+
+
+def merge_sheets(paths, target):
+    import openpyxl
+
+    book = openpyxl.load_workbook(paths[0])
+    for path in paths[1:]:
+        other = openpyxl.load_workbook(path, read_only=True)
+        for sheet in other.worksheets:
+            if sheet.title not in book.sheetnames:
+                book.create_sheet(sheet.title)
+                rows = sheet.iter_rows(values_only=True)
+            else:
+                # The first row is the header
+                rows = sheet.iter_rows(min_row=2, values_only=True)
+            for row in rows:
+                book[sheet.title].append(row)
+        other.close()
+    book.save(target)
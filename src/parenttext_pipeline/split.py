@@ -0,0 +1,234 @@
+import contextlib
+from copy import copy
+
+from parenttext_pipeline import jsonio
+
+
+def partition_org(org, n):
+    """Split an org into n orgs, each with a share of the flows.
+
+    Every flow is assigned to exactly one part. Flows that reference each
+    other, by starting one another or through events of the same campaign, are
+    kept in the same part, so that each part can be imported on its own.
+    Campaigns and triggers go into the part of the flows they reference.
+    """
+    flows = org.get("flows", [])
+    part_of, campaigns, triggers = plan_partition(
+        [flow_summary(flow) for flow in flows],
+        org.get("campaigns", []),
+        org.get("triggers", []),
+        n,
+    )
+    parts = [[] for _ in range(n)]
+    for i, flow in enumerate(flows):
+        parts[part_of[i]].append(flow)
+
+    result = []
+    for p in range(n):
+        org_new = copy(org)
+        org_new.update(
+            {
+                "campaigns": campaigns[p],
+                "flows": parts[p],
+                "triggers": triggers[p],
+            }
+        )
+        result.append(org_new)
+
+    return result
+
+
+def write_partitioned_org(document, paths, indent=2):
+    """Write the parts of partition_org of an OrgDocument to paths.
+
+    The org is read one flow at a time, twice: once to work out the parts, and
+    once to write the flows into them. Only the other entries of the org, like
+    campaigns and triggers, are held in memory. Returns the number of flows in
+    each part.
+    """
+    n = len(paths)
+    entries = {}
+    summaries = []
+    for key, value in document.entries():
+        if key == "flows":
+            summaries = [flow_summary(flow) for flow in value]
+            value = None
+        entries[key] = value
+    part_of, campaigns, triggers = plan_partition(
+        summaries, entries.get("campaigns", []), entries.get("triggers", []), n
+    )
+    # The entries are in the same order as in the parts of partition_org
+    keys = list(entries) + [
+        key for key in ["campaigns", "flows", "triggers"] if key not in entries
+    ]
+
+    with contextlib.ExitStack() as stack:
+        writers = [
+            jsonio.ObjectWriter(stack.enter_context(open(path, "wb")), indent)
+            for path in paths
+        ]
+        for key in keys:
+            if key == "flows":
+                for writer in writers:
+                    writer.begin_array(key)
+                for i, flow in enumerate(document.flows()):
+                    writers[part_of[i]].item(flow)
+                for writer in writers:
+                    writer.end_array()
+            else:
+                for p, writer in enumerate(writers):
+                    if key == "campaigns":
+                        writer.entry(key, campaigns[p])
+                    elif key == "triggers":
+                        writer.entry(key, triggers[p])
+                    else:
+                        writer.entry(key, entries[key])
+        for writer in writers:
+            writer.close()
+
+    return [part_of.count(p) for p in range(n)]
+
+
+def flow_summary(flow):
+    """What plan_partition needs to know about a flow."""
+    return flow["uuid"], flow["name"], list(referenced_flow_uuids(flow))
+
+
+def plan_partition(summaries, org_campaigns, org_triggers, n):
+    """Assign flows, campaigns and triggers to n parts, see partition_org.
+
+    Returns the part of each flow, by its position in the org, and the
+    campaigns and triggers of each part.
+    """
+    index = {uuid: i for i, (uuid, _, _) in enumerate(summaries)}
+    name_index = {name: i for i, (_, name, _) in enumerate(summaries)}
+    groups = FlowGroups(len(summaries))
+
+    for i, (_, _, references) in enumerate(summaries):
+        for uuid in references:
+            if uuid in index:
+                groups.join(i, index[uuid])
+
+    for campaign in org_campaigns:
+        members = campaign_flow_indexes(campaign, name_index)
+        for member in members[1:]:
+            groups.join(members[0], member)
+
+    part_of = assign_parts(groups, n)
+    part_names = [set() for _ in range(n)]
+    for i, (_, name, _) in enumerate(summaries):
+        part_names[part_of[i]].add(name)
+
+    campaigns = [[] for _ in range(n)]
+    for campaign in org_campaigns:
+        members = campaign_flow_indexes(campaign, name_index)
+        if not campaign["events"]:
+            targets = range(n)
+        elif members:
+            targets = [part_of[members[0]]]
+        else:
+            # None of the flows exist, report the removed events
+            filter_campaign_events(campaign, set())
+            continue
+        for p in targets:
+            if edited := filter_campaign_events(campaign, part_names[p]):
+                campaigns[p].append(edited)
+
+    triggers = [[] for _ in range(n)]
+    for trigger in org_triggers:
+        i = index.get((trigger.get("flow") or {}).get("uuid"))
+        if i is not None:
+            triggers[part_of[i]].append(trigger)
+
+    return part_of, campaigns, triggers
+
+
+def assign_parts(groups, n):
+    """Assign groups of flows to n parts of similar size.
+
+    Groups are taken in the order of their first flow and placed into the
+    current part until it holds its share of the flows, so that flows keep
+    their original order across the parts.
+    """
+    part_of = [None] * groups.size
+    members = groups.members()
+    assigned = 0
+    p = 0
+    # Groups are represented by their first flow
+    for root in sorted(members):
+        if p < n - 1 and assigned >= (p + 1) * groups.size / n:
+            p += 1
+        for i in members[root]:
+            part_of[i] = p
+        assigned += len(members[root])
+    return part_of
+
+
+def referenced_flow_uuids(flow):
+    for node in flow.get("nodes", []):
+        for action in node.get("actions", []):
+            if action.get("type") == "enter_flow" and action.get("flow"):
+                yield action["flow"]["uuid"]
+
+
+def campaign_flow_indexes(campaign, name_index):
+    return [
+        name_index[event["flow"]["name"]]
+        for event in campaign["events"]
+        if event["flow"]["name"] in name_index
+    ]
+
+
+def filter_campaign_events(campaign, flow_names):
+    """Remove events of a campaign that do not start one of the given flows.
+
+    Returns None if no events are left, unless the campaign had no events to
+    begin with.
+    """
+    if not campaign["events"]:
+        return campaign
+
+    campaign_new = copy(campaign)
+    campaign_new["events"] = []
+    for event in campaign["events"]:
+        event_type = event["event_type"]
+        flow_name = event["flow"]["name"]
+        if event_type in ["F", "M"] and flow_name in flow_names:
+            campaign_new["events"].append(event)
+        else:
+            print(
+                f"Campaign event removed, campaign={campaign['name']}, "
+                f"event_type={event_type}"
+            )
+            if event_type == "F":
+                print(f"Flow not found, name={flow_name}")
+
+    if campaign_new["events"]:
+        return campaign_new
+
+
+class FlowGroups:
+    """Groups of flows that must end up in the same part (union-find)."""
+
+    def __init__(self, size):
+        self.size = size
+        self.parent = list(range(size))
+
+    def find(self, i):
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def join(self, i, j):
+        a, b = self.find(i), self.find(j)
+        if a != b:
+            self.parent[max(a, b)] = min(a, b)
+
+    def members(self):
+        groups = {}
+        for i in range(self.size):
+            groups.setdefault(self.find(i), []).append(i)
+        return groups
@@ -1,13 +1,10 @@
-import json
+import concurrent.futures
 import os
 import shutil
-from copy import copy
+from importlib.metadata import version
 from pathlib import Path
 
-import rpft.converters
-from rapidpro_abtesting.main import apply_abtests
-from rpft.logger.logger import initialize_main_logger
-
+from parenttext_pipeline import jsonio
 from parenttext_pipeline.common import (
     get_full_step_files_dict,
     get_full_step_files_list,
@@ -15,7 +12,12 @@ from parenttext_pipeline.common import (
     make_output_filepath,
     run_node,
 )
-from parenttext_pipeline.extract_keywords import batch
+from parenttext_pipeline.org import OrgDocument
+from parenttext_pipeline.split import (
+    filter_campaign_events,
+    partition_org,
+    write_partitioned_org,
+)
 
 
 def load_flows(config, step_config, step_number, _=None):
@@ -32,6 +34,11 @@ def load_flows(config, step_config, step_number, _=None):
 
 
 def create_flows(config, step_config, step_number, _=None):
+    import rpft.converters
+    from rpft.logger.logger import initialize_main_logger
+
+    from parenttext_pipeline import incremental
+
     step_output_file = make_output_filepath(
         config, f"_{step_number}_load_from_sheets.json"
     )
@@ -39,20 +46,39 @@ def create_flows(config, step_config, step_number, _=None):
     sheets = get_full_step_files_list(config, step_config)
 
     initialize_main_logger(Path(config.temppath) / "rpft.log")
-    flows = rpft.converters.create_flows(
-        sheets,
-        None,
-        None,
-        data_models=step_config.models_module,
-        tags=step_config.tags,
-    )
-    with open(step_output_file, "w") as export:
-        json.dump(flows, export, indent=4)
+    state_file = None
+    if step_config.incremental and config.cachepath:
+        state_file = Path(config.cachepath) / "create_flows" / f"{step_config.id}.json"
+    use_incremental = state_file is not None or step_config.processes != 1
+    if use_incremental and not incremental.rpft_supported():
+        print(
+            "Incremental creation of flows not supported, using rpft, "
+            f"rpft={version('rpft')}"
+        )
+        use_incremental = False
+    if use_incremental:
+        flows = incremental.create_flows(
+            sheets,
+            step_config.models_module,
+            step_config.tags,
+            state_file,
+            step_config.processes,
+        )
+    else:
+        flows = rpft.converters.create_flows(
+            sheets,
+            None,
+            None,
+            data_models=step_config.models_module,
+            tags=step_config.tags,
+        )
 
-    return step_output_file
+    return OrgDocument(step_output_file, flows)
 
 
 def apply_edits(config, step_config, step_number, step_input_file):
+    from rapidpro_abtesting.main import apply_abtests
+
     step_name = step_config.id
     step_output_file = make_output_filepath(config, f"_{step_number}_{step_name}.json")
 
@@ -90,6 +116,7 @@ def apply_qr_treatment(config, step_config, step_number, step_input_file):
     # channel
     if step_config.qr_treatment == "move":
         run_node(
+            config,
             "idems_translation_chatbot/index.js",
             "move_quick_replies",
             step_input_file,
@@ -103,6 +130,7 @@ def apply_qr_treatment(config, step_config, step_number, step_input_file):
         print("Step 8 complete, removed quick replies")
     elif step_config.qr_treatment == "move_and_mod":
         run_node(
+            config,
             "idems_translation_chatbot/index.js",
             "move_and_mod_quick_replies",
             step_input_file,
@@ -117,6 +145,7 @@ def apply_qr_treatment(config, step_config, step_number, step_input_file):
         print("Step 8 complete, removed and modified quick replies")
     elif step_config.qr_treatment == "reformat":
         run_node(
+            config,
             "idems_translation_chatbot/index.js",
             "reformat_quick_replies",
             step_input_file,
@@ -131,6 +160,7 @@ def apply_qr_treatment(config, step_config, step_number, step_input_file):
         print("Step 8 complete, reformatted quick replies")
     elif step_config.qr_treatment == "reformat_whatsapp":
         run_node(
+            config,
             "idems_translation_chatbot/index.js",
             "reformat_quick_replies_whatsapp",
             step_input_file,
@@ -143,6 +173,7 @@ def apply_qr_treatment(config, step_config, step_number, step_input_file):
         print("Step 8 complete, reformatted quick replies")
     elif step_config.qr_treatment == "reformat_palestine":
         run_node(
+            config,
             "idems_translation_chatbot/index.js",
             "reformat_quick_replies_palestine",
             step_input_file,
@@ -155,6 +186,7 @@ def apply_qr_treatment(config, step_config, step_number, step_input_file):
         print("Step 8 complete, reformatted quick replies palestine")
     elif step_config.qr_treatment == "reformat_china":
         run_node(
+            config,
             "idems_translation_chatbot/index.js",
             "reformat_quick_replies_china",
             step_input_file,
@@ -169,6 +201,7 @@ def apply_qr_treatment(config, step_config, step_number, step_input_file):
         print("Step 8 complete, reformatted quick replies to China standard")
     elif step_config.qr_treatment == "wechat":
         run_node(
+            config,
             "idems_translation_chatbot/index.js",
             "convert_qr_to_html",
             step_input_file,
@@ -197,6 +230,7 @@ def apply_safeguarding(config, step_config, step_number, step_input_file):
     # We may apply both of these operations.
     if step_config.flow_name and step_config.flow_uuid:
         run_node(
+            config,
             "safeguarding-rapidpro/v2_add_safeguarding_to_flows.js",
             step_input_file,
             str(safeguarding_file_path),
@@ -209,6 +243,7 @@ def apply_safeguarding(config, step_config, step_number, step_input_file):
 
     if step_config.redirect_flow_names:
         run_node(
+            config,
             "safeguarding-rapidpro/v2_edit_redirect_flow.js",
             step_input_file,
             str(safeguarding_file_path),
@@ -232,16 +267,18 @@ def apply_translations(config, step_config, step_number, step_input_file):
     if not step_config.languages:  # Check if languages is empty
         return step_output_file
 
-    for lang in step_config.languages:
-        json_translation_path = os.path.join(
-            config.temppath, step_name, lang["code"], "merged_translations.json"
+    if step_config.parallel_languages:
+        return localize_languages_in_parallel(
+            config, step_config, step_number, step_input_file
         )
 
+    for lang in step_config.languages:
         run_node(
+            config,
             "idems_translation_chatbot/index.js",
             "localize",
             step_input_file,
-            json_translation_path,
+            get_merged_translations_path(config, step_config, lang),
             lang["language"],
             step_output_basename,
             config.temppath,
@@ -252,6 +289,62 @@ def apply_translations(config, step_config, step_number, step_input_file):
     return step_output_file
 
 
+def localize_languages_in_parallel(config, step_config, step_number, step_input_file):
+    """Localize each language into the input flows separately, then merge.
+
+    Every language is localized against the same input flows concurrently, and
+    the localization of each language is copied over into the flows of the first
+    result, so the org does not have to be rewritten once per language.
+    """
+    step_name = step_config.id
+    step_output_file = make_output_filepath(config, f"_{step_number}_{step_name}.json")
+
+    def localize(lang):
+        language_output_basename = (
+            f"{config.flows_outputbasename}_{step_number}_{step_name}_{lang['code']}"
+        )
+        run_node(
+            config,
+            "idems_translation_chatbot/index.js",
+            "localize",
+            step_input_file,
+            get_merged_translations_path(config, step_config, lang),
+            lang["language"],
+            language_output_basename,
+            config.temppath,
+        )
+        return os.path.join(config.temppath, language_output_basename + ".json")
+
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        language_output_files = list(executor.map(localize, step_config.languages))
+
+    languages = [lang["language"] for lang in step_config.languages]
+    org = merge_localizations(language_output_files, languages)
+
+    return OrgDocument(step_output_file, org)
+
+
+def merge_localizations(org_files, languages):
+    """Merge the localization of each language from its own org into the first.
+
+    The n-th org is expected to contain the localization for the n-th language.
+    Flows are matched by UUID.
+    """
+    org = jsonio.load(org_files[0])
+
+    flows_by_uuid = {flow["uuid"]: flow for flow in org["flows"]}
+    for org_file, language in zip(org_files[1:], languages[1:]):
+        language_org = jsonio.load(org_file)
+        for language_flow in language_org["flows"]:
+            localization = language_flow.get("localization", {}).get(language)
+            flow = flows_by_uuid.get(language_flow["uuid"])
+            if localization is None or flow is None:
+                continue
+            flow.setdefault("localization", {})[language] = localization
+
+    return org
+
+
 def apply_has_any_word_check(config, step_config, step_number, step_input_file):
     step_name = step_config.id
     step_output_file = make_output_filepath(config, f"_{step_number}_{step_name}.json")
@@ -262,6 +355,7 @@ def apply_has_any_word_check(config, step_config, step_number, step_input_file):
     has_any_words_log = f"{step_number}_{step_name}"
 
     run_node(
+        config,
         "idems_translation_chatbot/index.js",
         "has_any_words_check",
         step_input_file,
@@ -280,6 +374,7 @@ def apply_overall_integrity_check(config, step_config, step_number, step_input_f
     excel_log_name = os.path.join(config.temppath, f"{step_number}_{step_name}.xlsx")
 
     run_node(
+        config,
         "idems_translation_chatbot/index.js",
         "overall_integrity_check",
         step_input_file,
@@ -301,6 +396,7 @@ def apply_fix_arg_qr_translation(config, step_config, step_number, step_input_fi
     fix_arg_qr_log = f"{step_number}_{step_name}"
 
     run_node(
+        config,
         "idems_translation_chatbot/index.js",
         "fix_arg_qr_translation",
         step_input_file,
@@ -313,28 +409,36 @@ def apply_fix_arg_qr_translation(config, step_config, step_number, step_input_fi
 
 
 def apply_extract_texts_for_translators(
-    config, step_config, step_number, step_input_file
+    config, step_config, step_number, step_input_file, output_name=None
 ):
+    """Write the texts of the flows to a .pot file for translators.
+
+    The file is named output_name, if given, or after the flows output basename.
+    """
     step_name = step_config.id
     # This is redundant, and we should change the JS script to just take the output
     # filename instead of step_output_basename and config.temppath as arguments
     step_translation_basename = (
         f"{config.flows_outputbasename}_{step_number}_{step_name}"
     )
+    if output_name:
+        step_translation_basename += f"_{output_name}"
+    else:
+        output_name = f"{config.flows_outputbasename}_crowdin"
     step_translation_file = os.path.join(
         config.temppath, step_translation_basename + ".json"
     )
 
     # Setup output file to send to translators if it doesn't exist
     translator_output_folder = os.path.join(config.outputpath, "send_to_translators")
-    if not os.path.exists(translator_output_folder):
-        os.makedirs(translator_output_folder)
+    os.makedirs(translator_output_folder, exist_ok=True)
     translation_output_file = os.path.join(
-        translator_output_folder, f"{config.flows_outputbasename}_crowdin.pot"
+        translator_output_folder, f"{output_name}.pot"
     )
 
     # Produce translatable strings in json format
     run_node(
+        config,
         "idems_translation_chatbot/index.js",
         "extract_simple",
         step_input_file,
@@ -344,6 +448,7 @@ def apply_extract_texts_for_translators(
 
     # Convert to pot
     run_node(
+        config,
         "idems_translation_common/index.js",
         "convert",
         step_translation_file,
@@ -359,7 +464,7 @@ def merge_translation_jsons(config, step_config):
         raise ValueError("translation step must have exactly one source")
     source_name = step_config.sources[0]
 
-    for lang in step_config.languages:
+    def merge(lang):
         translations_input_folder = Path(config.inputpath) / source_name / lang["code"]
         translations_temp_folder = Path(config.temppath) / step_name / lang["code"]
         os.makedirs(translations_temp_folder, exist_ok=True)
@@ -367,6 +472,7 @@ def merge_translation_jsons(config, step_config):
         # Merge all translation files into a single JSON that we can localise back into
         # our flows
         run_node(
+            config,
             "idems_translation_common/index.js",
             "concatenate_json",
             translations_input_folder,
@@ -374,8 +480,17 @@ def merge_translation_jsons(config, step_config):
             "merged_translations.json",
         )
 
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        list(executor.map(merge, step_config.languages))
+
+
+def get_merged_translations_path(config, step_config, lang):
+    return os.path.join(
+        config.temppath, step_config.id, lang["code"], "merged_translations.json"
+    )
+
 
-def update_expiration_times(config, step_config, step_number, step_input_file):
+def update_expiration_times(config, step_config, step_number, step_input):
     step_name = step_config.id
     step_output_file = make_output_filepath(config, f"_{step_number}_{step_name}.json")
 
@@ -389,19 +504,26 @@ def update_expiration_times(config, step_config, step_number, step_input_file):
                 "update_expiration_times sources must reference "
                 "a special_expiration_file"
             )
-        with open(special_expiration_filepath, "r") as specifics_json:
-            specifics = json.load(specifics_json)
+        specifics = jsonio.load(special_expiration_filepath)
 
-    with open(step_input_file, "r") as in_json:
-        org = json.load(in_json)
+    if config.streaming and not step_input.loaded:
+        default = step_config.default_expiration_time
+
+        def expire(entries):
+            for key, value in entries:
+                if key == "flows":
+                    value = (set_expiration(f, default, specifics) for f in value)
+                yield key, value
+
+        jsonio.write_object(step_output_file, expire(step_input.entries()))
+        return OrgDocument.from_file(step_output_file)
+
+    org = step_input.detach()
 
     for flow in org.get("flows", []):
         set_expiration(flow, step_config.default_expiration_time, specifics)
 
-    with open(step_output_file, "w") as out_json:
-        json.dump(org, out_json)
-
-    return step_output_file
+    return OrgDocument(step_output_file, org)
 
 
 def set_expiration(flow, default, specifics={}):
@@ -415,71 +537,51 @@ def set_expiration(flow, default, specifics={}):
     return flow
 
 
-def split_rapidpro_json(config, input_filename):
+def split_rapidpro_json(config, flows):
     n = config.output_split_number
     assert isinstance(n, int) and n >= 1
     if n == 1:
         output_filename = (
             Path(config.outputpath) / f"{config.flows_outputbasename}.json"
         )
-        shutil.copyfile(input_filename, output_filename)
+        flows.save_as(output_filename)
         return
 
-    with open(input_filename, "r", encoding="utf-8") as in_json:
-        org = json.load(in_json)
-
-    flows_per_file = len(org["flows"]) // n
-
-    for i, b in enumerate(batch(org["flows"], flows_per_file), start=1):
-        org_new = copy(org)
-        org_new.update(
-            {
-                "campaigns": [
-                    edited
-                    for campaign in org["campaigns"]
-                    if (edited := edit_campaign(campaign, b))
-                ],
-                "flows": b,
-                "triggers": [
-                    trigger
-                    for trigger in org["triggers"]
-                    if trigger["flow"]["uuid"] in [flow["uuid"] for flow in b]
-                ],
-            }
-        )
-        output_filename = (
-            Path(config.outputpath) / f"{config.flows_outputbasename}_{i}.json"
-        )
+    def output_filename(i):
+        return Path(config.outputpath) / f"{config.flows_outputbasename}_{i}.json"
 
-        with open(output_filename, "w") as out_file:
-            json.dump(org_new, out_file, indent=2)
-            print(f"File written, path={output_filename}")
+    if config.streaming and not flows.loaded:
+        paths = [output_filename(i) for i in range(1, n + 1)]
+        counts = write_partitioned_org(flows, paths)
+        for path, count in zip(paths, counts):
+            print(f"File written, path={path}, flows={count}")
+        return
 
+    def write(i, org):
+        jsonio.dump(org, output_filename(i), indent=2)
+        print(f"File written, path={output_filename(i)}, flows={len(org['flows'])}")
 
-def write_diffable(config, input_filename, subfolder="diffable"):
-    output_subfolder = Path(config.outputpath) / subfolder
-    os.makedirs(output_subfolder, exist_ok=True)
-    rpft.converters.flows_to_sheets(input_filename, output_subfolder, strip_uuids=True)
+    parts = partition_org(flows.org, n)
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        for future in [
+            executor.submit(write, i, org) for i, org in enumerate(parts, start=1)
+        ]:
+            future.result()
 
 
-def edit_campaign(campaign, flows):
-    if not campaign["events"]:
-        return campaign
+def write_diffable(config, flows, subfolder="diffable"):
+    from parenttext_pipeline.diffable import write_flow_sheets
 
-    campaign_new = copy(campaign)
-    campaign_new["events"] = []
-    for event in campaign["events"]:
-        event_type = event["event_type"]
-        flow_name = event["flow"]["name"]
-        if event_type in ["F", "M"] and flow_name in [f["name"] for f in flows]:
-            campaign_new["events"].append(event)
-        else:
-            print(
-                f"Campaign event removed, campaign={campaign['name']}, "
-                f"event_type={event_type}"
-            )
-            if event_type == "F":
-                print(f"Flow not found, name={flow_name}")
+    if config.streaming and not flows.loaded:
+        org_flows = flows.flows()
+    else:
+        org_flows = flows.org.get("flows", [])
+    write_flow_sheets(org_flows, Path(config.outputpath) / subfolder)
+
+
+def edit_campaign(campaign, flow_names):
+    """Remove the events of campaign whose flows are not in the set flow_names.
 
-    if campaign_new["events"]:
-        return campaign_new
+    The set is built by the caller, once for all the campaigns it edits.
+    """
+    return filter_campaign_events(campaign, flow_names)
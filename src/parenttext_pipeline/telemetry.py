@@ -0,0 +1,133 @@
+import contextlib
+import hashlib
+import json
+import os
+import sys
+import time
+
+from parenttext_pipeline import jsonio
+from parenttext_pipeline.cache import folder_hashes
+from parenttext_pipeline.node import worker_usage
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+class Telemetry:
+    """
+    Records wall time, CPU time and memory usage of parts of a pipeline run.
+
+    Each measurement becomes a record that can be written to meta.json, and an
+    event in a trace file that can be opened in chrome://tracing or Perfetto.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.records = []
+
+    @contextlib.contextmanager
+    def measure(self, name, category, **fields):
+        """Measure the enclosed block.
+
+        Yields the record, so that further fields can be added to it.
+        """
+        record = {"name": name, "category": category, **fields}
+        before = snapshot()
+        try:
+            yield record
+        finally:
+            after = snapshot()
+            record.update(
+                {
+                    "start": round(before["wall_time"] - self.origin, 6),
+                    "wall_time": round(after["wall_time"] - before["wall_time"], 6),
+                    "cpu_time": round(after["cpu_time"] - before["cpu_time"], 6),
+                    "children_cpu_time": round(
+                        after["children_cpu_time"] - before["children_cpu_time"], 6
+                    ),
+                    # Peak resident set sizes are high-water marks since the
+                    # start of the process (or the start of the Node workers).
+                    "max_rss": after["max_rss"],
+                    "children_max_rss": after["children_max_rss"],
+                }
+            )
+            self.records.append(record)
+
+    def write_trace(self, path):
+        pid = os.getpid()
+        events = [
+            {
+                "name": record["name"],
+                "cat": record["category"],
+                "ph": "X",
+                "ts": round(record["start"] * 1e6),
+                "dur": round(record["wall_time"] * 1e6),
+                "pid": pid,
+                "tid": 0,
+                "args": {
+                    key: value
+                    for key, value in record.items()
+                    if key not in ["name", "category", "start", "wall_time"]
+                },
+            }
+            for record in self.records
+        ]
+        jsonio.dump({"traceEvents": events, "displayTimeUnit": "ms"}, path)
+
+
+def snapshot():
+    node = worker_usage()
+    values = {
+        "wall_time": time.perf_counter(),
+        "cpu_time": time.process_time(),
+        "children_cpu_time": node["cpu_time"],
+        "max_rss": None,
+        "children_max_rss": node["max_rss"] or None,
+    }
+    if resource is not None:
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        values["children_cpu_time"] += children.ru_utime + children.ru_stime
+        values["max_rss"] = rss_bytes(own.ru_maxrss)
+        values["children_max_rss"] = max(
+            rss_bytes(children.ru_maxrss), node["max_rss"]
+        )
+    return values
+
+
+def rss_bytes(maxrss):
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def describe_flows(flows, load=True):
+    """Hash and size of the file and number of flows of an OrgDocument.
+
+    The file is not written for this, so the hash and size of a document that
+    is only held in memory are None. The flows of a document that is not in
+    memory are counted by reading its file one flow at a time, without loading
+    it, unless load is False, in which case they are not counted.
+    """
+    if flows is None:
+        return {"hash": None, "size": None, "flows": None}
+    digest = size = count = None
+    if not flows.dirty and flows.path and os.path.isfile(flows.path):
+        digest = flows.digest
+        size = os.path.getsize(flows.path)
+    if flows.loaded:
+        count = len(flows.org.get("flows", []))
+    elif load:
+        count = sum(1 for _ in flows.flows())
+    return {"hash": digest, "size": size, "flows": count}
+
+
+def describe_folder(path):
+    """Hash and total size of the files in a folder."""
+    hashes = folder_hashes(path)
+    digest = hashlib.sha256(json.dumps(hashes, sort_keys=True).encode("utf-8"))
+    size = sum(
+        os.path.getsize(os.path.join(path, name)) for name in hashes
+    )
+    return {"hash": digest.hexdigest(), "size": size}
@@ -0,0 +1,17 @@
+"""Helpers shared by the tests."""
+
+import json
+
+
+def flow(name):
+    return {"name": name, "uuid": f"{name}-uuid", "nodes": []}
+
+
+def read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_json(path, content):
+    with open(path, "w") as f:
+        json.dump(content, f)
@@ -0,0 +1,122 @@
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from parenttext_pipeline import compile_flows as compile_flows_module
+from parenttext_pipeline import jsonio
+from parenttext_pipeline.compile_flows import compile_flows
+from parenttext_pipeline.configs import load_config
+from parenttext_pipeline.telemetry import Telemetry
+
+from helpers import flow, write_json
+
+
+class TestResume(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        write_json(
+            self.root / "config.json",
+            {
+                "meta": {"version": "1.0.0", "pipeline_version": "1.0.0"},
+                "flows_outputbasename": "flows",
+                # Without a cache, steps are only skipped because of checkpoints
+                "cachepath": None,
+                "sources": {
+                    "flows": {"format": "json", "files_dict": {"flows": "x.json"}},
+                    "expiration": {
+                        "format": "json",
+                        "files_dict": {"special_expiration_file": "x.json"},
+                    },
+                },
+                "steps": [
+                    {"id": "load", "type": "load_flows", "sources": ["flows"]},
+                    {
+                        "id": "expiration",
+                        "type": "update_expiration_times",
+                        "sources": ["expiration"],
+                        "default_expiration_time": 60,
+                    },
+                ],
+            },
+        )
+        self.write_input("flows", "flows", {"flows": [flow("flow_1")]})
+        self.write_input("expiration", "special_expiration_file", {"flow_1": 120})
+        write_json(self.root / "input" / "meta.json", {"pull_timestamp": "now"})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_input(self, source, file_id, content):
+        folder = self.root / "input" / source
+        folder.mkdir(parents=True, exist_ok=True)
+        write_json(folder / f"{file_id}.json", content)
+
+    def compile(self, **kwargs):
+        telemetry = Telemetry()
+        compile_flows(load_config(self.root), telemetry, **kwargs)
+        return [record["name"] for record in telemetry.records if "resumed" in record]
+
+    def output(self):
+        with open(self.root / "output" / "flows.json") as f:
+            return json.load(f)
+
+    def test_unchanged_steps_are_resumed(self):
+        self.compile()
+
+        # The output of expiration is only held in memory and never written to
+        # the temp folder, so it is executed again
+        self.assertEqual(self.compile(resume=True), ["load"])
+        self.assertFalse((self.root / "temp" / "flows_2_expiration.json").exists())
+        self.assertEqual(self.output()["flows"][0]["expire_after_minutes"], 120)
+
+    def test_steps_after_changed_input_are_executed(self):
+        self.compile()
+        self.write_input("expiration", "special_expiration_file", {"flow_1": 240})
+
+        self.assertEqual(self.compile(resume=True), ["load"])
+        self.assertEqual(self.output()["flows"][0]["expire_after_minutes"], 240)
+
+    def test_resume_after_failed_step(self):
+        def fail(*args):
+            raise ValueError("failed")
+
+        with patch.dict(
+            compile_flows_module.STEP_MAPPING, {"update_expiration_times": fail}
+        ):
+            with self.assertRaises(ValueError):
+                self.compile()
+
+        self.assertEqual(self.compile(resume=True), ["load"])
+        self.assertEqual(self.output()["flows"][0]["expire_after_minutes"], 120)
+
+    def test_from_step_requires_unchanged_earlier_steps(self):
+        self.compile()
+        self.assertEqual(self.compile(from_step=2), ["load"])
+
+        self.write_input("flows", "flows", {"flows": [flow("flow_2")]})
+
+        with self.assertRaises(ValueError):
+            self.compile(from_step=2)
+
+    def test_outputs_in_memory_are_not_serialized_for_checkpoints(self):
+        serialized = []
+        dumpb = jsonio.dumpb
+
+        def record_dumpb(obj, *args):
+            if isinstance(obj, dict) and isinstance(obj.get("flows"), list):
+                serialized.append(obj)
+            return dumpb(obj, *args)
+
+        with patch("parenttext_pipeline.jsonio.dumpb", record_dumpb):
+            compile_flows(load_config(self.root), Telemetry())
+
+        # Only the result written to the output folder
+        self.assertEqual(len(serialized), 1)
+
+    def test_from_step_without_previous_run(self):
+        with self.assertRaises(ValueError):
+            self.compile(from_step=2)
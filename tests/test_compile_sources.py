@@ -0,0 +1,74 @@
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from parenttext_pipeline.compile_sources import compile_sources
+
+
+class TestCompileSources(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_later_parents_and_child_override_earlier_parents(self):
+        grandparent = self.repo("grandparent", {}, {"shared": "grandparent"})
+        parents = {
+            name: self.repo(
+                name,
+                {"grandparent": grandparent},
+                {"shared": name, name: name},
+                ["grandparent.src"],
+            )
+            for name in ["parent1", "parent2", "parent3"]
+        }
+        child = self.repo(
+            "child",
+            parents,
+            {"own": "child"},
+            ["parent1.src", "parent2.src", "parent3.src"],
+        )
+        destination = self.root / "temp" / "input"
+
+        sources = compile_sources(child, destination)
+
+        self.assertEqual(
+            list(sources["src"].files_dict),
+            ["shared", "parent1", "parent2", "parent3", "own"],
+        )
+        self.assertEqual(read(destination / "src" / "shared.json"), "parent3")
+        self.assertEqual(read(destination / "src" / "parent1.json"), "parent1")
+        self.assertEqual(read(destination / "src" / "own.json"), "child")
+
+    def repo(self, name, parents, files, parent_sources=()):
+        folder = self.root / name
+        (folder / "input" / "src").mkdir(parents=True)
+        config = {
+            "meta": {"version": "1.0.0", "pipeline_version": "1.0.0"},
+            "flows_outputbasename": name,
+            "parents": {
+                parent_id: {"location": str(location)}
+                for parent_id, location in parents.items()
+            },
+            "sources": {
+                "src": {
+                    "format": "json",
+                    "parent_sources": list(parent_sources),
+                    "files_dict": {file_id: f"{file_id}.json" for file_id in files},
+                }
+            },
+        }
+        (folder / "config.json").write_text(json.dumps(config))
+        for file_id, content in files.items():
+            (folder / "input" / "src" / f"{file_id}.json").write_text(
+                json.dumps(content)
+            )
+        return folder
+
+
+def read(path):
+    return json.loads(path.read_text())
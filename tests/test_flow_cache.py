@@ -0,0 +1,111 @@
+import copy
+import json
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from parenttext_pipeline.configs import Config
+from parenttext_pipeline.flow_cache import apply_incremental
+from parenttext_pipeline.org import OrgDocument
+
+
+class TestApplyIncremental(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        (self.root / "temp").mkdir()
+        self.config = Config(
+            meta={"version": "1.0.0", "pipeline_version": "1.0.0"},
+            sources={},
+            steps=[
+                {
+                    "id": "qr",
+                    "type": "qr_treatment",
+                    "qr_treatment": "move",
+                    "incremental": True,
+                }
+            ],
+            flows_outputbasename="flows",
+            temppath=str(self.root / "temp"),
+            cachepath=str(self.root / "cache"),
+        )
+        self.step_config = self.config.steps[0]
+        self.org = {
+            "version": "13",
+            "flows": [flow(f"flow_{i}") for i in range(1, 5)],
+            "groups": [],
+        }
+        self.processed = []
+        self.runs = 0
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def apply(self, org):
+        self.processed = []
+        step_input = OrgDocument(self.root / "temp" / "flows_1.json", org)
+        return apply_incremental(
+            self.mark_flows, self.config, self.step_config, 2, step_input
+        ).org
+
+    def mark_flows(self, config, step_config, step_number, step_input_file):
+        """Mark each flow, and make it join a group added to the org."""
+        with open(step_input_file) as f:
+            org = json.load(f)
+        self.runs += 1
+        org["groups"].append({"uuid": f"group-{self.runs}", "name": "g"})
+        for f in org["flows"]:
+            self.processed.append(f["name"])
+            f["marked"] = step_config.qr_treatment
+            f["group"] = org["groups"][-1]["uuid"]
+        output = os.path.join(config.temppath, "flows_2_qr.json")
+        with open(output, "w") as f:
+            json.dump(org, f)
+        return output
+
+    def test_only_changed_flows_are_processed(self):
+        first = self.apply(copy.deepcopy(self.org))
+        self.org["flows"][2]["nodes"] = [{"uuid": "new-node"}]
+
+        second = self.apply(copy.deepcopy(self.org))
+
+        self.assertEqual(self.processed, ["flow_3"])
+        self.assertEqual(
+            [f["name"] for f in second["flows"]], [f["name"] for f in first["flows"]]
+        )
+        self.assertEqual(second["flows"][2]["nodes"], [{"uuid": "new-node"}])
+        self.assertTrue(all(f["marked"] == "move" for f in second["flows"]))
+
+    def test_references_to_added_entries_are_kept(self):
+        self.apply(copy.deepcopy(self.org))
+        self.org["flows"][0]["nodes"] = []
+
+        org = self.apply(copy.deepcopy(self.org))
+
+        self.assertEqual([group["name"] for group in org["groups"]], ["g"])
+        self.assertEqual(
+            {f["group"] for f in org["flows"]}, {org["groups"][0]["uuid"]}
+        )
+
+    def test_changed_step_config_processes_all_flows(self):
+        self.apply(copy.deepcopy(self.org))
+        self.step_config.qr_treatment = "reformat"
+
+        org = self.apply(copy.deepcopy(self.org))
+
+        self.assertEqual(len(self.processed), 4)
+        self.assertTrue(all(f["marked"] == "reformat" for f in org["flows"]))
+
+    def test_unchanged_flows_are_not_processed(self):
+        first = self.apply(copy.deepcopy(self.org))
+
+        second = self.apply(copy.deepcopy(self.org))
+
+        self.assertEqual(self.processed, [])
+        self.assertEqual(second, first)
+
+
+def flow(name):
+    return {"name": name, "uuid": f"{name}-uuid", "nodes": [{"uuid": f"{name}-1"}]}
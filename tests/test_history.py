@@ -0,0 +1,115 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from parenttext_pipeline.configs import Config
+from parenttext_pipeline.history import (
+    RunHistory,
+    init,
+    recorded_run,
+    regressions,
+)
+from parenttext_pipeline.telemetry import Telemetry
+
+
+class TestRunHistory(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.history = RunHistory(self.root / "history.sqlite")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def record(self, wall_time, cached=False, status="ok", version="1.0.0", size=100):
+        return self.history.record(
+            {
+                "operation": "compile_flows",
+                "started": "2024-01-01T00:00:00+00:00",
+                "wall_time": wall_time,
+                "status": status,
+                "pipeline_version": version,
+                "config_version": "1.0.0",
+                "config_hash": "abc",
+                "workspace": None,
+            },
+            [
+                {
+                    "name": "translation",
+                    "category": "step",
+                    "cached": cached,
+                    "wall_time": wall_time,
+                    "input_size": size,
+                }
+            ],
+        )
+
+    def test_durations_leave_out_cached_and_failed_runs(self):
+        self.record(10)
+        self.record(0.1, cached=True)
+        self.record(20, status="failed")
+        self.record(12)
+
+        self.assertEqual(self.history.durations("translation", "step"), [12, 10])
+        self.assertEqual(self.history.estimate("translation", "step"), 11)
+
+    def test_slower_part_is_a_regression(self):
+        for _ in range(3):
+            self.record(10)
+        run_id = self.record(30, size=200)
+
+        found = regressions(self.history, run_id)
+
+        self.assertEqual([r["name"] for r in found], ["translation"])
+        self.assertEqual(found[0]["median"], 10)
+        self.assertEqual(found[0]["cause"], "content")
+
+    def test_new_version_is_blamed_for_regression(self):
+        self.record(10)
+        run_id = self.record(30, version="2.0.0")
+
+        self.assertEqual(regressions(self.history, run_id)[0]["cause"], "code")
+
+    def test_small_changes_are_not_regressions(self):
+        self.record(10)
+        run_id = self.record(11)
+
+        self.assertEqual(regressions(self.history, run_id), [])
+
+    @patch("parenttext_pipeline.configs.load_config")
+    def test_regressions_command_returns_exit_status(self, _):
+        self.record(10)
+        self.record(30)
+
+        with patch.object(RunHistory, "from_config", return_value=self.history):
+            with patch("sys.argv", ["history", "regressions"]):
+                found = init()
+            self.record(11)
+            with patch("sys.argv", ["history", "regressions"]):
+                not_found = init()
+
+        self.assertEqual(found, 1)
+        self.assertEqual(not_found, 0)
+
+    def test_failed_runs_are_recorded(self):
+        config = Config(
+            meta={"version": "1.0.0", "pipeline_version": "1.0.0"},
+            sources={},
+            flows_outputbasename="flows",
+            cachepath=str(self.root / "cache"),
+        )
+        telemetry = Telemetry()
+
+        with self.assertRaises(ValueError):
+            with recorded_run(config, "compile_flows", telemetry):
+                with telemetry.measure("create_flows", "step"):
+                    raise ValueError()
+
+        history = RunHistory.from_config(config)
+        [run] = history.runs()
+        self.assertEqual(run["status"], "failed")
+        self.assertEqual(
+            [part["name"] for part in history.parts(run["id"])], ["create_flows"]
+        )
@@ -0,0 +1,54 @@
+import subprocess
+import sys
+from unittest import TestCase
+
+# Generous, so that the test does not fail on slow machines; importing the
+# operations eagerly took well over a second.
+IMPORT_TIME_BUDGET_US = 500_000
+HEAVY_MODULES = ["googleapiclient", "rapidpro_abtesting", "rpft", "requests"]
+
+
+class TestCliImport(TestCase):
+
+    def test_cli_is_imported_within_budget(self):
+        result = run_python("-X", "importtime", "-c", "import parenttext_pipeline.cli")
+
+        self.assertLess(
+            cumulative_import_time(result.stderr, "parenttext_pipeline.cli"),
+            IMPORT_TIME_BUDGET_US,
+        )
+
+    def test_cli_does_not_import_operation_dependencies(self):
+        result = run_python(
+            "-c",
+            "import sys, parenttext_pipeline.cli; "
+            "print('\\n'.join(sys.modules))",
+        )
+        modules = result.stdout.split()
+
+        for name in HEAVY_MODULES:
+            self.assertNotIn(name, modules)
+
+    def test_operations_can_be_resolved(self):
+        from parenttext_pipeline.cli import OPERATIONS_MAP, get_operation
+
+        for name in OPERATIONS_MAP:
+            self.assertTrue(callable(get_operation(name)))
+
+
+def run_python(*args):
+    return subprocess.run(
+        [sys.executable, *args],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+
+
+def cumulative_import_time(report, module):
+    for line in report.splitlines():
+        # import time: self [us] | cumulative | imported package
+        _, cumulative, name = line.split("|")
+        if name.strip() == module:
+            return int(cumulative.strip())
+    raise AssertionError(f"{module} not in import time report")
@@ -0,0 +1,350 @@
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+import rpft.converters
+from rpft.converters import get_content_index_parser
+
+from parenttext_pipeline.incremental import (
+    UUID_PATTERN,
+    create_flows,
+    defined_flow_names,
+    rpft_supported,
+)
+
+MODELS_MODULE = "parenttext_pipeline.models.parenttext_models"
+
+
+class TestIncrementalCreateFlows(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.sheets_file = self.root / "sheets.json"
+        self.state_file = self.root / "cache" / "create_flows.json"
+        self.sheets = {
+            "content_index": [
+                index_row("create_flow", "flow_a"),
+                index_row("create_flow", "flow_b"),
+                index_row("data_sheet", "items"),
+                index_row("create_flow", "item_template", data_sheet="items"),
+            ],
+            "flow_a": [
+                message_row("1", "start", "Hello"),
+                {
+                    "row_id": "2",
+                    "type": "start_new_flow",
+                    "from": "1",
+                    "message_text": "flow_b",
+                },
+            ],
+            "flow_b": [message_row("1", "start", "Bye")],
+            "items": [{"ID": "x", "text": "X"}, {"ID": "y", "text": "Y"}],
+            "item_template": [message_row("1", "start", "{{text}}")],
+        }
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create_flows(self, processes=1):
+        org = self.create_org(processes)
+        return {flow["name"]: flow for flow in org["flows"]}
+
+    def create_org(self, processes=1, state_file=True):
+        with open(self.sheets_file, "w") as f:
+            json.dump({"meta": {"version": "0.1.0"}, "sheets": self.sheets}, f)
+        return create_flows(
+            [str(self.sheets_file)],
+            MODELS_MODULE,
+            [],
+            self.state_file if state_file else None,
+            processes,
+        )
+
+    def test_unchanged_flows_are_carried_over(self):
+        first = self.create_flows()
+        second = self.create_flows()
+
+        self.assertEqual(first, second)
+
+    def test_flows_of_changed_template_are_rendered(self):
+        first = self.create_flows()
+        self.sheets["flow_b"][0]["message_text"] = "See you"
+        second = self.create_flows()
+
+        self.assertEqual(first["flow_a"], second["flow_a"])
+        self.assertNotEqual(first["flow_b"], second["flow_b"])
+        self.assertEqual(
+            second["flow_b"]["nodes"][0]["actions"][0]["text"], "See you"
+        )
+        self.assertEqual(first["flow_b"]["uuid"], second["flow_b"]["uuid"])
+
+    def test_only_flows_of_changed_rows_are_rendered(self):
+        first = self.create_flows()
+        self.sheets["items"][1]["text"] = "Z"
+        second = self.create_flows()
+
+        self.assertEqual(first["item_template - x"], second["item_template - x"])
+        self.assertEqual(
+            second["item_template - y"]["nodes"][0]["actions"][0]["text"], "Z"
+        )
+
+    def test_added_and_removed_rows(self):
+        self.create_flows()
+        self.sheets["items"] = [{"ID": "y", "text": "Y"}, {"ID": "z", "text": "Z"}]
+        flows = self.create_flows()
+
+        self.assertEqual(
+            list(flows),
+            ["flow_a", "flow_b", "item_template - y", "item_template - z"],
+        )
+
+    def test_references_to_rendered_flows_stay_valid(self):
+        self.create_flows()
+        self.sheets["flow_b"][0]["message_text"] = "See you"
+        flows = self.create_flows()
+
+        enter_flow = flows["flow_a"]["nodes"][1]["actions"][0]
+        self.assertEqual(enter_flow["flow"]["uuid"], flows["flow_b"]["uuid"])
+
+    def test_same_flows_as_full_compilation(self):
+        self.create_flows()
+        self.sheets["items"][0]["text"] = "W"
+        incremental = self.create_flows()
+        self.state_file.unlink()
+        full = self.create_flows()
+
+        self.assertEqual(list(incremental), list(full))
+        for name in full:
+            self.assertEqual(
+                strip_uuids(incremental[name]), strip_uuids(full[name]), name
+            )
+
+    def test_same_flows_when_rendered_in_processes(self):
+        self.sheets["flow_b"][0]["obj_id"] = ""
+        self.sheets["flow_b"].append(
+            {
+                "row_id": "2",
+                "type": "add_to_group",
+                "from": "1",
+                "message_text": "members",
+                "obj_id": "8224bfe2-acec-434f-bc7c-14c584fc4bc8",
+            }
+        )
+        sequential = self.create_org(state_file=False)
+        parallel = self.create_org(processes=2, state_file=False)
+
+        self.assertEqual(
+            [flow["name"] for flow in parallel["flows"]],
+            [flow["name"] for flow in sequential["flows"]],
+        )
+        self.assertEqual(strip_uuids(parallel), strip_uuids(sequential))
+        self.assertEqual(parallel["groups"], sequential["groups"])
+        flows = {flow["name"]: flow for flow in parallel["flows"]}
+        enter_flow = flows["flow_a"]["nodes"][1]["actions"][0]
+        self.assertEqual(enter_flow["flow"]["uuid"], flows["flow_b"]["uuid"])
+
+    def test_changed_flows_are_rendered_in_processes(self):
+        first = self.create_flows(processes=2)
+        self.sheets["items"][1]["text"] = "Z"
+        second = self.create_flows(processes=2)
+
+        self.assertEqual(first["item_template - x"], second["item_template - x"])
+        self.assertEqual(
+            second["item_template - y"]["nodes"][0]["actions"][0]["text"], "Z"
+        )
+
+
+class TestSameOrgAsRpft(TestCase):
+    """
+    The incremental creation relies on internals of RPFT (FlowParser._parse_flow,
+    RapidProContainer and UUIDDict), so it is compared with create_flows of RPFT.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.state_file = self.root / "cache" / "create_flows.json"
+        self.sheets = {
+            "main.json": {
+                "content_index": [
+                    index_row("create_flow", "flow_a"),
+                    index_row("data_sheet", "items"),
+                    index_row("create_flow", "item_template", data_sheet="items"),
+                    index_row("create_campaign", "campaign"),
+                    index_row("create_triggers", "triggers"),
+                ],
+                "flow_a": [
+                    message_row("1", "start", "Hello") | {"obj_id": ""},
+                    {
+                        "row_id": "2",
+                        "type": "start_new_flow",
+                        "from": "1",
+                        "message_text": "flow_b",
+                        "obj_id": "",
+                    },
+                ],
+                "items": [{"ID": "x", "text": "X"}, {"ID": "y", "text": "Y"}],
+                "item_template": [
+                    message_row("1", "start", "{{text}}") | {"obj_id": ""},
+                    {
+                        "row_id": "2",
+                        "type": "add_to_group",
+                        "from": "1",
+                        "message_text": "members",
+                        "obj_id": "",
+                    },
+                ],
+                "campaign": [
+                    {
+                        "offset": "1",
+                        "unit": "D",
+                        "event_type": "F",
+                        "delivery_hour": "",
+                        "message": "",
+                        "relative_to": "Created On",
+                        "start_mode": "I",
+                        "flow": "flow_a",
+                    }
+                ],
+                "triggers": [
+                    {
+                        "type": "K",
+                        "keywords": "hello",
+                        "flow": "flow_b",
+                        "groups": "",
+                        "exclude_groups": "",
+                        "channel": "",
+                        "match_type": "",
+                    }
+                ],
+            },
+            "extra.json": {
+                "content_index": [index_row("create_flow", "flow_b")],
+                "flow_b": [message_row("1", "start", "Bye")],
+            },
+        }
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_sheets(self):
+        files = []
+        for name, sheets in self.sheets.items():
+            path = self.root / name
+            with open(path, "w") as f:
+                json.dump({"meta": {"version": "0.1.0"}, "sheets": sheets}, f)
+            files.append(str(path))
+        return files
+
+    def assertSameOrg(self, processes=1):
+        files = self.write_sheets()
+        org = create_flows(files, MODELS_MODULE, [], self.state_file, processes)
+        expected = rpft.converters.create_flows(
+            files, None, None, data_models=MODELS_MODULE, tags=[]
+        )
+
+        self.assertEqual(canonical_uuids(org), canonical_uuids(expected))
+
+    def test_first_run(self):
+        self.assertSameOrg()
+
+    def test_run_after_changes(self):
+        self.assertSameOrg()
+        self.sheets["main.json"]["items"][1]["text"] = "Z"
+        self.sheets["extra.json"]["flow_b"][0]["message_text"] = "See you"
+        self.assertSameOrg()
+
+    def test_run_in_processes_after_changes(self):
+        self.assertSameOrg(processes=2)
+        self.sheets["main.json"]["items"].append({"ID": "z", "text": "Z"})
+        self.assertSameOrg(processes=2)
+
+    def test_installed_rpft_is_supported(self):
+        self.assertTrue(rpft_supported())
+
+    @patch("parenttext_pipeline.incremental.version", return_value="1.19.0")
+    def test_other_rpft_is_not_supported(self, _):
+        self.assertFalse(rpft_supported())
+
+
+class TestDefinedFlowNames(TestCase):
+
+    def test_flows_matching_tags(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sheets_file = Path(temp_dir) / "sheets.json"
+            rows = [
+                index_row("create_flow", "flow_a") | {"tags": "module"},
+                index_row("create_flow", "flow_b") | {"tags": "menu"},
+                index_row("create_flow", "flow_c") | {"tags": ""},
+                index_row("data_sheet", "items") | {"tags": ""},
+                index_row("create_flow", "item_template", data_sheet="items")
+                | {"tags": "menu"},
+            ]
+            sheets = {
+                "content_index": rows,
+                "items": [{"ID": "x", "text": "X"}],
+            }
+            for name in ["flow_a", "flow_b", "flow_c", "item_template"]:
+                sheets[name] = [message_row("1", "start", "Hello")]
+            with open(sheets_file, "w") as f:
+                json.dump({"meta": {"version": "0.1.0"}, "sheets": sheets}, f)
+
+            def names(tags):
+                parser = get_content_index_parser(
+                    [str(sheets_file)], None, MODELS_MODULE, tags
+                )
+                return defined_flow_names(parser.definition)
+
+            self.assertEqual(names([1, "module"]), {"flow_a", "flow_c"})
+            self.assertEqual(
+                names([1, "delivery", 1, "menu"]),
+                {"flow_b", "flow_c", "item_template - x"},
+            )
+
+
+def index_row(type, sheet_name, data_sheet=""):
+    return {
+        "type": type,
+        "sheet_name": sheet_name,
+        "data_sheet": data_sheet,
+        "new_name": "",
+    }
+
+
+def message_row(row_id, parent, text):
+    return {
+        "row_id": row_id,
+        "type": "send_message",
+        "from": parent,
+        "message_text": text,
+    }
+
+
+def strip_uuids(value):
+    if isinstance(value, dict):
+        return {k: strip_uuids(v) for k, v in value.items() if "uuid" not in k}
+    if isinstance(value, list):
+        return [strip_uuids(v) for v in value]
+    return value
+
+
+def canonical_uuids(org):
+    """Replace each UUID by the position of its first occurrence in org.
+
+    Two orgs compare equal afterwards if they only differ in the UUIDs they use.
+    """
+    positions = {}
+
+    def replace(value):
+        if isinstance(value, dict):
+            return {k: replace(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [replace(v) for v in value]
+        if isinstance(value, str) and UUID_PATTERN.fullmatch(value):
+            return positions.setdefault(value, len(positions))
+        return value
+
+    return replace(org)
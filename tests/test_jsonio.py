@@ -0,0 +1,118 @@
+import itertools
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from parenttext_pipeline import jsonio
+
+DOCUMENT = {
+    "flows": [
+        {"name": "flow_ä", "text": "Ẁelcome ✓", "nodes": [], "metadata": {}},
+        {"name": "flow_b", "expire_after_minutes": 1440, "ready": True, "x": None},
+    ],
+    "campaigns": [],
+}
+
+
+class TestJsonIO(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / "org.json"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_round_trip(self):
+        for backend in backends():
+            with self.subTest(backend=backend), patch.object(
+                jsonio, "BACKEND", backend
+            ):
+                jsonio.dump(DOCUMENT, self.path)
+
+                self.assertEqual(jsonio.load(self.path), DOCUMENT)
+
+    def test_compact_output_has_no_whitespace(self):
+        jsonio.dump(DOCUMENT, self.path)
+
+        self.assertNotIn(b"\n", self.path.read_bytes())
+        self.assertNotIn(b'": ', self.path.read_bytes())
+
+    def test_pretty_output_is_the_same_for_all_backends(self):
+        expected = json.dumps(DOCUMENT, indent=2, ensure_ascii=False)
+
+        for backend in backends():
+            with self.subTest(backend=backend), patch.object(
+                jsonio, "BACKEND", backend
+            ):
+                jsonio.dump(DOCUMENT, self.path, indent=2)
+
+                self.assertEqual(self.path.read_text(encoding="utf-8"), expected)
+
+    def test_other_indents(self):
+        self.assertEqual(
+            jsonio.dumps({"a": [1]}, indent=4),
+            json.dumps({"a": [1]}, indent=4),
+        )
+
+    def test_integer_keys_are_written_as_strings(self):
+        self.assertEqual(jsonio.loads(jsonio.dumps({1: "a"})), {"1": "a"})
+
+    def test_iter_object(self):
+        jsonio.dump(DOCUMENT | {"count": 12345}, self.path, indent=2)
+
+        for chunk_size in [1, 7, jsonio.CHUNK_SIZE]:
+            with self.subTest(chunk_size=chunk_size), patch.object(
+                jsonio, "CHUNK_SIZE", chunk_size
+            ), open(self.path, encoding="utf-8") as f:
+                entries = [
+                    (key, list(value) if key == "flows" else value)
+                    for key, value in jsonio.iter_object(f, lazy=["flows"])
+                ]
+
+                self.assertEqual(dict(entries), DOCUMENT | {"count": 12345})
+
+    def test_iter_object_skips_unconsumed_items(self):
+        jsonio.dump(DOCUMENT, self.path)
+
+        with open(self.path, encoding="utf-8") as f:
+            keys = [key for key, _ in jsonio.iter_object(f, lazy=["flows"])]
+
+        self.assertEqual(keys, ["flows", "campaigns"])
+
+    def test_iter_object_rejects_invalid_documents(self):
+        self.path.write_text('{"flows": [{"name": "a"} {"name": "b"}]}')
+
+        with self.assertRaises(ValueError), open(self.path) as f:
+            for _, value in jsonio.iter_object(f, lazy=["flows"]):
+                list(value)
+
+    def test_write_object_is_the_same_as_dump(self):
+        document = DOCUMENT | {"empty": [], "site": "example", "nested": {"a": [1]}}
+        expected_path = self.path.with_name("expected.json")
+
+        for backend, indent in itertools.product(backends(), [None, 2]):
+            with self.subTest(backend=backend, indent=indent), patch.object(
+                jsonio, "BACKEND", backend
+            ):
+                jsonio.dump(document, expected_path, indent)
+                jsonio.write_object(
+                    self.path,
+                    (
+                        (key, iter(value) if key in ["flows", "empty"] else value)
+                        for key, value in document.items()
+                    ),
+                    indent,
+                )
+
+                self.assertEqual(self.path.read_bytes(), expected_path.read_bytes())
+
+
+def backends():
+    return ["json"] + [
+        name
+        for name, module in [("orjson", jsonio.orjson), ("msgspec", jsonio.msgspec)]
+        if module is not None
+    ]
@@ -0,0 +1,84 @@
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from parenttext_pipeline.materialize import materialize_file, materialize_tree
+
+
+class TestMaterialize(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.src = self.root / "src.txt"
+        self.src.write_text("content")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_copy_has_content_of_source(self):
+        dst = self.root / "dst.txt"
+
+        method = materialize_file(self.src, dst)
+
+        self.assertIn(method, ["reflink", "copy"])
+        self.assertEqual(dst.read_text(), "content")
+
+    def test_copy_keeps_mode_and_modification_time(self):
+        os.chmod(self.src, 0o640)
+        os.utime(self.src, ns=(1_000_000_000, 1_000_000_000))
+        dst = self.root / "dst.txt"
+
+        materialize_file(self.src, dst)
+
+        self.assertEqual(dst.stat().st_mode, self.src.stat().st_mode)
+        self.assertEqual(dst.stat().st_mtime_ns, 1_000_000_000)
+
+    def test_copy_is_independent(self):
+        dst = self.root / "dst.txt"
+
+        materialize_file(self.src, dst)
+        with open(dst, "a") as f:
+            f.write(" changed")
+
+        self.assertEqual(self.src.read_text(), "content")
+
+    def test_existing_destination_is_replaced_not_written_through(self):
+        other = self.root / "other.txt"
+        other.write_text("other")
+        dst = self.root / "dst.txt"
+        os.link(other, dst)
+
+        materialize_file(self.src, dst)
+
+        self.assertEqual(dst.read_text(), "content")
+        self.assertEqual(other.read_text(), "other")
+
+    def test_tree_overrides_existing_files(self):
+        parent = self.root / "parent"
+        child = self.root / "child"
+        dst = self.root / "dst"
+        for folder, content in [(parent, "parent"), (child, "child")]:
+            (folder / "sub").mkdir(parents=True)
+            (folder / "sub" / "shared.json").write_text(content)
+            (folder / f"{content}.json").write_text(content)
+
+        materialize_tree(parent, dst)
+        materialize_tree(child, dst)
+
+        self.assertEqual((dst / "sub" / "shared.json").read_text(), "child")
+        self.assertEqual((dst / "parent.json").read_text(), "parent")
+        self.assertEqual((parent / "sub" / "shared.json").read_text(), "parent")
+
+    def test_files_of_tree_are_independent(self):
+        src = self.root / "input"
+        dst = self.root / "dst"
+        (src / "sub").mkdir(parents=True)
+        (src / "sub" / "file.json").write_text("content")
+
+        materialize_tree(src, dst)
+        with open(dst / "sub" / "file.json", "a") as f:
+            f.write(" changed")
+
+        self.assertEqual((src / "sub" / "file.json").read_text(), "content")
@@ -0,0 +1,63 @@
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from parenttext_pipeline.steps import merge_localizations
+
+
+class TestMergeLocalizations(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_org(self, name, flows):
+        path = self.root / name
+        with open(path, "w") as f:
+            json.dump({"flows": flows}, f)
+        return path
+
+    def test_must_merge_localization_of_each_language(self):
+        fra = self.write_org(
+            "fra.json",
+            [{"uuid": "1", "localization": {"fra": {"a": {"text": ["Bonjour"]}}}}],
+        )
+        spa = self.write_org(
+            "spa.json",
+            [{"uuid": "1", "localization": {"spa": {"a": {"text": ["Hola"]}}}}],
+        )
+
+        org = merge_localizations([fra, spa], ["fra", "spa"])
+
+        self.assertEqual(
+            org["flows"][0]["localization"],
+            {
+                "fra": {"a": {"text": ["Bonjour"]}},
+                "spa": {"a": {"text": ["Hola"]}},
+            },
+        )
+
+    def test_must_match_flows_by_uuid(self):
+        fra = self.write_org(
+            "fra.json",
+            [
+                {"uuid": "1", "localization": {}},
+                {"uuid": "2", "localization": {}},
+            ],
+        )
+        spa = self.write_org(
+            "spa.json",
+            [
+                {"uuid": "2", "localization": {"spa": {"b": {}}}},
+                {"uuid": "1", "localization": {"spa": {"a": {}}}},
+            ],
+        )
+
+        org = merge_localizations([fra, spa], ["fra", "spa"])
+
+        self.assertEqual(org["flows"][0]["localization"], {"spa": {"a": {}}})
+        self.assertEqual(org["flows"][1]["localization"], {"spa": {"b": {}}})
@@ -0,0 +1,108 @@
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import TestCase, skipIf
+
+from parenttext_pipeline.node import NodeScriptError, NodeWorkerPool, run_node_process
+
+SCRIPT = """
+const fs = require("fs");
+const [command, output] = process.argv.slice(2);
+if (require.main === module) {
+  if (command === "write") {
+    setTimeout(() => fs.writeFile(output, "{}", (err) => {}), 20);
+  } else if (command === "fail") {
+    process.exit(1);
+  } else if (command === "leak") {
+    const seen = { global: typeof globalThis.leaked, env: process.env.LEAKED || null };
+    fs.writeFileSync(output, JSON.stringify(seen));
+    globalThis.leaked = true;
+    process.env.LEAKED = "yes";
+  } else if (command === "print") {
+    fs.writeSync(1, "stray output\\n");
+  } else if (command === "count") {
+    const counter = require("./counter");
+    counter.count += 1;
+    fs.writeFileSync(output, String(counter.count));
+  }
+}
+"""
+
+
+@skipIf(shutil.which("node") is None, "Node is not installed")
+class TestNodeWorkerPool(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.script = Path(self.temp_dir.name) / "script.js"
+        self.script.write_text(SCRIPT)
+        (Path(self.temp_dir.name) / "counter.js").write_text(
+            'require("fs").appendFileSync(__dirname + "/loads.txt", "x");\n'
+            "module.exports = { count: 0 };"
+        )
+        self.pool = NodeWorkerPool(max_workers=1)
+
+    def tearDown(self):
+        self.pool.close()
+        self.temp_dir.cleanup()
+
+    def test_waits_for_asynchronous_work(self):
+        output = Path(self.temp_dir.name) / "output.json"
+
+        response = self.pool.run(self.script, ["write", output])
+
+        self.assertTrue(response["ok"])
+        self.assertTrue(output.exists())
+
+    def test_reuses_worker_across_operations(self):
+        for i in range(3):
+            output = Path(self.temp_dir.name) / f"output_{i}.json"
+            self.pool.run(self.script, ["write", output])
+            self.assertTrue(output.exists())
+
+        self.assertEqual(len(self.pool.workers), 1)
+
+    def test_module_state_is_reset_for_each_operation(self):
+        output = Path(self.temp_dir.name) / "count.txt"
+        for _ in range(2):
+            self.pool.run(self.script, ["count", output])
+            self.assertEqual(output.read_text(), "1")
+
+        loads = Path(self.temp_dir.name) / "loads.txt"
+        self.assertEqual(loads.read_text(), "x")
+
+    def test_globals_and_environment_are_reset_for_each_operation(self):
+        output = Path(self.temp_dir.name) / "seen.json"
+        for _ in range(2):
+            self.pool.run(self.script, ["leak", output])
+            self.assertEqual(
+                json.loads(output.read_text()), {"global": "undefined", "env": None}
+            )
+
+    def test_worker_is_replaced_after_invalid_response(self):
+        output = Path(self.temp_dir.name) / "output.json"
+        self.pool.run(self.script, ["write", output])
+        [worker] = self.pool.workers
+
+        self.pool.run(self.script, ["print"])
+        output.unlink()
+        self.pool.run(self.script, ["write", output])
+
+        self.assertTrue(output.exists())
+        self.assertEqual(len(self.pool.workers), 1)
+        self.assertIsNot(self.pool.workers[0], worker)
+        self.assertIsNotNone(worker.process.poll())
+
+    def test_raises_failure_without_stopping_worker(self):
+        with self.assertRaises(NodeScriptError):
+            self.pool.run(self.script, ["fail"])
+        output = Path(self.temp_dir.name) / "output.json"
+        succeeded = self.pool.run(self.script, ["write", output])
+
+        self.assertTrue(succeeded["ok"])
+        self.assertEqual(len(self.pool.workers), 1)
+
+    def test_raises_failure_of_process(self):
+        with self.assertRaises(NodeScriptError):
+            run_node_process(self.script, ["fail"])
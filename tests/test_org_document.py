@@ -0,0 +1,72 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from parenttext_pipeline.cache import file_hash
+from parenttext_pipeline.org import OrgDocument
+
+from helpers import read_json, write_json
+
+
+class TestOrgDocument(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_must_not_write_file_until_needed(self):
+        path = self.root / "flows.json"
+        document = OrgDocument(path, {"flows": []})
+
+        self.assertFalse(path.exists())
+        self.assertEqual(document.to_file(), str(path))
+        self.assertEqual(read_json(path), {"flows": []})
+
+    def test_must_load_org_from_file_on_access(self):
+        path = self.root / "flows.json"
+        write_json(path, {"flows": [{"name": "flow_1"}]})
+
+        document = OrgDocument.from_file(path)
+
+        self.assertEqual(document.org["flows"][0]["name"], "flow_1")
+
+    def test_must_move_unwritten_document_when_saved_elsewhere(self):
+        path = self.root / "flows.json"
+        output = self.root / "output.json"
+        document = OrgDocument(path, {"flows": []})
+
+        document.save_as(output)
+
+        self.assertFalse(path.exists())
+        self.assertEqual(document.to_file(), str(output))
+        self.assertEqual(read_json(output), {"flows": []})
+
+    def test_must_copy_written_document_when_saved_elsewhere(self):
+        path = self.root / "flows.json"
+        output = self.root / "output.json"
+        write_json(path, {"flows": []})
+
+        OrgDocument.from_file(path).save_as(output)
+
+        self.assertEqual(read_json(output), {"flows": []})
+
+    def test_detached_unwritten_document_cannot_be_written(self):
+        document = OrgDocument(self.root / "flows.json", {"flows": []})
+
+        document.detach()
+
+        with self.assertRaises(ValueError):
+            document.to_file()
+
+    def test_digest_of_unwritten_document_does_not_write_file(self):
+        path = self.root / "flows.json"
+        document = OrgDocument(path, {"flows": [{"name": "flow_1"}]})
+
+        digest = document.digest
+
+        self.assertFalse(path.exists())
+        document.to_file()
+        self.assertEqual(digest, file_hash(path))
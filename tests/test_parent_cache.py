@@ -0,0 +1,143 @@
+import io
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from parenttext_pipeline.parent_cache import ParentCache, ParentNotCachedError
+
+BRANCH_URL = "https://github.com/org/parent/archive/refs/heads/main.zip"
+TAG_URL = "https://github.com/org/parent/archive/refs/tags/1.0.0.zip"
+
+
+class TestParentCache(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.cache_path = self.root / "cache"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_local_archive_is_unpacked_once(self):
+        archive = self.root / "parent.zip"
+        archive.write_bytes(zip_bytes("v1"))
+
+        folder = ParentCache(self.cache_path).fetch(str(archive))
+        (folder / "marker").write_text("")
+        again = ParentCache(self.cache_path).fetch(str(archive))
+
+        self.assertEqual(folder, again)
+        self.assertTrue((again / "marker").exists())
+        self.assertEqual((again / "config.json").read_text(), "v1")
+
+    def test_changed_local_archive_is_unpacked_again(self):
+        archive = self.root / "parent.zip"
+        archive.write_bytes(zip_bytes("v1"))
+        ParentCache(self.cache_path).fetch(str(archive))
+        archive.write_bytes(zip_bytes("version 2"))
+
+        folder = ParentCache(self.cache_path).fetch(str(archive))
+
+        self.assertEqual((folder / "config.json").read_text(), "version 2")
+
+    @patch("parenttext_pipeline.parent_cache.requests.get")
+    def test_unchanged_archive_is_not_downloaded_again(self, get):
+        get.return_value = response(200, zip_bytes("v1"), etag='"abc"')
+        ParentCache(self.cache_path).fetch(BRANCH_URL)
+        get.return_value = response(304)
+
+        folder = ParentCache(self.cache_path).fetch(BRANCH_URL)
+
+        self.assertEqual(get.call_args.kwargs["headers"], {"If-None-Match": '"abc"'})
+        self.assertEqual((folder / "config.json").read_text(), "v1")
+
+    @patch("parenttext_pipeline.parent_cache.requests.get")
+    def test_changed_archive_is_downloaded_again(self, get):
+        get.return_value = response(200, zip_bytes("v1"), etag='"abc"')
+        ParentCache(self.cache_path).fetch(BRANCH_URL)
+        get.return_value = response(200, zip_bytes("v2"), etag='"def"')
+
+        folder = ParentCache(self.cache_path).fetch(BRANCH_URL)
+
+        self.assertEqual((folder / "config.json").read_text(), "v2")
+
+    @patch("parenttext_pipeline.parent_cache.requests.get")
+    def test_replaced_archive_stays_readable_by_other_runs(self, get):
+        get.return_value = response(200, zip_bytes("v1"), etag='"abc"')
+        reader = ParentCache(self.cache_path).fetch(BRANCH_URL)
+        get.return_value = response(200, zip_bytes("v2"), etag='"def"')
+
+        folder = ParentCache(self.cache_path).fetch(BRANCH_URL)
+
+        self.assertNotEqual(folder, reader)
+        self.assertEqual((reader / "config.json").read_text(), "v1")
+        self.assertEqual((folder / "config.json").read_text(), "v2")
+
+    @patch("parenttext_pipeline.parent_cache.requests.get")
+    def test_stale_archives_are_deleted(self, get):
+        get.return_value = response(200, zip_bytes("v1"), etag='"abc"')
+        stale = ParentCache(self.cache_path).fetch(BRANCH_URL)
+        get.return_value = response(200, zip_bytes("v2"), etag='"def"')
+
+        with patch("parenttext_pipeline.parent_cache.STALE_AFTER", -1):
+            folder = ParentCache(self.cache_path).fetch(BRANCH_URL)
+
+        self.assertFalse(stale.exists())
+        self.assertEqual((folder / "config.json").read_text(), "v2")
+
+    @patch("parenttext_pipeline.parent_cache.requests.get")
+    def test_tag_archive_is_not_requested_again(self, get):
+        get.return_value = response(200, zip_bytes("v1"))
+        ParentCache(self.cache_path).fetch(TAG_URL)
+
+        ParentCache(self.cache_path).fetch(TAG_URL)
+
+        self.assertEqual(get.call_count, 1)
+
+    @patch("parenttext_pipeline.parent_cache.requests.get")
+    def test_archive_is_fetched_once_per_run(self, get):
+        get.return_value = response(200, zip_bytes("v1"))
+        with ParentCache() as parents:
+            first = parents.fetch(BRANCH_URL)
+            second = parents.fetch(BRANCH_URL)
+
+            self.assertEqual(first, second)
+            self.assertEqual(get.call_count, 1)
+        self.assertFalse(os.path.exists(first))
+
+    @patch("parenttext_pipeline.parent_cache.requests.get")
+    def test_offline_cache_does_not_make_requests(self, get):
+        get.return_value = response(200, zip_bytes("v1"), etag='"abc"')
+        ParentCache(self.cache_path).fetch(BRANCH_URL)
+        get.reset_mock()
+        offline = ParentCache(self.cache_path, offline=True)
+
+        folder = offline.fetch(BRANCH_URL)
+        with self.assertRaises(ParentNotCachedError):
+            offline.fetch(TAG_URL)
+
+        get.assert_not_called()
+        self.assertEqual((folder / "config.json").read_text(), "v1")
+        self.assertEqual(offline.missing, {TAG_URL})
+
+
+def zip_bytes(config):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("parent-main/config.json", config)
+        archive.writestr("parent-main/input/source/file.json", "{}")
+    return buffer.getvalue()
+
+
+def response(status_code, content=b"", etag=None):
+    mock = MagicMock()
+    mock.status_code = status_code
+    mock.ok = status_code < 400
+    mock.headers = {"ETag": etag} if etag else {}
+    mock.iter_content.return_value = [content]
+    mock.__enter__.return_value = mock
+    return mock
@@ -0,0 +1,132 @@
+from unittest import TestCase
+
+from parenttext_pipeline.split import partition_org
+
+
+class TestPartitionOrg(TestCase):
+
+    def test_every_flow_is_assigned_once(self):
+        org = make_org([flow(f"flow_{i}") for i in range(7)])
+
+        parts = partition_org(org, 3)
+
+        self.assertEqual(
+            [f["name"] for part in parts for f in part["flows"]],
+            [f"flow_{i}" for i in range(7)],
+        )
+        self.assertEqual([len(part["flows"]) for part in parts], [3, 2, 2])
+
+    def test_flows_starting_each_other_stay_together(self):
+        org = make_org(
+            [
+                flow("flow_a", enters=["flow_d"]),
+                flow("flow_b"),
+                flow("flow_c"),
+                flow("flow_d"),
+            ]
+        )
+
+        parts = partition_org(org, 2)
+
+        self.assertEqual(names(parts), [["flow_a", "flow_d"], ["flow_b", "flow_c"]])
+
+    def test_flows_of_a_campaign_stay_together(self):
+        org = make_org(
+            [flow("flow_a"), flow("flow_b"), flow("flow_c"), flow("flow_d")],
+            campaigns=[campaign("campaign_a", ["flow_b", "flow_d"])],
+        )
+
+        parts = partition_org(org, 2)
+
+        self.assertEqual(names(parts), [["flow_a", "flow_b", "flow_d"], ["flow_c"]])
+        self.assertEqual(parts[0]["campaigns"], org["campaigns"])
+        self.assertEqual(parts[1]["campaigns"], [])
+
+    def test_triggers_go_with_their_flow(self):
+        org = make_org(
+            [flow("flow_a"), flow("flow_b")],
+            triggers=[trigger("flow_b"), trigger("flow_a"), trigger("flow_x")],
+        )
+
+        parts = partition_org(org, 2)
+
+        self.assertEqual(parts[0]["triggers"], [trigger("flow_a")])
+        self.assertEqual(parts[1]["triggers"], [trigger("flow_b")])
+
+    def test_events_for_missing_flows_are_removed(self):
+        org = make_org(
+            [flow("flow_a"), flow("flow_b")],
+            campaigns=[
+                campaign("campaign_a", ["flow_a", "flow_x"]),
+                campaign("campaign_b", ["flow_y"]),
+            ],
+        )
+
+        parts = partition_org(org, 2)
+
+        self.assertEqual(len(parts[0]["campaigns"]), 1)
+        events = parts[0]["campaigns"][0]["events"]
+        self.assertEqual([e["flow"]["name"] for e in events], ["flow_a"])
+        self.assertEqual(parts[1]["campaigns"], [])
+
+    def test_more_parts_than_groups(self):
+        org = make_org([flow("flow_a", enters=["flow_b"]), flow("flow_b")])
+
+        parts = partition_org(org, 3)
+
+        self.assertEqual(names(parts), [["flow_a", "flow_b"], [], []])
+
+    def test_other_content_is_kept(self):
+        org = make_org([flow("flow_a"), flow("flow_b")])
+        org["fields"] = [{"key": "field_a"}]
+
+        parts = partition_org(org, 2)
+
+        self.assertEqual(parts[1]["fields"], [{"key": "field_a"}])
+
+
+def make_org(flows, campaigns=None, triggers=None):
+    return {
+        "flows": flows,
+        "campaigns": campaigns or [],
+        "triggers": triggers or [],
+    }
+
+
+def flow(name, enters=()):
+    return {
+        "uuid": f"uuid_{name}",
+        "name": name,
+        "nodes": [
+            {
+                "actions": [
+                    {
+                        "type": "enter_flow",
+                        "flow": {"uuid": f"uuid_{target}", "name": target},
+                    }
+                    for target in enters
+                ],
+            }
+        ],
+    }
+
+
+def campaign(name, flow_names):
+    return {
+        "name": name,
+        "events": [
+            {"event_type": "F", "flow": {"uuid": f"uuid_{n}", "name": n}}
+            for n in flow_names
+        ],
+    }
+
+
+def trigger(flow_name):
+    return {
+        "trigger_type": "K",
+        "flow": {"uuid": f"uuid_{flow_name}", "name": flow_name},
+    }
+
+
+def names(parts):
+    return [[f["name"] for f in part["flows"]] for part in parts]
@@ -0,0 +1,188 @@
+import io
+import json
+import tempfile
+import zipfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from parenttext_pipeline.compile_flows import compile_flows
+from parenttext_pipeline.configs import load_config
+from parenttext_pipeline.history import config_hash
+from parenttext_pipeline.plan import make_plan, plan_pull_data
+
+from helpers import flow, write_json
+
+
+# File id of the input file of each source
+FILES = {"flows": "flows", "expiration": "special_expiration_file"}
+PARENT_URL = "https://github.com/org/parent/archive/refs/heads/main.zip"
+
+
+class TestPlan(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.upstream = self.root / "upstream"
+        self.upstream.mkdir()
+        write_json(self.upstream / "flows.json", {"flows": [flow("flow_1")]})
+        write_json(self.upstream / "expiration.json", {"flow_1": 120})
+        write_json(
+            self.root / "config.json",
+            {
+                "meta": {"version": "1.0.0", "pipeline_version": "1.0.0"},
+                "flows_outputbasename": "flows",
+                "cachepath": "cache",
+                "sources": {
+                    name: {
+                        "format": "json",
+                        "files_dict": {file_id: str(self.upstream / f"{name}.json")},
+                    }
+                    for name, file_id in FILES.items()
+                },
+                "steps": [
+                    {"id": "load", "type": "load_flows", "sources": ["flows"]},
+                    {
+                        "id": "expiration",
+                        "type": "update_expiration_times",
+                        "sources": ["expiration"],
+                        "default_expiration_time": 60,
+                    },
+                ],
+            },
+        )
+        # As if pulled before
+        for name, file_id in FILES.items():
+            folder = self.root / "input" / name
+            folder.mkdir(parents=True)
+            (folder / f"{file_id}.json").write_bytes(
+                (self.upstream / f"{name}.json").read_bytes()
+            )
+        write_json(self.root / "input" / "meta.json", {"pull_timestamp": "now"})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def plan(self):
+        return make_plan(load_config(self.root))
+
+    def actions(self, items):
+        return {item["name"]: item["action"] for item in items}
+
+    def test_all_steps_run_before_first_build(self):
+        plan = self.plan()
+
+        self.assertEqual(
+            self.actions(plan["steps"]), {"load": "run", "expiration": "run"}
+        )
+        self.assertFalse(plan["noop"])
+
+    def test_all_steps_are_reused_after_build(self):
+        compile_flows(load_config(self.root))
+
+        plan = self.plan()
+
+        self.assertEqual(
+            self.actions(plan["steps"]), {"load": "reuse", "expiration": "reuse"}
+        )
+        self.assertTrue(plan["noop"])
+
+    def test_steps_after_changed_input_run(self):
+        compile_flows(load_config(self.root))
+        write_json(
+            self.root / "input" / "expiration" / "special_expiration_file.json", {}
+        )
+
+        plan = self.plan()
+
+        self.assertEqual(
+            self.actions(plan["steps"]), {"load": "reuse", "expiration": "run"}
+        )
+        self.assertIsNotNone(plan["steps"][1]["estimate"])
+
+    def test_changed_json_sources_are_copied(self):
+        compile_flows(load_config(self.root))
+        write_json(self.upstream / "flows.json", {"flows": []})
+
+        plan = self.plan()
+
+        self.assertEqual(
+            self.actions(plan["sources"]), {"flows": "copy", "expiration": "skip"}
+        )
+        self.assertFalse(plan["noop"])
+
+    @patch("parenttext_pipeline.parent_cache.requests.get")
+    def test_parents_not_in_cache_are_not_downloaded(self, get):
+        self.add_parent()
+
+        plan = self.plan()
+
+        get.assert_not_called()
+        self.assertEqual(self.actions(plan["parents"]), {PARENT_URL: "download"})
+        self.assertEqual(
+            self.actions(plan["steps"]), {"load": "run", "expiration": "run"}
+        )
+        self.assertFalse(plan["noop"])
+
+    @patch("parenttext_pipeline.parent_cache.requests.get")
+    def test_cached_parents_are_not_checked(self, get):
+        self.add_parent()
+        get.return_value = response(parent_archive())
+        compile_flows(load_config(self.root))
+        get.reset_mock()
+
+        plan = self.plan()
+
+        get.assert_not_called()
+        self.assertEqual(self.actions(plan["parents"]), {PARENT_URL: "check"})
+        self.assertEqual(
+            self.actions(plan["steps"]), {"load": "reuse", "expiration": "reuse"}
+        )
+        self.assertTrue(plan["noop"])
+        self.assertEqual(plan["checks"], 1)
+
+    def test_config_py_is_hashed(self):
+        (self.root / "config.json").unlink()
+        (self.root / "config.py").write_text("def create_config():\n    return {}\n")
+        write_json(
+            self.root / "input" / "meta.json",
+            {"pull_timestamp": "now", "hash": config_hash(self.root)},
+        )
+        config = MagicMock(root=self.root, inputpath=str(self.root / "input"))
+        config.sources = {}
+
+        self.assertEqual(plan_pull_data(config, {}), [])
+
+    def add_parent(self):
+        with open(self.root / "config.json") as f:
+            config = json.load(f)
+        config["parents"] = {"base": {"location": PARENT_URL}}
+        write_json(self.root / "config.json", config)
+
+
+def parent_archive():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr(
+            "parent-main/config.json",
+            json.dumps(
+                {
+                    "meta": {"version": "1.0.0", "pipeline_version": "1.0.0"},
+                    "flows_outputbasename": "parent",
+                    "sources": {},
+                }
+            ),
+        )
+        archive.writestr("parent-main/input/meta.json", "{}")
+    return buffer.getvalue()
+
+
+def response(content):
+    mock = MagicMock()
+    mock.status_code = 200
+    mock.ok = True
+    mock.headers = {}
+    mock.iter_content.return_value = [content]
+    mock.__enter__.return_value = mock
+    return mock
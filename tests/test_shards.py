@@ -0,0 +1,143 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from parenttext_pipeline.configs import Config
+from parenttext_pipeline.org import OrgDocument
+from parenttext_pipeline.shards import apply_sharded, merge_orgs, split_flows
+
+
+class TestApplySharded(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.config = Config(
+            meta={"version": "1.0.0", "pipeline_version": "1.0.0"},
+            sources={},
+            steps=[{"id": "check", "type": "fix_arg_qr_translation", "shards": 3}],
+            flows_outputbasename="flows",
+            temppath=str(self.root / "temp"),
+        )
+        self.step_config = self.config.steps[0]
+        self.org = {
+            "version": "13",
+            "flows": [flow(f"flow_{i}") for i in range(1, 8)],
+            "groups": [{"uuid": "group-uuid", "name": "group"}],
+        }
+        self.step_input = OrgDocument(self.root / "flows_1.json", self.org)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_flows_keep_their_order(self):
+        output = apply_sharded(
+            mark_flows, self.config, self.step_config, 2, self.step_input
+        )
+
+        self.assertEqual(
+            [f["name"] for f in output.org["flows"]],
+            [f"flow_{i}" for i in range(1, 8)],
+        )
+        self.assertTrue(all(f["marked"] for f in output.org["flows"]))
+        self.assertEqual(output.org["groups"], self.org["groups"])
+        self.assertEqual(output.path, str(self.root / "temp" / "flows_2_check.json"))
+
+    def test_logs_are_merged(self):
+        apply_sharded(mark_flows, self.config, self.step_config, 2, self.step_input)
+
+        with open(self.root / "temp" / "2_check.json") as f:
+            self.assertEqual(json.load(f), [f"flow_{i}" for i in range(1, 8)])
+        self.assertEqual(
+            (self.root / "temp" / "2_check.log").read_text().splitlines(),
+            [f"flow_{i}" for i in range(1, 8)],
+        )
+
+    def test_steps_without_flow_output(self):
+        output = apply_sharded(
+            lambda *args: None, self.config, self.step_config, 2, self.step_input
+        )
+
+        self.assertIsNone(output)
+
+
+class TestShardsConfig(TestCase):
+
+    def test_steps_across_flows_cannot_be_sharded(self):
+        for step in [
+            {"type": "has_any_word_check"},
+            {"type": "overall_integrity_check"},
+            {"type": "safeguarding", "redirect_flow_names": "[]"},
+        ]:
+            with self.assertRaises(ValueError):
+                Config(
+                    meta={"version": "1.0.0", "pipeline_version": "1.0.0"},
+                    sources={},
+                    steps=[step | {"id": "check", "shards": 3}],
+                    flows_outputbasename="flows",
+                )
+
+
+class TestSplitFlows(TestCase):
+
+    def test_shards_are_consecutive(self):
+        flows = [flow(f"flow_{i}", nodes=i % 3) for i in range(10)]
+
+        shards = split_flows(flows, 4)
+
+        self.assertEqual(len(shards), 4)
+        self.assertEqual([f for shard in shards for f in shard], flows)
+
+    def test_no_more_shards_than_flows(self):
+        self.assertEqual(len(split_flows([flow("flow_1")], 4)), 1)
+        self.assertEqual(split_flows([], 4), [[]])
+
+
+class TestMergeOrgs(TestCase):
+
+    def test_references_to_added_entries_are_merged(self):
+        orgs = [
+            {
+                "flows": [flow("flow_1", group="a")],
+                "groups": [{"uuid": "a", "name": "new"}],
+            },
+            {
+                "flows": [flow("flow_2", group="b")],
+                "groups": [{"uuid": "b", "name": "new"}],
+            },
+        ]
+
+        org = merge_orgs(orgs)
+
+        self.assertEqual(org["groups"], [{"uuid": "a", "name": "new"}])
+        self.assertEqual([f["group"] for f in org["flows"]], ["a", "a"])
+
+
+def mark_flows(config, step_config, step_number, step_input_file):
+    with open(step_input_file) as f:
+        org = json.load(f)
+    for f in org["flows"]:
+        f["marked"] = True
+    names = [f["name"] for f in org["flows"]]
+    log = os.path.join(config.temppath, f"{step_number}_{step_config.id}")
+    with open(log + ".json", "w") as f:
+        json.dump(names, f)
+    with open(log + ".log", "w") as f:
+        f.write("".join(name + "\n" for name in names))
+    output = os.path.join(config.temppath, f"flows_{step_number}_check.json")
+    with open(output, "w") as f:
+        json.dump(org, f)
+    return output
+
+
+def flow(name, nodes=1, group=None):
+    result = {
+        "name": name,
+        "uuid": f"{name}-uuid",
+        "nodes": [{"uuid": f"{name}-{i}"} for i in range(nodes)],
+    }
+    if group:
+        result["group"] = group
+    return result
@@ -0,0 +1,113 @@
+import json
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from unittest import TestCase, skipIf
+from unittest.mock import patch
+
+from parenttext_pipeline import compile_flows as compile_flows_module
+from parenttext_pipeline.compile_flows import compile_flows
+from parenttext_pipeline.configs import load_config
+from parenttext_pipeline.node import NodeScriptError
+from parenttext_pipeline.telemetry import Telemetry
+
+from helpers import flow, write_json
+
+
+class TestSideBranches(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        write_json(
+            self.root / "config.json",
+            {
+                "meta": {"version": "1.0.0", "pipeline_version": "1.0.0"},
+                "flows_outputbasename": "flows",
+                "cachepath": None,
+                "sources": {
+                    "flows": {"format": "json", "files_dict": {"flows": "x.json"}},
+                },
+                "steps": [
+                    {"id": "load", "type": "load_flows", "sources": ["flows"]},
+                    {"id": "check", "type": "overall_integrity_check"},
+                    {
+                        "id": "expiration",
+                        "type": "update_expiration_times",
+                        "default_expiration_time": 60,
+                    },
+                ],
+            },
+        )
+        folder = self.root / "input" / "flows"
+        folder.mkdir(parents=True)
+        write_json(folder / "flows.json", {"flows": [flow("flow_1")]})
+        write_json(self.root / "input" / "meta.json", {"pull_timestamp": "now"})
+        self.expiration_done = threading.Event()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def compile(self, check=None):
+        expire = compile_flows_module.STEP_MAPPING["update_expiration_times"]
+        check = check or compile_flows_module.STEP_MAPPING["overall_integrity_check"]
+
+        def expire_and_notify(*args):
+            output = expire(*args)
+            self.expiration_done.set()
+            return output
+
+        telemetry = Telemetry()
+        with patch.dict(
+            compile_flows_module.STEP_MAPPING,
+            {
+                "overall_integrity_check": check,
+                "update_expiration_times": expire_and_notify,
+            },
+        ):
+            compile_flows(load_config(self.root), telemetry)
+        return telemetry
+
+    def test_following_steps_do_not_wait(self):
+        checked = []
+
+        def check(config, step_config, step_number, step_input_file):
+            # Only completes if the following step runs in the meantime
+            checked.append(self.expiration_done.wait(timeout=10))
+            with open(step_input_file) as f:
+                checked.append(json.load(f)["flows"][0]["name"])
+
+        telemetry = self.compile(check)
+
+        self.assertEqual(checked, [True, "flow_1"])
+        records = {record["name"]: record for record in telemetry.records}
+        self.assertTrue(records["check"]["side_branch"])
+        self.assertTrue((self.root / "output" / "meta.json").is_file())
+
+    def test_failures_are_raised(self):
+        def check(*args):
+            raise RuntimeError("integrity check failed")
+
+        with self.assertRaises(RuntimeError):
+            self.compile(check)
+
+        with open(self.root / "output" / "meta.json") as f:
+            self.assertNotIn("steps", json.load(f))
+
+    @skipIf(shutil.which("node") is None, "Node is not installed")
+    def test_failures_of_node_scripts_are_raised(self):
+        script = self.root / "node_modules" / "@idems" / "idems_translation_chatbot"
+        script.mkdir(parents=True)
+        (script / "index.js").write_text("process.exit(1);")
+
+        for node_worker in [True, False]:
+            with self.subTest(node_worker=node_worker):
+                with open(self.root / "config.json") as f:
+                    config = json.load(f)
+                write_json(
+                    self.root / "config.json", config | {"node_worker": node_worker}
+                )
+
+                with self.assertRaises(NodeScriptError):
+                    self.compile()
@@ -0,0 +1,99 @@
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from parenttext_pipeline.cache import StepCache, file_hash
+from parenttext_pipeline.configs import Config
+
+from helpers import write_json
+
+
+class TestStepCache(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.config = Config(
+            meta={"version": "1.0.0", "pipeline_version": "1.0.0"},
+            sources={
+                "expiration": {
+                    "format": "json",
+                    "files_dict": {"special_expiration_file": "expiration.json"},
+                },
+            },
+            steps=[
+                {
+                    "id": "expiration",
+                    "type": "update_expiration_times",
+                    "sources": ["expiration"],
+                    "default_expiration_time": 60,
+                },
+            ],
+            flows_outputbasename="flows",
+            temppath=str(self.root / "temp"),
+            cachepath=str(self.root / "cache"),
+        )
+        self.step_config = self.config.steps[0]
+        source_folder = self.root / "temp" / "input" / "expiration"
+        source_folder.mkdir(parents=True)
+        self.source_file = source_folder / "special_expiration_file.json"
+        write_json(self.source_file, {"flow_1": 120})
+        self.input_file = self.root / "flows_1.json"
+        write_json(self.input_file, {"flows": []})
+        self.cache = StepCache.from_config(self.config)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def key(self):
+        return self.cache.key(
+            self.config, self.step_config, 2, file_hash(self.input_file)
+        )
+
+    def test_key_is_stable(self):
+        self.assertEqual(self.key(), self.key())
+
+    def test_key_changes_with_input_file(self):
+        key = self.key()
+        write_json(self.input_file, {"flows": [{"name": "flow_1"}]})
+        self.assertNotEqual(key, self.key())
+
+    def test_key_changes_with_source_file(self):
+        key = self.key()
+        write_json(self.source_file, {"flow_1": 240})
+        self.assertNotEqual(key, self.key())
+
+    def test_key_changes_with_step_config(self):
+        key = self.key()
+        self.step_config.default_expiration_time = 120
+        self.assertNotEqual(key, self.key())
+
+    def test_key_changes_with_python_package_version(self):
+        key = self.key()
+        with patch("parenttext_pipeline.cache.version", return_value="99.0.0"):
+            self.assertNotEqual(key, self.key())
+
+    def test_restore_returns_none_on_miss(self):
+        self.assertIsNone(self.cache.restore(self.key(), self.config.temppath))
+
+    def test_restore_copies_stored_output(self):
+        key = self.key()
+        output_file = self.root / "flows_2_expiration.json"
+        write_json(output_file, {"flows": [{"name": "flow_1"}]})
+        self.cache.store(key, output_file)
+        output_file.unlink()
+
+        restored = self.cache.restore(key, self.config.temppath)
+
+        self.assertEqual(
+            Path(restored),
+            Path(self.config.temppath) / "flows_2_expiration.json",
+        )
+        with open(restored) as f:
+            self.assertEqual(json.load(f), {"flows": [{"name": "flow_1"}]})
+
+    def test_caching_can_be_disabled(self):
+        self.config.cachepath = None
+        self.assertIsNone(StepCache.from_config(self.config))
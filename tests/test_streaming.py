@@ -0,0 +1,142 @@
+import copy
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from parenttext.referenced_assets import get_referenced_assets
+from parenttext_pipeline import jsonio
+from parenttext_pipeline.configs import Config
+from parenttext_pipeline.org import OrgDocument
+from parenttext_pipeline.steps import split_rapidpro_json, update_expiration_times
+
+
+class TestStreaming(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.org_file = self.root / "flows.json"
+        jsonio.dump(ORG, self.org_file)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def config(self, name, streaming, **kwargs):
+        (self.root / name / "output").mkdir(parents=True)
+        (self.root / name / "temp").mkdir()
+        return Config(
+            meta={"version": "1.0.0", "pipeline_version": "1.0.0"},
+            sources={},
+            steps=[
+                {
+                    "id": "expiration",
+                    "type": "update_expiration_times",
+                    "default_expiration_time": 60,
+                },
+            ],
+            flows_outputbasename="flows",
+            outputpath=str(self.root / name / "output"),
+            temppath=str(self.root / name / "temp"),
+            streaming=streaming,
+            **kwargs,
+        )
+
+    def test_update_expiration_times(self):
+        results = []
+        for streaming in [False, True]:
+            config = self.config(str(streaming), streaming)
+            flows = update_expiration_times(
+                config, config.steps[0], 2, OrgDocument.from_file(self.org_file)
+            )
+            self.assertEqual(flows.loaded, not streaming)
+            results.append(flows.org)
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[1]["flows"][0]["expire_after_minutes"], 60)
+
+    def test_split_rapidpro_json(self):
+        outputs = []
+        for streaming in [False, True]:
+            config = self.config(str(streaming), streaming, output_split_number=2)
+            split_rapidpro_json(config, OrgDocument.from_file(self.org_file))
+            outputs.append(
+                [
+                    (Path(config.outputpath) / f"flows_{i}.json").read_bytes()
+                    for i in [1, 2]
+                ]
+            )
+
+        self.assertEqual(outputs[0], outputs[1])
+
+    def test_streamed_org_without_flows_is_split_like_loaded_org(self):
+        jsonio.dump({"version": "13"}, self.org_file)
+
+        outputs = []
+        for streaming in [False, True]:
+            config = self.config(str(streaming), streaming, output_split_number=2)
+            split_rapidpro_json(config, OrgDocument.from_file(self.org_file))
+            outputs.append((Path(config.outputpath) / "flows_2.json").read_bytes())
+
+        self.assertEqual(outputs[0], outputs[1])
+
+    def test_entries_of_loaded_and_streamed_documents(self):
+        loaded = OrgDocument(self.org_file, copy.deepcopy(ORG))
+        streamed = OrgDocument.from_file(self.org_file)
+
+        for document in [loaded, streamed]:
+            self.assertEqual(
+                [flow["name"] for flow in document.flows()],
+                ["flow_1", "flow_2", "flow_3", "flow_4"],
+            )
+        self.assertFalse(streamed.loaded)
+
+    def test_get_referenced_assets(self):
+        assets = get_referenced_assets(self.org_file, {"image_path": ["images"]})
+
+        self.assertEqual(sorted(assets), ["images/a.png", "images/b.png"])
+
+
+def flow(name, attachment=None, enter=None):
+    actions = []
+    if attachment:
+        actions.append(
+            {
+                "type": "send_msg",
+                "attachments": [f'image:@(fields.image_path & "{attachment}")'],
+            }
+        )
+    if enter:
+        actions.append(
+            {"type": "enter_flow", "flow": {"uuid": f"{enter}-uuid", "name": enter}}
+        )
+    return {
+        "name": name,
+        "uuid": f"{name}-uuid",
+        "expire_after_minutes": 10080,
+        "metadata": {"expires": 10080},
+        "nodes": [{"uuid": f"{name}-node", "actions": actions}],
+    }
+
+
+ORG = {
+    "version": "13",
+    "site": "https://rapidpro.example",
+    "flows": [
+        flow("flow_1", "a.png", enter="flow_3"),
+        flow("flow_2", "b.png"),
+        flow("flow_3", "a.png"),
+        flow("flow_4"),
+    ],
+    "campaigns": [
+        {
+            "name": "campaign",
+            "events": [
+                {"event_type": "F", "flow": {"name": "flow_2"}},
+                {"event_type": "F", "flow": {"name": "flow_4"}},
+            ],
+        }
+    ],
+    "triggers": [{"flow": {"uuid": "flow_4-uuid"}, "keyword": "start"}],
+    "fields": [{"key": "image_path", "name": "image_path"}],
+    "groups": [],
+}
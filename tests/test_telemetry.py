@@ -0,0 +1,97 @@
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from parenttext_pipeline.cache import file_hash
+from parenttext_pipeline.org import OrgDocument
+from parenttext_pipeline.telemetry import Telemetry, describe_flows, describe_folder
+
+
+class TestTelemetry(TestCase):
+
+    def test_measure_records_fields(self):
+        telemetry = Telemetry()
+
+        with telemetry.measure("step_1", "step", type="edits") as record:
+            record["output_flows"] = 3
+
+        self.assertEqual(len(telemetry.records), 1)
+        record = telemetry.records[0]
+        self.assertEqual(record["name"], "step_1")
+        self.assertEqual(record["category"], "step")
+        self.assertEqual(record["type"], "edits")
+        self.assertEqual(record["output_flows"], 3)
+        self.assertGreaterEqual(record["wall_time"], 0)
+        self.assertGreaterEqual(record["cpu_time"], 0)
+
+    def test_measure_records_failed_blocks(self):
+        telemetry = Telemetry()
+
+        with self.assertRaises(ValueError):
+            with telemetry.measure("step_1", "step"):
+                raise ValueError()
+
+        self.assertEqual(telemetry.records[0]["name"], "step_1")
+
+    def test_write_trace(self):
+        telemetry = Telemetry()
+        with telemetry.measure("step_1", "step", type="edits"):
+            pass
+        with telemetry.measure("step_2", "step", type="qr_treatment"):
+            pass
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "trace.json"
+            telemetry.write_trace(path)
+            with open(path) as f:
+                trace = json.load(f)
+
+        events = trace["traceEvents"]
+        self.assertEqual([event["name"] for event in events], ["step_1", "step_2"])
+        self.assertTrue(all(event["ph"] == "X" for event in events))
+        self.assertLessEqual(events[0]["ts"], events[1]["ts"])
+        self.assertEqual(events[1]["args"]["type"], "qr_treatment")
+
+    def test_describe_flows(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "flows.json"
+            flows = OrgDocument(path, {"flows": [{"name": "a"}, {"name": "b"}]})
+
+            self.assertEqual(
+                describe_flows(flows), {"hash": None, "size": None, "flows": 2}
+            )
+
+            flows.to_file()
+
+            self.assertEqual(
+                describe_flows(flows),
+                {"hash": file_hash(path), "size": path.stat().st_size, "flows": 2},
+            )
+
+    def test_describe_flows_in_file_without_loading_them(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "flows.json"
+            OrgDocument(path, {"flows": [{"name": "a"}, {"name": "b"}]}).to_file()
+            flows = OrgDocument.from_file(path)
+
+            self.assertEqual(describe_flows(flows)["flows"], 2)
+            self.assertFalse(flows.loaded)
+            self.assertIsNone(describe_flows(flows, load=False)["flows"])
+
+    def test_describe_missing_flows(self):
+        self.assertEqual(
+            describe_flows(None), {"hash": None, "size": None, "flows": None}
+        )
+
+    def test_describe_folder(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            folder = Path(temp_dir)
+            (folder / "sub").mkdir()
+            (folder / "a.json").write_text("a")
+            (folder / "sub" / "b.json").write_text("bb")
+            before = describe_folder(folder)
+            (folder / "sub" / "b.json").write_text("cc")
+
+            self.assertEqual(before["size"], 3)
+            self.assertNotEqual(describe_folder(folder)["hash"], before["hash"])
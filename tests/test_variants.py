@@ -0,0 +1,98 @@
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from parenttext_pipeline.compile_flows import compile_flows
+from parenttext_pipeline.configs import load_config
+from parenttext_pipeline.telemetry import Telemetry
+
+from helpers import flow, write_json
+
+
+class TestVariants(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.config = {
+            "meta": {"version": "1.0.0", "pipeline_version": "1.0.0"},
+            "flows_outputbasename": "flows",
+            "cachepath": None,
+            "sources": {
+                "flows": {"format": "json", "files_dict": {"flows": "x.json"}},
+            },
+            "steps": [
+                {"id": "load", "type": "load_flows", "sources": ["flows"]},
+                {
+                    "id": "expiration",
+                    "type": "update_expiration_times",
+                    "default_expiration_time": 60,
+                },
+            ],
+            "variants": {
+                "short": {"steps": {"expiration": {"default_expiration_time": 30}}},
+                "split": {"output_split_number": 2},
+            },
+        }
+        folder = self.root / "input" / "flows"
+        folder.mkdir(parents=True)
+        write_json(
+            folder / "flows.json", {"flows": [flow("flow_1"), flow("flow_2")]}
+        )
+        write_json(self.root / "input" / "meta.json", {"pull_timestamp": "now"})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def compile(self, **kwargs):
+        write_json(self.root / "config.json", self.config)
+        telemetry = Telemetry()
+        compile_flows(load_config(self.root), telemetry, **kwargs)
+        return telemetry.records
+
+    def read_output(self, *path):
+        with open(self.root.joinpath("output", *path)) as f:
+            return json.load(f)
+
+    def test_each_variant_is_written_to_its_own_folder(self):
+        records = self.compile()
+
+        short = self.read_output("short", "flows.json")
+        self.assertEqual(
+            [f["expire_after_minutes"] for f in short["flows"]], [30, 30]
+        )
+        split = [self.read_output("split", f"flows_{i}.json") for i in [1, 2]]
+        self.assertEqual(
+            [f["expire_after_minutes"] for org in split for f in org["flows"]],
+            [60, 60],
+        )
+        self.assertEqual(self.read_output("short", "meta.json")["variant"], "short")
+
+        steps = [
+            (r["name"], r.get("variant")) for r in records if r["category"] == "step"
+        ]
+        self.assertEqual(steps.count(("load", None)), 1)
+        self.assertIn(("expiration", "short"), steps)
+        self.assertIn(("expiration", "split"), steps)
+
+    def test_variants_are_resumed(self):
+        self.compile()
+
+        records = self.compile(resume=True)
+
+        # The outputs of the variants are only held in memory, so only the
+        # shared step is resumed
+        self.assertEqual([r["name"] for r in records if r.get("resumed")], ["load"])
+        self.assertEqual(
+            self.read_output("short", "flows.json")["flows"][0][
+                "expire_after_minutes"
+            ],
+            30,
+        )
+
+    def test_unknown_step_in_variant(self):
+        self.config["variants"]["short"]["steps"] = {"qr": {"qr_limit": 3}}
+
+        with self.assertRaises(ValueError):
+            self.compile()
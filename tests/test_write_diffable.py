@@ -0,0 +1,100 @@
+import os
+import tempfile
+import uuid
+from pathlib import Path
+from unittest import TestCase
+
+from parenttext_pipeline.diffable import flow_hash, write_diffable_sheets
+
+
+class TestWriteDiffableSheets(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.folder = Path(self.temp_dir.name) / "diffable"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_sheets_of_all_flows_are_written(self):
+        write_diffable_sheets(org(flow("a", "Hello"), flow("b", "Bye")), self.folder)
+
+        self.assertEqual(sheets(self.folder), ["a.csv", "b.csv"])
+        self.assertIn("Hello", (self.folder / "a.csv").read_text())
+
+    def test_only_sheets_of_changed_flows_are_written(self):
+        write_diffable_sheets(org(flow("a", "Hello"), flow("b", "Bye")), self.folder)
+        mtimes = mark_written(self.folder)
+
+        write_diffable_sheets(org(flow("a", "Hi"), flow("b", "Bye")), self.folder)
+
+        self.assertNotEqual(os.stat(self.folder / "a.csv").st_mtime_ns, mtimes["a"])
+        self.assertEqual(os.stat(self.folder / "b.csv").st_mtime_ns, mtimes["b"])
+        self.assertIn("Hi", (self.folder / "a.csv").read_text())
+
+    def test_sheets_of_removed_flows_are_deleted(self):
+        write_diffable_sheets(org(flow("a", "Hello"), flow("b", "Bye")), self.folder)
+        write_diffable_sheets(org(flow("a", "Hello")), self.folder)
+
+        self.assertEqual(sheets(self.folder), ["a.csv"])
+
+    def test_unknown_sheets_are_deleted_without_hashes(self):
+        os.makedirs(self.folder)
+        (self.folder / "stale.csv").write_text("")
+
+        write_diffable_sheets(org(flow("a", "Hello")), self.folder)
+
+        self.assertEqual(sheets(self.folder), ["a.csv"])
+
+    def test_hash_does_not_depend_on_uuids(self):
+        self.assertEqual(flow_hash(flow("a", "Hello")), flow_hash(flow("a", "Hello")))
+        self.assertNotEqual(flow_hash(flow("a", "Hello")), flow_hash(flow("a", "Hi")))
+
+
+def org(*flows):
+    return {"flows": list(flows)}
+
+
+def flow(name, text):
+    node_uuid = str(uuid.uuid4())
+    return {
+        "uuid": str(uuid.uuid4()),
+        "name": name,
+        "spec_version": "13.1.0",
+        "language": "eng",
+        "type": "messaging",
+        "revision": 0,
+        "expire_after_minutes": 10080,
+        "localization": {},
+        "nodes": [
+            {
+                "uuid": node_uuid,
+                "actions": [
+                    {
+                        "uuid": str(uuid.uuid4()),
+                        "type": "send_msg",
+                        "text": text,
+                        "attachments": [],
+                        "quick_replies": [],
+                        "all_urns": False,
+                    }
+                ],
+                "exits": [{"uuid": str(uuid.uuid4()), "destination_uuid": None}],
+            }
+        ],
+        "_ui": {"nodes": {node_uuid: {"position": {"left": 0, "top": 0}}}},
+    }
+
+
+def sheets(folder):
+    return sorted(name for name in os.listdir(folder) if name.endswith(".csv"))
+
+
+def mark_written(folder):
+    """Set the modification times of the sheets into the past."""
+    mtimes = {}
+    for name in sheets(folder):
+        path = folder / name
+        os.utime(path, ns=(0, 0))
+        mtimes[Path(name).stem] = os.stat(path).st_mtime_ns
+    return mtimes